@@ -2,17 +2,85 @@
 # 版本：API 驱动的分布式数据处理
 # 描述：此脚本设计为由 GitHub Action 工作流触发，用于处理特定类型的证券列表（A股、港股或ETF）。
 # 它会根据传入的参数，获取相应的数据，并将其保存到一个独立的、临时的 JSON 文件中，等待后续的合并处理。
+# INPUT_LISTTYPE=all 时在一次运行中并发拉取全部市场，并一次性写出所有 partial 文件；
+# 此时各市场列表与混合列表 INPUT_CODES 中的代码会按证券主表重新归入各自的市场。
 
 import os
+import sys
 import json
+import time
+import numpy as np
 import pandas as pd
-import akshare as ak
 from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-def process_dynamic_securities_report(df_stock_raw, df_etf_raw, df_hk_stock_raw, trade_date, all_codes):
+# 共享的辅助模块位于 scripts/ 目录下
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from snapshot_cache import SnapshotCache, SNAPSHOT_ATTRS_KEY
+from pipeline_metrics import start_run, stage, count, finish_run
+from report_formats import REPORT_PARTIAL_FORMAT, to_columnar, encode_compact
+from fetch_planner import FetchPlanner
+from security_master import SecurityMaster, normalize_code, normalize_code_series
+from lazy_imports import load_akshare_fetcher
+
+# 各市场输出字段的定义：(输出字段, 原始列名, 保留小数位, 除数)
+# 判断代码归属时按此顺序依次查找：A股 -> 港股 -> ETF
+SECURITY_FIELD_SPECS = {
+    'stock': [
+        ('Price', '最新价', 2, 1),
+        ('Percent', '涨跌幅', 2, 1),
+        ('Amount', '成交额', 2, 100_000_000),
+        ('PE_TTM', '市盈率-动态', 2, 1),
+        ('PB', '市净率', 2, 1),
+    ],
+    'hk_stock': [
+        ('Price', '最新价', 3, 1),
+        ('Percent', '涨跌幅', 2, 1),
+        ('Amount', '成交额', 2, 100_000_000),
+    ],
+    'etf': [
+        ('Price', '最新价', 3, 1),
+        ('Percent', '涨跌幅', 2, 1),
+        ('Amount', '成交额', 2, 100_000_000),
+    ],
+}
+
+
+def safe_round(value, digits, divisor=1):
+    """安全地将值转换为数字、进行除法和四舍五入。如果失败则返回 None。"""
+    numeric_val = pd.to_numeric(value, errors='coerce')
+    if pd.isna(numeric_val):
+        return None
+    return round(numeric_val / divisor, digits)
+
+
+def _round_column(frame, column, digits, divisor):
+    """
+    对整列做数值转换、除法和四舍五入，返回 Python 原生值列表（缺失值为 None）。
+    数值列走向量化路径；非数值列（如混有 '-' 的 object 列）逐个回退到 safe_round，
+    以保证与逐行处理时的舍入结果完全一致。
+    """
+    if column not in frame.columns:
+        return [None] * len(frame)
+
+    series = frame[column]
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        return [safe_round(value, digits, divisor) for value in series.tolist()]
+
+    # 使用 Python 内置 round（而非 numpy 的舍入），与原逐行实现保持字节级一致
+    values = (series / divisor).tolist()
+    return [None if pd.isna(value) else round(value, digits) for value in values]
+
+
+def process_dynamic_securities_report(df_stock_raw, df_etf_raw, df_hk_stock_raw, trade_date, all_codes,
+                                      update_time_bjt=None, stale=False):
     """
     处理一个包含A股、港股或ETF代码的列表，并返回一个包含其市场数据的列表。
-    (此函数与您原始版本完全相同，功能完善，无需修改)
+    只把行情表按请求的代码 reindex 一次，再按列批量转换和舍入，不再把整个市场转成字典。
+    行情来自过期的回退快照时，update_time_bjt 传入快照的抓取时间，并以 stale=True 在记录中标记。
     """
     print(f"\n--- Processing a list of {len(all_codes)} dynamic securities ---")
     
@@ -20,131 +88,300 @@ def process_dynamic_securities_report(df_stock_raw, df_etf_raw, df_hk_stock_raw,
         print("No dynamic codes provided to process. Skipping.")
         return []
 
-    # 为不同市场的原始数据创建索引，以便快速查找
-    stock_data_map = df_stock_raw.set_index('代码').to_dict('index') if not df_stock_raw.empty else {}
-    etf_data_map = df_etf_raw.set_index('代码').to_dict('index') if not df_etf_raw.empty else {}
-    hk_stock_data_map = df_hk_stock_raw.set_index('代码').to_dict('index') if not df_hk_stock_raw.empty else {}
+    codes = pd.Index(all_codes, dtype=object)
+    records = [None] * len(codes)
+    unresolved = np.ones(len(codes), dtype=bool)
+
+    common_info = {
+        "update_time_bjt": update_time_bjt or datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), 
+        "trade_date": trade_date
+    }
+    if stale:
+        common_info["stale"] = True
+
+    market_frames = (('stock', df_stock_raw), ('hk_stock', df_hk_stock_raw), ('etf', df_etf_raw))
+    for security_type, df_raw in market_frames:
+        if df_raw.empty or not unresolved.any():
+            continue
+
+        with stage('process.index_codes'):
+            market = df_raw.drop_duplicates('代码').set_index('代码')
+            positions = np.flatnonzero(unresolved & codes.isin(market.index))
+            if len(positions) == 0:
+                continue
+            unresolved[positions] = False
+
+            # 只取出本次请求的行，后续所有计算都在这个小表上进行
+            subset = market.reindex(codes[positions])
+
+        with stage('process.build_records'):
+            names = subset['名称'].tolist() if '名称' in subset.columns else [None] * len(subset)
+            field_specs = SECURITY_FIELD_SPECS[security_type]
+            field_keys = [key for key, _, _, _ in field_specs]
+            field_values = [_round_column(subset, column, digits, divisor) for _, column, digits, divisor in field_specs]
+
+            for position, name, row_values in zip(positions, names, zip(*field_values)):
+                security_info = {'代码': all_codes[position], '名称': name}
+                security_info.update(zip(field_keys, row_values))
+                security_info.update(common_info)
+                records[position] = security_info
 
     result_list = []
-    
-    def safe_round(value, digits, divisor=1):
-        """安全地将值转换为数字、进行除法和四舍五入。如果失败则返回 None。"""
-        numeric_val = pd.to_numeric(value, errors='coerce')
-        if pd.isna(numeric_val):
-            return None
-        return round(numeric_val / divisor, digits)
-
-    # 遍历所有传入的代码
-    for code in all_codes:
-        item, security_type = None, None
-        
-        # 判断代码属于哪个市场
-        if code in stock_data_map:
-            item, security_type = stock_data_map[code], 'stock'
-        elif code in hk_stock_data_map:
-            item, security_type = hk_stock_data_map[code], 'hk_stock'
-        elif code in etf_data_map:
-            item, security_type = etf_data_map[code], 'etf'
-        
-        if not item:
+    for code, security_info in zip(all_codes, records):
+        if security_info is None:
             print(f"  - Warning: Code '{code}' not found in any fetched market data.")
             continue
-        
-        # 构建标准化的数据结构
-        common_info = {
-            "update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), 
-            "trade_date": trade_date
-        }
-
-        if security_type == 'stock':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 2), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000), 'PE_TTM': safe_round(item.get('市盈率-动态'), 2), 'PB': safe_round(item.get('市净率'), 2)}
-        elif security_type == 'hk_stock':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 3), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000)}
-        elif security_type == 'etf':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 3), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000)}
-        
-        security_info.update(common_info)
         result_list.append(security_info)
         
+    count('codes_requested', len(all_codes))
+    count('codes_not_found', len(all_codes) - len(result_list))
     print(f"Successfully processed {len(result_list)} securities from the dynamic list.")
     return result_list
 
-if __name__ == "__main__":
-    # --- 1. 确定本次运行的模式和输出文件 ---
-    list_type = os.environ.get('INPUT_LISTTYPE')
-    if not list_type:
-        raise ValueError("FATAL: Environment variable 'INPUT_LISTTYPE' must be set. (e.g., 'a_shares', 'hk_shares', 'etf')")
-
-    output_filename = f"partial_{list_type}.json"
-    print(f"--- Running in '{list_type}' mode. Output will be '{output_filename}' ---")
-
-    # --- 2. 解析对应列表的输入 ---
-    dynamic_list_str, dynamic_codes = "[]", []
-    if list_type == 'a_shares':
-        dynamic_list_str = os.environ.get('INPUT_DYNAMICLIST', '[]')
-    elif list_type == 'hk_shares':
-        dynamic_list_str = os.environ.get('INPUT_DYNAMICHKLIST', '[]')
-    elif list_type == 'etf':
-        dynamic_list_str = os.environ.get('INPUT_DYNAMICETFLIST', '[]')
-    
+# 各市场的输入环境变量、akshare 全市场行情接口与日志名称
+MARKET_CONFIG = {
+    'a_shares': {'input_env': 'INPUT_DYNAMICLIST', 'fetcher': 'stock_zh_a_spot_em', 'label': 'A-share stocks'},
+    'hk_shares': {'input_env': 'INPUT_DYNAMICHKLIST', 'fetcher': 'stock_hk_main_board_spot_em', 'label': 'HK stocks'},
+    'etf': {'input_env': 'INPUT_DYNAMICETFLIST', 'fetcher': 'fund_etf_spot_em', 'label': 'ETFs'},
+}
+# 不区分市场的混合代码列表（仅 'all' 模式使用）
+MIXED_CODES_ENV = 'INPUT_CODES'
+
+
+def parse_code_list(env_name, label):
+    """从环境变量中解析 JSON 代码数组，解析失败时返回空列表。"""
+    dynamic_list_str = os.environ.get(env_name, '[]') if env_name else "[]"
+
     try:
         dynamic_codes = json.loads(dynamic_list_str)
         if not isinstance(dynamic_codes, list):
             raise json.JSONDecodeError("Input is not a JSON array.", dynamic_list_str, 0)
-        print(f"Found and parsed {len(dynamic_codes)} codes from input.")
+        print(f"Found and parsed {len(dynamic_codes)} codes for '{label}' from input.")
     except json.JSONDecodeError as e:
         print(f"Error: Could not parse dynamic list: '{dynamic_list_str}'. Details: {e}")
         dynamic_codes = []
+    return dynamic_codes
+
+
+def normalize_market_codes(list_type, codes):
+    """规范化某个市场列表中的代码并去重；港股列表中的纯数字代码补上 'HK' 前缀。"""
+    normalized = []
+    for code in codes:
+        if list_type == 'hk_shares' and str(code).strip().isdigit():
+            code = f"HK{str(code).strip()}"
+        code = normalize_code(code)
+        if code:
+            normalized.append(code)
+    return list(dict.fromkeys(normalized))
+
+
+def parse_dynamic_codes(list_type):
+    """从对应的环境变量中解析并规范化代码列表，解析失败时返回空列表。"""
+    config = MARKET_CONFIG.get(list_type)
+    return normalize_market_codes(list_type, parse_code_list(config['input_env'] if config else None, list_type))
+
+
+def own_market_codes(list_type, codes, master):
+    """
+    单市场模式：只保留属于 list_type 的代码（按证券主表，主表中没有的按代码格式推断）。
+    其他市场的代码不能按 list_type 的接口和字段拉取，跳过并提示通过 'codes' 或 'all' 模式提交。
+    """
+    routed = master.route(codes, default=list_type)
+    for market, market_codes in routed.items():
+        if market != list_type:
+            count('codes_wrong_market', len(market_codes))
+            print(f"Warning: Skipping {len(market_codes)} code(s) that belong to '{market}', not '{list_type}': "
+                  f"{', '.join(market_codes[:10])}. Submit them under '{market}' or in the mixed 'codes' list.")
+    return routed.get(list_type, [])
+
+
+def route_dynamic_codes(master):
+    """
+    'all' 模式：把三个市场列表和混合列表中的代码按证券主表归入各自的市场，返回 {list_type: [代码]}。
+    主表中没有的代码留在原来的列表中，混合列表中的则按代码格式推断市场。
+    """
+    sources = [(list_type, parse_dynamic_codes(list_type)) for list_type in MARKET_CONFIG]
+    sources.append((None, parse_code_list(MIXED_CODES_ENV, 'mixed')))
+
+    routed = {list_type: {} for list_type in MARKET_CONFIG}
+    for source, codes in sources:
+        for market, market_codes in master.route(codes, default=source).items():
+            if source is not None and market != source:
+                print(f"Routed {len(market_codes)} code(s) listed under '{source}' to '{market}' using the security master.")
+            routed.setdefault(market, {}).update(dict.fromkeys(market_codes))
+    return {list_type: list(codes) for list_type, codes in routed.items() if codes}
+
+
+def prepare_market_frame(list_type, df_raw, base_trade_date):
+    """
+    规范化单个市场的原始行情：代码转为字符串（港股加 'HK' 前缀），并确定交易日。
+    返回 (DataFrame, trade_date)。
+    """
+    if list_type == 'hk_shares':
+        df_raw['代码'] = normalize_code_series('HK' + df_raw['代码'].astype(str))
+    else:
+        df_raw['代码'] = normalize_code_series(df_raw['代码'])
+
+    trade_date = base_trade_date
+    # 回退到过期快照时使用快照自己的交易日
+    snapshot = df_raw.attrs.get(SNAPSHOT_ATTRS_KEY)
+    if snapshot and snapshot.get('trade_date'):
+        trade_date = snapshot['trade_date']
+    if list_type == 'etf':
+        # ETF 行情自带数据日期，以它作为交易日
+        try:
+            if not df_raw.empty and '数据日期' in df_raw.columns and pd.to_datetime(df_raw['数据日期'].iloc[0], errors='coerce') is not pd.NaT:
+                trade_date = pd.to_datetime(df_raw['数据日期'].iloc[0]).strftime('%Y-%m-%d')
+        except Exception as e:
+            print(f"Could not extract ETF data date: {e}")
+    return df_raw, trade_date
+
+
+def fetch_market_data(list_type, base_trade_date, snapshot_cache, codes=None, planner=None):
+    """
+    获取单个市场的行情并规范化代码列，返回 (DataFrame, trade_date)。
+    给出 codes 时由 FetchPlanner 决定按代码拉取还是下载全市场。
+    拉取失败时直接抛出异常，由调用方决定如何记录。
+    """
+    config = MARKET_CONFIG[list_type]
+    # akshare 只在真正需要下载全市场行情时才导入，且只导入该市场的行情函数所在的子模块
+    fetcher = lambda: load_akshare_fetcher(config['fetcher'])()
+    planner = planner or FetchPlanner()
+    with stage(f'fetch.{list_type}'):
+        df_raw, plan = planner.fetch(list_type, codes or [], base_trade_date, snapshot_cache, fetcher)
+    count(f'fetch_plan.{plan}')
+    count(f'rows_fetched.{list_type}', len(df_raw))
+    print(f"Successfully fetched {len(df_raw)} {config['label']} (plan: {plan}).")
+    return prepare_market_frame(list_type, df_raw, base_trade_date)
+
+
+def build_partial(list_type, df_raw, trade_date, dynamic_codes):
+    """
+    把单个市场的行情放到 process_dynamic_securities_report 对应的位置上处理。
+    行情是过期的回退快照时，记录沿用快照的抓取时间并标记 stale，合并时不会覆盖更新的行情。
+    """
+    frames = {'a_shares': pd.DataFrame(), 'hk_shares': pd.DataFrame(), 'etf': pd.DataFrame()}
+    if list_type in frames:
+        frames[list_type] = df_raw
+    snapshot = df_raw.attrs.get(SNAPSHOT_ATTRS_KEY) or {}
+    if snapshot.get('stale'):
+        count(f'stale_snapshot.{list_type}')
+    return process_dynamic_securities_report(
+        frames['a_shares'], frames['etf'], frames['hk_shares'], trade_date, dynamic_codes,
+        update_time_bjt=snapshot.get('fetched_at_bjt'), stale=bool(snapshot.get('stale'))
+    )
 
+
+def write_partial(list_type, final_data, output_dir="data"):
+    output_filepath = os.path.join(output_dir, f"partial_{list_type}.json")
+    os.makedirs(output_dir, exist_ok=True)
+
+    with stage('write_partial'):
+        if REPORT_PARTIAL_FORMAT == 'columnar':
+            # 紧凑的列式 partial，merge_partials.py 读取时会还原为记录数组
+            with open(output_filepath, 'wb') as f:
+                f.write(encode_compact(to_columnar(final_data)))
+        else:
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                json.dump(final_data, f, ensure_ascii=False, indent=4)
+    count('records_written', len(final_data))
+    count('bytes_written', os.path.getsize(output_filepath))
+
+    # 行情历史库与证券主表由串行执行的 data-merger 工作流在合并时写入（见 scripts/merge_partials.py）
+    print(f"\n[Finished] -> Partial data for '{list_type}' saved to {output_filepath}")
+    return output_filepath
+
+
+def run_single_market(list_type):
+    """处理单个 list_type：拉取该市场行情并写出 partial_<list_type>.json。"""
+    print(f"--- Running in '{list_type}' mode. Output will be 'partial_{list_type}.json' ---")
+
+    master = SecurityMaster()
+    dynamic_codes = parse_dynamic_codes(list_type)
+    if list_type in MARKET_CONFIG:
+        dynamic_codes = own_market_codes(list_type, dynamic_codes, master)
     if not dynamic_codes:
         print("\nNo dynamic codes to process. Exiting script gracefully.")
+        return
+
+    print("\n--- Starting Data Acquisition Phase ---")
+    base_trade_date = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+    # 全市场快照优先从本地缓存读取，TTL 内不再重复下载
+    snapshot_cache = SnapshotCache()
+
+    # 拉取失败时以空 DataFrame 继续，process_dynamic_securities_report 会跳过空数据
+    df_raw, trade_date = pd.DataFrame(), base_trade_date
+    if list_type in MARKET_CONFIG:
+        try:
+            df_raw, trade_date = fetch_market_data(list_type, base_trade_date, snapshot_cache, dynamic_codes)
+        except Exception as e:
+            print(f"Could not fetch '{list_type}' market data: {e}")
     else:
-        # --- 3. 根据 list_type 获取对应的实时行情数据 (修改点) ---
-        print("\n--- Starting Data Acquisition Phase ---")
-        base_trade_date = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
-        
-        # 初始化所有 DataFrame 为空，只在需要时填充
-        df_stock_raw, df_etf_raw, df_hk_stock_raw = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-        if list_type == 'a_shares':
-            try:
-                df_stock_raw = ak.stock_zh_a_spot_em()
-                df_stock_raw['代码'] = df_stock_raw['代码'].astype(str)
-                print(f"Successfully fetched {len(df_stock_raw)} A-share stocks.")
-            except Exception as e:
-                print(f"Could not fetch A-share stock data: {e}")
-        elif list_type == 'hk_shares':
-            try:
-                df_hk_stock_raw = ak.stock_hk_main_board_spot_em()
-                df_hk_stock_raw['代码'] = 'HK' + df_hk_stock_raw['代码'].astype(str)
-                print(f"Successfully fetched {len(df_hk_stock_raw)} HK stocks.")
-            except Exception as e:
-                print(f"Could not fetch HK stock data: {e}")
-        elif list_type == 'etf':
-            try:
-                df_etf_raw = ak.fund_etf_spot_em()
-                df_etf_raw['代码'] = df_etf_raw['代码'].astype(str)
-                print(f"Successfully fetched {len(df_etf_raw)} ETFs.")
-                if not df_etf_raw.empty and '数据日期' in df_etf_raw.columns and pd.to_datetime(df_etf_raw['数据日期'].iloc[0], errors='coerce') is not pd.NaT:
-                    base_trade_date = pd.to_datetime(df_etf_raw['数据日期'].iloc[0]).strftime('%Y-%m-%d')
-            except Exception as e:
-                print(f"Could not fetch ETF data or extract date: {e}")
-        else:
-            print(f"Warning: Unknown list_type '{list_type}'. No specific data will be fetched.")
-
-        # --- 4. 处理数据并保存到临时文件 ---
-        # 这里的 process_dynamic_securities_report 函数本身不需要修改，
-        # 因为它会检查传入的 df 是否为空，只处理非空的数据。
-        final_data = process_dynamic_securities_report(
-            df_stock_raw, df_etf_raw, df_hk_stock_raw, base_trade_date, dynamic_codes
-        )
-        
-        output_dir = "data"
-        output_filepath = os.path.join(output_dir, output_filename)
+        print(f"Warning: Unknown list_type '{list_type}'. No specific data will be fetched.")
 
-        os.makedirs(output_dir, exist_ok=True)
-        
-        with open(output_filepath, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, ensure_ascii=False, indent=4)
-        
-        print(f"\n[Finished] -> Partial data for '{list_type}' saved to {output_filepath}")
+    final_data = build_partial(list_type, df_raw, trade_date, dynamic_codes)
+    write_partial(list_type, final_data)
+
+
+def run_all_markets(max_workers=3):
+    """
+    'all' 模式：在一次运行中用线程池并发拉取所有有代码的市场，
+    分别处理并写出各自的 partial 文件，按市场汇报耗时与失败情况。
+    """
+    print("--- Running in 'all' mode. Output will be one partial file per market ---")
+
+    master = SecurityMaster()
+    codes_by_market = route_dynamic_codes(master)
+    if not codes_by_market:
+        print("\nNo dynamic codes to process. Exiting script gracefully.")
+        return
+
+    print(f"\n--- Starting Concurrent Data Acquisition Phase for {list(codes_by_market)} ---")
+    base_trade_date = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+    snapshot_cache = SnapshotCache()
+    planner = FetchPlanner()
+
+    def timed_fetch(list_type):
+        started = time.perf_counter()
+        try:
+            df_raw, trade_date = fetch_market_data(list_type, base_trade_date, snapshot_cache,
+                                                   codes_by_market[list_type], planner)
+            return df_raw, trade_date, None, time.perf_counter() - started
+        except Exception as e:
+            return None, None, e, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {list_type: executor.submit(timed_fetch, list_type) for list_type in codes_by_market}
+        fetched = {list_type: future.result() for list_type, future in futures.items()}
+
+    summary = {}
+    for list_type, (df_raw, trade_date, error, elapsed) in fetched.items():
+        if error is not None:
+            print(f"Could not fetch '{list_type}' market data: {error}")
+            summary[list_type] = f"FAILED after {elapsed:.2f}s ({error})"
+            continue
+        final_data = build_partial(list_type, df_raw, trade_date, codes_by_market[list_type])
+        write_partial(list_type, final_data)
+        summary[list_type] = f"fetched {len(df_raw)} rows in {elapsed:.2f}s, wrote {len(final_data)} records"
+
+    print("\n--- Per-market Summary ---")
+    for list_type, line in summary.items():
+        print(f"  - {list_type}: {line}")
+
+
+if __name__ == "__main__":
+    # --- 确定本次运行的模式：单个市场，或 'all' 一次处理全部市场 ---
+    list_type = os.environ.get('INPUT_LISTTYPE')
+    if not list_type:
+        raise ValueError("FATAL: Environment variable 'INPUT_LISTTYPE' must be set. (e.g., 'a_shares', 'hk_shares', 'etf', 'all')")
+
+    start_run(f"index:{list_type}")
+    try:
+        if list_type == 'all':
+            run_all_markets()
+        else:
+            run_single_market(list_type)
+    except BaseException:
+        finish_run('error')
+        raise
+    finish_run()
@@ -1,14 +1,150 @@
 # api/trigger.py
 import os
-import requests
+import sys
+import time
+import threading
 from http.server import BaseHTTPRequestHandler
 import json
 
+# 共享的辅助模块位于 scripts/ 目录下
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from pipeline_metrics import RunMetrics
+from security_master import SecurityMaster
+
+# 合并窗口：窗口内同一 list_type 的请求合并成一次 workflow dispatch（秒）。
+# 默认 0 表示立即发送（不额外等待）；设为正数时开启合并，leader 请求会在函数调用内等待这段时间
+TRIGGER_DEBOUNCE_SECONDS = float(os.environ.get('TRIGGER_DEBOUNCE_SECONDS', '0'))
+# 已发出的 dispatch 在这段时间内视为"运行中"，被其完全覆盖的请求直接丢弃（秒）。
+# 这里只知道 dispatch 请求本身是否成功，不知道工作流运行的结果：运行失败时，窗口内被丢弃的请求不会重新触发，
+# 要等窗口过期后的下一次请求。因此默认 0（不去重）；开启时应短于一次 main.yml 运行的耗时
+TRIGGER_INFLIGHT_SECONDS = float(os.environ.get('TRIGGER_INFLIGHT_SECONDS', '0'))
+# 请求体中携带代码列表的字段
+CODE_LIST_FIELDS = ('dynamiclist', 'dynamicHKlist', 'dynamicETFlist')
+# 各市场对应的代码列表字段；不区分市场的混合列表放在 'codes' 字段中
+MARKET_FIELDS = {'a_shares': 'dynamiclist', 'hk_shares': 'dynamicHKlist', 'etf': 'dynamicETFlist'}
+MIXED_CODES_FIELD = 'codes'
+
+# 模块级对象在同一个实例的多次热调用之间复用
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """返回带连接池的 requests.Session，热调用之间复用 TCP/TLS 连接。requests 在第一次 dispatch 时才导入。"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        return _session
+
+
+class DispatchCoalescer:
+    """
+    按 list_type 合并请求并去重代码：
+    - 窗口内第一个请求成为 leader，等待窗口结束后把期间合并进来的所有代码一次性发出；
+    - 窗口内后续的请求（follower）只把代码并入待发批次后立即返回；
+    - 代码已全部包含在运行中的 dispatch 里的请求直接丢弃（inflight_seconds > 0 时；工作流运行失败无法感知，
+      窗口内被丢弃的代码要等窗口过期后的请求才会重新拉取）；
+    - dispatch 失败时批次中的代码被保留，由该 list_type 的下一个 leader 一并重新发出，follower 的代码不会丢失。
+    """
+
+    def __init__(self, debounce_seconds=TRIGGER_DEBOUNCE_SECONDS, inflight_seconds=TRIGGER_INFLIGHT_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self.inflight_seconds = inflight_seconds
+        self.lock = threading.Lock()
+        self.pending = {}   # list_type -> {'deadline': float, 'codes': {field: dict}}
+        self.inflight = []  # [(dispatched_at, {field: set})]
+        self.retry = {}     # list_type -> {field: dict}，dispatch 失败后等待重发的代码
+
+    def _uncovered(self, codes_by_field, now):
+        """去掉已包含在运行中 dispatch 里的代码，返回剩余的 {field: [codes]}。"""
+        self.inflight = [(at, codes) for at, codes in self.inflight if now - at < self.inflight_seconds]
+        uncovered = {}
+        for field, codes in codes_by_field.items():
+            covered = set().union(*(inflight.get(field, ()) for _, inflight in self.inflight))
+            remaining = [code for code in codes if code not in covered]
+            if remaining:
+                uncovered[field] = remaining
+        return uncovered
+
+    def submit(self, list_type, codes_by_field):
+        """返回 ('covered', None)、('follower', None) 或 ('leader', deadline)。"""
+        now = time.monotonic()
+        with self.lock:
+            requested = bool(codes_by_field)
+            codes_by_field = self._uncovered(codes_by_field, now)
+            if requested and not codes_by_field and list_type not in self.retry:
+                return 'covered', None
+
+            batch = self.pending.get(list_type)
+            if batch is not None:
+                for field, codes in codes_by_field.items():
+                    batch['codes'].setdefault(field, {}).update(dict.fromkeys(codes))
+                return 'follower', None
+
+            # 新的 leader 接手之前 dispatch 失败时保留下来的代码
+            batch_codes = self.retry.pop(list_type, {})
+            for field, codes in codes_by_field.items():
+                batch_codes.setdefault(field, {}).update(dict.fromkeys(codes))
+            self.pending[list_type] = {'deadline': now + self.debounce_seconds, 'codes': batch_codes}
+            return 'leader', now + self.debounce_seconds
+
+    def close(self, list_type):
+        """结束窗口，取出合并后的批次（再次扣除运行中已覆盖的代码）。"""
+        with self.lock:
+            batch = self.pending.pop(list_type, None)
+            if batch is None:
+                return {}
+            return self._uncovered({field: list(codes) for field, codes in batch['codes'].items()}, time.monotonic())
+
+    def mark_dispatched(self, codes_by_field):
+        with self.lock:
+            self.inflight.append((time.monotonic(), {field: set(codes) for field, codes in codes_by_field.items()}))
+
+    def retain(self, list_type, codes_by_field):
+        """dispatch 失败：保留批次中的代码，由该 list_type 的下一个 leader 重新发出。"""
+        with self.lock:
+            retry = self.retry.setdefault(list_type, {})
+            for field, codes in codes_by_field.items():
+                retry.setdefault(field, {}).update(dict.fromkeys(codes))
+
+
+coalescer = DispatchCoalescer()
+
+
+def route_request_codes(post_data):
+    """
+    用证券主表把请求中的所有代码（三个市场列表和混合列表 'codes'）归入各自的市场，
+    返回 {字段: [代码]}。主表中没有的代码留在原来的列表中，混合列表中的按代码格式推断。
+    """
+    master = SecurityMaster()
+    sources = [(market, post_data.get(field)) for market, field in MARKET_FIELDS.items()]
+    sources.append((None, post_data.get(MIXED_CODES_FIELD)))
+
+    routed = {}
+    for default, codes in sources:
+        if not codes or not isinstance(codes, list):
+            continue
+        codes = [code for code in codes if isinstance(code, (str, int))]
+        if default == 'hk_shares':
+            # 港股列表中的纯数字代码补上 'HK' 前缀
+            codes = [f"HK{code}" if str(code).strip().isdigit() else code for code in codes]
+        for market, market_codes in master.route(codes, default=default).items():
+            routed.setdefault(MARKET_FIELDS[market], {}).update(dict.fromkeys(market_codes))
+    return {field: list(routed[field]) for field in CODE_LIST_FIELDS if routed.get(field)}
+
 class handler(BaseHTTPRequestHandler):
 
     ALLOWED_ORIGIN = "https://digital-era.github.io"
 
     def _set_headers(self, status_code=200, content_type='application/json'):
+        self.status_code = status_code
         self.send_response(status_code)
         self.send_header('Content-type', content_type)
         self.send_header('Access-Control-Allow-Origin', self.ALLOWED_ORIGIN)
@@ -22,6 +158,15 @@ class handler(BaseHTTPRequestHandler):
         self.wfile.write(b'')
 
     def do_POST(self):
+        # 每个请求一条埋点记录；serverless 环境下默认只打印到日志
+        self.metrics = RunMetrics('trigger', metrics_file=os.environ.get('PIPELINE_METRICS_FILE'))
+        self.status_code = None
+        try:
+            self._handle_post()
+        finally:
+            self.metrics.finish(status=str(self.status_code))
+
+    def _handle_post(self):
         token = os.environ.get('GITHUB_TOKEN')
         repo_owner = os.environ.get('GITHUB_REPO_OWNER')
         repo_name = os.environ.get('GITHUB_REPO_NAME')
@@ -48,15 +193,31 @@ class handler(BaseHTTPRequestHandler):
         # # #  修改点 1: 获取并验证 list_type 参数
         # =========================================================
         list_type = post_data.get('list_type')
+        # 只提交混合列表 'codes' 时可以省略 list_type，由证券主表决定需要拉取的市场
+        if not list_type and isinstance(post_data.get(MIXED_CODES_FIELD), list):
+            list_type = 'auto'
         # 验证 list_type 是否存在且有效
-        if not list_type or list_type not in ['a_shares', 'hk_shares', 'etf']:
+        # 'all' 表示在一次工作流运行中并发处理所有市场
+        if not list_type or list_type not in ['a_shares', 'hk_shares', 'etf', 'all', 'auto']:
             self._set_headers(400) # Bad Request
             response = {
                 "error": "Missing or invalid 'list_type' in request body.",
-                "details": "It must be one of 'a_shares', 'hk_shares', or 'etf'."
+                "details": "It must be one of 'a_shares', 'hk_shares', 'etf', 'all', or 'auto'."
             }
             self.wfile.write(json.dumps(response).encode('utf-8'))
             return
+
+        # 按证券主表把代码归入各自的市场；只涉及一个市场时只触发该市场，否则使用 'all'
+        with self.metrics.stage('route_codes'):
+            codes_by_field = route_request_codes(post_data)
+        routed_markets = [market for market, field in MARKET_FIELDS.items() if field in codes_by_field]
+        if routed_markets and (list_type == 'auto' or any(market != list_type for market in routed_markets)):
+            list_type = routed_markets[0] if len(routed_markets) == 1 else 'all'
+        if list_type == 'auto':
+            self._set_headers(400)
+            response = {"error": "No valid codes found in 'codes'."}
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+            return
         # =========================================================
 
         workflow_file_name = "main.yml" 
@@ -78,18 +239,34 @@ class handler(BaseHTTPRequestHandler):
         }
         # =========================================================
         
-        # 检查并添加 dynamiclist (A股)、dynamicHKlist (港股) 和 dynamicETFlist (ETF)
-        dynamic_list_a = post_data.get('dynamiclist')
-        if dynamic_list_a and isinstance(dynamic_list_a, list):
-            workflow_inputs['dynamiclist'] = json.dumps(dynamic_list_a)
-
-        dynamic_list_hk = post_data.get('dynamicHKlist')
-        if dynamic_list_hk and isinstance(dynamic_list_hk, list):
-            workflow_inputs['dynamicHKlist'] = json.dumps(dynamic_list_hk)
+        # 与窗口内的其他请求合并；被运行中的 dispatch 完全覆盖的请求直接返回
+        self.metrics.count('codes_requested', sum(len(codes) for codes in codes_by_field.values()))
+        role, deadline = coalescer.submit(list_type, codes_by_field)
+        self.metrics.count(f'coalescer.{role}')
+        if role == 'covered':
+            self._set_headers(202)
+            response = {"message": "Request already covered by an in-flight workflow run. Skipped."}
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+            return
+        if role == 'follower':
+            self._set_headers(202)
+            response = {"message": "Request coalesced into a pending workflow dispatch. "
+                                   "If that dispatch fails, the codes are retried with the next request."}
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+            return
 
-        dynamic_list_etf = post_data.get('dynamicETFlist')
-        if dynamic_list_etf and isinstance(dynamic_list_etf, list):
-            workflow_inputs['dynamicETFlist'] = json.dumps(dynamic_list_etf)
+        # leader：等待窗口结束，再把期间合并进来的代码一次性发出
+        with self.metrics.stage('debounce_wait'):
+            time.sleep(max(0.0, deadline - time.monotonic()))
+        merged_codes = coalescer.close(list_type)
+        self.metrics.count('codes_dispatched', sum(len(codes) for codes in merged_codes.values()))
+        if codes_by_field and not merged_codes:
+            self._set_headers(202)
+            response = {"message": "Request already covered by an in-flight workflow run. Skipped."}
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+            return
+        for field, codes in merged_codes.items():
+            workflow_inputs[field] = json.dumps(codes)
 
         data = {
             "ref": branch,
@@ -97,9 +274,11 @@ class handler(BaseHTTPRequestHandler):
         }
         
         try:
-            res = requests.post(url, headers=headers, json=data)
+            with self.metrics.stage('github_dispatch'):
+                res = get_session().post(url, headers=headers, json=data, timeout=30)
 
             if res.status_code == 204:
+                coalescer.mark_dispatched(merged_codes)
                 self._set_headers(202)
                 response = {
                     "message": "Workflow triggered successfully.",
@@ -108,14 +287,17 @@ class handler(BaseHTTPRequestHandler):
                 }
                 self.wfile.write(json.dumps(response).encode('utf-8'))
             else:
+                # 批次中可能包含 follower 已收到 202 的代码，保留下来由下一次请求重发
+                coalescer.retain(list_type, merged_codes)
                 self._set_headers(res.status_code)
                 response = {
-                    "error": "Failed to trigger GitHub workflow.",
+                    "error": "Failed to trigger GitHub workflow. The requested codes are kept and retried with the next request.",
                     "github_response": res.text
                 }
                 self.wfile.write(json.dumps(response).encode('utf-8'))
 
         except Exception as e:
+            coalescer.retain(list_type, merged_codes)
             self._set_headers(500)
             response = {"error": f"An internal error occurred: {str(e)}"}
             self.wfile.write(json.dumps(response).encode('utf-8'))
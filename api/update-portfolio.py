@@ -2,19 +2,95 @@
 # 已改造为与 trigger.py 相同的 BaseHTTPRequestHandler 模式
 
 import os
+import sys
 import json
 import base64
-from github import Github, GithubException
+import hashlib
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler
 
+# 共享的辅助模块位于 scripts/ 目录下
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from pipeline_metrics import RunMetrics
+
 # 从环境变量获取配置
 ALLOWED_ORIGIN = os.environ.get("ALLOWED_ORIGIN", "https://digital-era.github.io")
 
+# 完整工作簿上传的目标文件，以及增量模式（只上传新增持仓行）的目标文件
+EXCEL_FILE_PATH = "data/AIPEPortfolio_new.xlsx"
+ROWS_FILE_PATH = "data/AIPEPortfolio_new.json"
+
+# 以下缓存在同一实例的多次热调用之间复用
+_repo_cache = {}        # (token, repo_name) -> Repository
+_remote_sha_cache = {}  # (repo_name, file_path) -> 远端 blob SHA
+
+
+def git_blob_sha(content):
+    """按 git 的规则计算内容的 blob SHA，与 GitHub contents API 返回的 sha 可直接比较。"""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def get_repo(github_token, repo_name):
+    key = (github_token, repo_name)
+    if key not in _repo_cache:
+        # PyGithub 导入较慢，只在第一次真正访问仓库时导入，OPTIONS 等请求不受影响
+        from github import Github
+        _repo_cache[key] = Github(github_token).get_repo(repo_name)
+    return _repo_cache[key]
+
+
+def fetch_remote_sha(repo, file_path):
+    """读取远端文件的 blob SHA，文件不存在时返回 None。"""
+    from github import GithubException
+    try:
+        return repo.get_contents(file_path, ref="main").sha
+    except GithubException as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def commit_if_changed(repo, repo_name, file_path, content, commit_message):
+    """
+    内容与远端一致时跳过提交（返回 None），否则创建或更新文件并返回 "创建" / "更新"。
+    缓存的远端 SHA 只用于提交时的乐观并发（过期时提交被拒绝，刷新后重试）；
+    判定"内容未变化"之前总是重新读取远端 SHA 确认，过期的缓存最多导致一次多余的请求，不会导致错误地跳过提交。
+    """
+    from github import GithubException
+    cache_key = (repo_name, file_path)
+    local_sha = git_blob_sha(content)
+    if _remote_sha_cache.get(cache_key, local_sha) == local_sha:
+        # 缓存缺失，或缓存显示内容一致：向远端确认（文件可能已被工作流或其他提交修改）
+        _remote_sha_cache[cache_key] = fetch_remote_sha(repo, file_path)
+
+    for attempt in range(2):
+        remote_sha = _remote_sha_cache[cache_key]
+        if remote_sha == local_sha:
+            return None
+        try:
+            if remote_sha is None:
+                result = repo.create_file(path=file_path, message=commit_message, content=content, branch="main")
+                action = "创建"
+            else:
+                result = repo.update_file(path=file_path, message=commit_message, content=content, sha=remote_sha, branch="main")
+                action = "更新"
+            _remote_sha_cache[cache_key] = result['content'].sha
+            return action
+        except GithubException as e:
+            # 缓存的 SHA 已过期（文件被其他提交修改或删除），刷新后重试一次
+            if attempt == 0 and e.status in (404, 409, 422):
+                _remote_sha_cache[cache_key] = fetch_remote_sha(repo, file_path)
+                continue
+            raise
+
 class handler(BaseHTTPRequestHandler):
 
     def _send_response(self, status_code, data=None):
         """统一发送响应的辅助函数"""
+        self.status_code = status_code
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
         # --- 添加 CORS 头部 ---
@@ -35,7 +111,15 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_POST(self):
-        """处理 POST 请求"""
+        """处理 POST 请求，并为每个请求记录一条埋点（serverless 环境下默认只打印到日志）"""
+        self.metrics = RunMetrics('update-portfolio', metrics_file=os.environ.get('PIPELINE_METRICS_FILE'))
+        self.status_code = None
+        try:
+            self._handle_post()
+        finally:
+            self.metrics.finish(status=str(self.status_code))
+
+    def _handle_post(self):
         try:
             # 1. 解析请求体
             content_length = int(self.headers.get('Content-Length', 0))
@@ -44,15 +128,27 @@ class handler(BaseHTTPRequestHandler):
                 return
 
             post_data_raw = self.rfile.read(content_length)
-            body = json.loads(post_data_raw)
+            self.metrics.count('bytes_received', len(post_data_raw))
+            with self.metrics.stage('decode'):
+                body = json.loads(post_data_raw)
             
-            if "portfolioData" not in body:
-                self._send_response(400, {"error": "请求体中缺少 'portfolioData'"})
+            # 两种模式：portfolioData 为 base64 编码的完整工作簿；
+            # portfolioRows 为 {sheet 名称: [新增持仓行, ...]} 的增量 JSON
+            if "portfolioRows" in body:
+                rows = body["portfolioRows"]
+                if not isinstance(rows, dict) or not all(isinstance(v, list) for v in rows.values()):
+                    self._send_response(400, {"error": "'portfolioRows' 必须是 {sheet 名称: [持仓行, ...]} 格式"})
+                    return
+                file_path = ROWS_FILE_PATH
+                content = json.dumps(rows, ensure_ascii=False, indent=2).encode('utf-8')
+            elif "portfolioData" in body:
+                file_path = EXCEL_FILE_PATH
+                with self.metrics.stage('decode'):
+                    content = base64.b64decode(body["portfolioData"])
+            else:
+                self._send_response(400, {"error": "请求体中缺少 'portfolioData' 或 'portfolioRows'"})
                 return
 
-            excel_b64_string = body["portfolioData"]
-            excel_content = base64.b64decode(excel_b64_string)
-
             # 2. 配置 GitHub 访问
             github_token = os.environ.get("GITHUB_TOKEN")
             repo_owner = os.environ.get("GITHUB_REPO_OWNER")
@@ -63,34 +159,17 @@ class handler(BaseHTTPRequestHandler):
                 return
 
             repo_name = f"{repo_owner}/{repo_pro}"
-            g = Github(github_token)
-            repo = g.get_repo(repo_name)
+            repo = get_repo(github_token, repo_name)
 
-            # 3. 提交文件到 GitHub
-            file_path = "data/AIPEPortfolio_new.xlsx"
+            # 3. 内容有变化时才提交文件到 GitHub
             commit_message = f"chore: 通过 Web UI 更新投资组合数据于 {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+            with self.metrics.stage('github_commit'):
+                action = commit_if_changed(repo, repo_name, file_path, content, commit_message)
+            self.metrics.count('bytes_committed', 0 if action is None else len(content))
 
-            try:
-                contents = repo.get_contents(file_path, ref="main")
-                repo.update_file(
-                    path=contents.path,
-                    message=commit_message,
-                    content=excel_content,
-                    sha=contents.sha,
-                    branch="main"
-                )
-                action = "更新"
-            except GithubException as e:
-                if e.status == 404: # 文件不存在
-                    repo.create_file(
-                        path=file_path,
-                        message=commit_message,
-                        content=excel_content,
-                        branch="main"
-                    )
-                    action = "创建"
-                else:
-                    raise e # 重新抛出其他 GitHub 异常
+            if action is None:
+                self._send_response(200, {"message": f"'{file_path}' 内容未变化，已跳过提交。", "skipped": True})
+                return
             
             # 4. 发送成功响应
             success_message = {
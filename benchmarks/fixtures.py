@@ -0,0 +1,90 @@
+# benchmarks/fixtures.py
+# 描述：基准测试用的离线合成数据。
+# - 行情：复用 scripts/fake_akshare.py，列名与 stock_zh_a_spot_em / stock_hk_main_board_spot_em / fund_etf_spot_em 一致；
+# - 组合：三 sheet 的投资组合工作簿，历史行数可在 1 万到 100 万之间调整；
+# - 报告：stock_dynamic_data_portfolio.json 形状的记录与 partial 文件。
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT_DIR, 'scripts'), os.path.join(ROOT_DIR, 'api')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import fake_akshare
+
+PORTFOLIO_SHEETS = ['大智投资组合', '大成投资组合', '我的投资组合']
+PORTFOLIO_NAMES = {'大智投资组合': '大智 (稳健智远)', '大成投资组合': '大成 (进取成长)', '我的投资组合': '我的组合'}
+
+
+def market_frames():
+    """返回 (A股, 港股, ETF) 三张合成的全市场行情原始表（代码列尚未规范化）。"""
+    return (
+        fake_akshare.stock_zh_a_spot_em(),
+        fake_akshare.stock_hk_main_board_spot_em(),
+        fake_akshare.fund_etf_spot_em(),
+    )
+
+
+def requested_codes(count, seed=0):
+    """从三个市场中按 5:2.5:1 的比例抽取 count 个请求代码，并混入少量不存在的代码。"""
+    rng = np.random.default_rng(seed)
+    pools = [
+        fake_akshare.a_share_codes(),
+        ['HK' + code for code in fake_akshare.hk_share_codes()],
+        fake_akshare.etf_codes(),
+    ]
+    sizes = np.round(np.array([5, 2.5, 1]) / 8.5 * count).astype(int)
+    codes = [code for pool, size in zip(pools, sizes) for code in rng.choice(pool, size, replace=False)]
+    codes += [f"99{i:04d}" for i in range(max(1, count // 100))]
+    rng.shuffle(codes)
+    return [str(code) for code in codes[:count]]
+
+
+def portfolio_history(total_rows, holdings_per_snapshot=30, seed=0):
+    """
+    生成三个组合的持仓历史（{sheet 名称: DataFrame}），总行数约为 total_rows。
+    每个快照 holdings_per_snapshot 行，股票代码保留为整数以覆盖 zfill 规范化路径。
+    """
+    rng = np.random.default_rng(seed)
+    universe = np.array([int(code) for code in fake_akshare.a_share_codes()[:2000]] + [int(code) for code in fake_akshare.etf_codes()[:500]])
+    rows_per_sheet = total_rows // len(PORTFOLIO_SHEETS)
+    snapshots = max(1, rows_per_sheet // holdings_per_snapshot)
+    start = pd.Timestamp('2015-01-05 15:30')
+
+    history = {}
+    for sheet_index, sheet_name in enumerate(PORTFOLIO_SHEETS):
+        times = (start + pd.to_timedelta(np.arange(snapshots) * 6, unit='h') + pd.Timedelta(minutes=sheet_index)).strftime('%Y%m%d%H%M').astype(np.int64)
+        codes = np.concatenate([rng.choice(universe, holdings_per_snapshot, replace=False) for _ in range(snapshots)])
+        weights = rng.dirichlet(np.ones(holdings_per_snapshot), snapshots).ravel() * 100
+        history[sheet_name] = pd.DataFrame({
+            '组合名称': PORTFOLIO_NAMES[sheet_name],
+            '股票代码': codes,
+            '股票名称': [f"合成{code:06d}" for code in codes],
+            '配置比例 (%)': np.round(weights, 2),
+            '修改时间': np.repeat(times, holdings_per_snapshot),
+        })
+    return history
+
+
+def write_workbook(path, sheets):
+    """把 {sheet 名称: DataFrame} 写成 Excel 工作簿。"""
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def report_records(count, trade_date='2025-12-15', update_time='2025-12-15 15:15:48', seed=0):
+    """生成 count 条 stock_dynamic_data_portfolio.json 形状的记录，代码唯一。"""
+    rng = np.random.default_rng(seed)
+    prices = np.round(rng.lognormal(2.5, 0.8, count), 2).tolist()
+    percents = np.round(rng.normal(0, 2, count), 2).tolist()
+    amounts = np.round(rng.lognormal(2, 1, count), 2).tolist()
+    return [
+        {'代码': f"{i:06d}", '名称': f"合成{i:06d}", 'Price': price, 'Percent': percent, 'Amount': amount,
+         'update_time_bjt': update_time, 'trade_date': trade_date}
+        for i, (price, percent, amount) in enumerate(zip(prices, percents, amounts))
+    ]
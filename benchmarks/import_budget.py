@@ -0,0 +1,167 @@
+# benchmarks/import_budget.py
+# 描述：各入口（serverless 处理器与脚本）的导入耗时报告和启动预算检查。
+# 每个入口在独立的子进程中以非 __main__ 方式加载（只执行模块级代码），重复多次取最小耗时；
+# 同时用 python -X importtime 找出累计耗时最高的顶层依赖，并检查不应在导入阶段出现的重量级模块。
+# 预算是相对值：与入口交替测量一组参照导入（标准库模块或 pandas），入口耗时 / 参照耗时不得超过给定倍数，
+# 因此结果不受机器快慢和 CI 负载的影响。
+# 任何入口超出预算或导入了禁止的模块时，进程以非零状态码退出（CI 中由 .github/workflows/checks.yml 运行）。
+#
+# 用法：
+#   python benchmarks/import_budget.py                 # 报告并检查全部入口
+#   python benchmarks/import_budget.py --scale 2       # 把所有倍数放宽为 2 倍
+#   python benchmarks/import_budget.py --only api/trigger.py --top 20
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 参照导入：名称 -> 导入语句中的模块列表
+REFERENCES = {
+    # 一组常用的纯标准库模块，衡量轻量入口（serverless 冷启动）
+    'stdlib': 'json, urllib.request, http.client, email.parser, decimal',
+    # 必须导入 pandas 的入口以 pandas 本身为参照，预算只约束 pandas 之外的部分
+    'pandas': 'pandas',
+}
+
+# 入口 -> (参照导入, 入口耗时 / 参照耗时的上限, 导入阶段不允许出现的模块)
+ENTRY_POINTS = {
+    'api/trigger.py': ('stdlib', 3.0, ['requests', 'pandas', 'numpy', 'akshare']),
+    'api/update-portfolio.py': ('stdlib', 3.0, ['github', 'requests', 'pandas', 'numpy']),
+    'api/index.py': ('pandas', 1.6, ['akshare', 'requests']),
+    'scripts/merge_partials.py': ('stdlib', 1.0, ['pandas', 'numpy']),
+    'scripts/portfolioupdate.py': ('pandas', 1.6, ['akshare', 'oss2']),
+}
+
+# 在子进程中加载入口模块（模块名不是 __main__，因此不会执行脚本主体），输出耗时和已导入的模块
+LOADER = """
+import sys, json, time, importlib.util
+sys.path.insert(0, {directory!r})
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry_under_test', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))
+"""
+
+# 在子进程中计时参照导入
+REFERENCE_LOADER = """
+import time
+started = time.perf_counter()
+import {modules}
+print(time.perf_counter() - started)
+"""
+
+
+def load_entry(entry, importtime=False):
+    """在子进程中加载入口，返回 (耗时, 已导入模块列表, importtime 输出)。"""
+    path = os.path.join(ROOT_DIR, entry)
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-c', LOADER.format(directory=os.path.dirname(path), path=path)]
+    result = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        error_lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(error_lines[-1] if error_lines else f"exit code {result.returncode}")
+    payload = json.loads(result.stdout.strip().splitlines()[-1])
+    return payload['seconds'], payload['modules'], result.stderr
+
+
+def load_reference(reference):
+    """在子进程中导入参照模块，返回耗时（秒）。"""
+    command = [sys.executable, '-c', REFERENCE_LOADER.format(modules=REFERENCES[reference])]
+    result = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"reference '{reference}' failed: {result.stderr.strip().splitlines()[-1:]}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def interpreter_startup_modules():
+    """解释器启动时本来就会导入的模块（site、encodings 等），不计入入口的导入报告。"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'], capture_output=True, text=True)
+    return {name for name, _ in top_imports(result.stderr, None)}
+
+
+def top_imports(importtime_output, top, exclude=()):
+    """解析 -X importtime 的输出，返回累计耗时最高的顶层导入 [(模块, 秒)]。"""
+    entries = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 名称前的缩进表示嵌套层级，只统计第一层
+        if len(name) - len(name.lstrip()) <= 1 and name.strip() not in exclude:
+            entries.append((name.strip(), int(cumulative) / 1_000_000))
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report and startup budget check.")
+    parser.add_argument('--only', choices=list(ENTRY_POINTS), help="check a single entry point")
+    parser.add_argument('--repeat', type=int, default=5, help="cold loads per entry point (minimum is reported)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every ratio budget by this factor")
+    parser.add_argument('--top', type=int, default=8, help="number of top-level imports to list per entry")
+    parser.add_argument('--output', help="also write the report JSON to this path")
+    args = parser.parse_args()
+
+    startup_modules = interpreter_startup_modules()
+    report = {}
+    failures = []
+    for entry, (reference, max_ratio, forbidden) in ENTRY_POINTS.items():
+        if args.only and entry != args.only:
+            continue
+        max_ratio *= args.scale
+        try:
+            # 入口与参照交替测量，两者受到相同的机器负载影响
+            timings, reference_timings = [], []
+            for _ in range(args.repeat):
+                timings.append(load_entry(entry)[0])
+                reference_timings.append(load_reference(reference))
+            _, modules, importtime_output = load_entry(entry, importtime=True)
+        except RuntimeError as e:
+            failures.append(f"{entry}: import failed ({e})")
+            report[entry] = {'error': str(e)}
+            print(f"\n{entry}: IMPORT FAILED ({e})")
+            continue
+
+        seconds = min(timings)
+        reference_seconds = min(reference_timings)
+        ratio = seconds / reference_seconds
+        loaded_forbidden = [name for name in forbidden if name in modules]
+        report[entry] = {
+            'seconds': round(seconds, 4),
+            'reference': reference,
+            'reference_seconds': round(reference_seconds, 4),
+            'ratio': round(ratio, 3),
+            'max_ratio': max_ratio,
+            'modules_loaded': len(modules),
+            'forbidden_loaded': loaded_forbidden,
+            'top_imports': [[name, round(cumulative, 4)] for name, cumulative in top_imports(importtime_output, args.top, startup_modules)],
+        }
+
+        status = 'OK' if ratio <= max_ratio and not loaded_forbidden else 'OVER BUDGET'
+        print(f"\n{entry}: {seconds:.3f}s = {ratio:.2f}x {reference} ({reference_seconds:.3f}s), "
+              f"budget {max_ratio:.2f}x, {len(modules)} modules {status}")
+        for name, cumulative in report[entry]['top_imports']:
+            print(f"    {cumulative:8.4f}s  {name}")
+        if ratio > max_ratio:
+            failures.append(f"{entry}: {ratio:.2f}x the '{reference}' reference exceeds the {max_ratio:.2f}x budget")
+        if loaded_forbidden:
+            failures.append(f"{entry}: imports {', '.join(loaded_forbidden)} at load time")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if failures:
+        print(f"\n{len(failures)} startup budget violation(s):")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nAll entry points are within their startup budgets.")
+
+
+if __name__ == "__main__":
+    main()
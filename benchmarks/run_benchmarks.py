@@ -0,0 +1,239 @@
+# benchmarks/run_benchmarks.py
+# 描述：离线基准测试。对 process_dynamic_securities_report、merge_excel 和 partial 文件合并
+# 在多个规模下计时（取中位数），单独跑一次 tracemalloc 记录峰值内存，并与保存的基线比较，
+# 任何一项比基线慢超过阈值即视为回归，进程以非零状态码退出。全程不访问网络。
+# 与 import_budget.py 一样按相对值比较：每次运行先测一个固定的参照负载（calibration），
+# 各项耗时除以参照耗时后再与基线中同样归一化的值比较，因此基线可以在不同速度的机器上复用
+# （CI 中由 .github/workflows/checks.yml 运行）。耗时低于 --min-seconds 的项只报告，不判定回归。
+#
+# 用法：
+#   python benchmarks/run_benchmarks.py                    # 默认规模，与 benchmarks/baseline.json 比较
+#   python benchmarks/run_benchmarks.py --full             # 追加 100 万行组合历史等大规模场景
+#   python benchmarks/run_benchmarks.py --update-baseline  # 用本次结果覆盖基线
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+import contextlib
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import fixtures  # noqa: F401  同时把 scripts/ 与 api/ 加入 sys.path
+from fixtures import market_frames, requested_codes, portfolio_history, write_workbook, report_records
+
+import index
+import merge_partials
+import portfolioupdate
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# 参照负载在结果与基线中的名称
+CALIBRATION = 'calibration'
+
+DEFAULT_SCALES = {
+    'codes': [10, 100, 1000],
+    'history_rows': [10_000, 100_000],
+    'report_records': [10_000, 100_000],
+}
+FULL_SCALES = {
+    'codes': [10, 100, 1000, 5000],
+    'history_rows': [10_000, 100_000, 1_000_000],
+    'report_records': [10_000, 100_000, 1_000_000],
+}
+
+
+def measure(func, repeat, setup=None):
+    """运行 func repeat 次（每次之前执行 setup），返回耗时中位数、最小值和单独一次运行的峰值内存。"""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if setup:
+            setup()
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'median_seconds': round(statistics.median(timings), 6),
+        'min_seconds': round(min(timings), 6),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def calibration_workload():
+    """固定的参照负载：与被测代码相近的 pandas 分组排序、逐行 Python 循环和 JSON 编码。"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'code': rng.integers(0, 5000, 200_000), 'value': rng.random(200_000)})
+    df.sort_values(['code', 'value']).groupby('code')['value'].agg(['sum', 'max'])
+    records = [{'代码': f"{i:06d}", '最新价': random.random(), '名称': f"名称{i}"} for i in range(20_000)]
+    json.dumps(records, ensure_ascii=False)
+
+
+def bench_calibration(repeat):
+    return {CALIBRATION: measure(calibration_workload, max(repeat, 5))}
+
+
+def bench_process_report(scales, repeat):
+    """全市场行情（约 5000 / 2500 / 1000 行）下处理不同长度的代码列表。"""
+    df_a, df_hk, df_etf = market_frames()
+    trade_date = '2025-12-15'
+    df_a, _ = index.prepare_market_frame('a_shares', df_a, trade_date)
+    df_hk, _ = index.prepare_market_frame('hk_shares', df_hk, trade_date)
+    df_etf, _ = index.prepare_market_frame('etf', df_etf, trade_date)
+
+    results = {}
+    for count in scales['codes']:
+        codes = requested_codes(count)
+        results[f"process_dynamic_securities_report[codes={count}]"] = measure(
+            lambda: index.process_dynamic_securities_report(df_a, df_etf, df_hk, trade_date, codes), repeat)
+    return results
+
+
+def bench_merge_excel(scales, repeat, workdir):
+    """在已有 N 行历史的组合库上追加一次新快照，完整导出 Excel 视图，以及每次更新后的增量发布。"""
+    results = {}
+    new_sheets = portfolio_history(90, seed=1)
+    for rows in scales['history_rows']:
+        case_dir = os.path.join(workdir, f"merge_excel_{rows}")
+        os.makedirs(os.path.join(case_dir, 'data'))
+        os.chdir(case_dir)
+        write_workbook(portfolioupdate.ORIGINAL_FILE, portfolio_history(rows))
+        write_workbook(portfolioupdate.NEW_FILE, new_sheets)
+
+        # 首次运行从原始工作簿引导历史，不计入耗时
+        with contextlib.redirect_stdout(io.StringIO()):
+            portfolioupdate.merge_excel()
+        results[f"merge_excel[history_rows={rows}]"] = measure(portfolioupdate.merge_excel, repeat)
+        results[f"export_excel[history_rows={rows}]"] = measure(
+            lambda: portfolioupdate.export_excel(force=True), repeat, setup=portfolioupdate.merge_excel)
+
+        # 每次更新后的发布：首次发布（上传全部历史）不计入耗时，之后只发布新增分片和变化的组合
+        portfolioupdate.OSS_LOCAL_DIR = os.path.join(case_dir, 'oss')
+        with contextlib.redirect_stdout(io.StringIO()):
+            portfolioupdate.upload_to_oss()
+        results[f"upload_to_oss[history_rows={rows}]"] = measure(
+            portfolioupdate.upload_to_oss, repeat, setup=portfolioupdate.merge_excel)
+        portfolioupdate.OSS_LOCAL_DIR = None
+    os.chdir(BENCHMARK_DIR)
+    return results
+
+
+def bench_merge_partials(scales, repeat, workdir):
+    """把 3 个各含 1000 条记录的 partial 文件 upsert 进 N 条记录的报告。"""
+    results = {}
+    for count in scales['report_records']:
+        case_dir = os.path.join(workdir, f"merge_partials_{count}")
+        os.makedirs(case_dir)
+        report_path = os.path.join(case_dir, 'report.json')
+        pristine_path = os.path.join(case_dir, 'report.pristine.json')
+        with open(pristine_path, 'w', encoding='utf-8') as f:
+            json.dump(report_records(count), f, ensure_ascii=False, indent=2)
+
+        partial_paths = []
+        for i in range(3):
+            records = report_records(1000, update_time='2025-12-16 15:15:48', trade_date='2025-12-16', seed=i + 1)
+            for j, record in enumerate(records):
+                record['代码'] = f"{(i * 1000 + j) * (count // 3000 or 1):06d}"
+            path = os.path.join(case_dir, f"partial_{i}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=4)
+            partial_paths.append(path)
+
+        results[f"merge_partials[report_records={count}]"] = measure(
+            lambda: merge_partials.merge_partials(report_path, partial_paths), repeat,
+            setup=lambda: shutil.copyfile(pristine_path, report_path))
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold, min_seconds=0.0):
+    """
+    返回回归列表 [(名称, 基线耗时, 本次耗时, 倍数)]。两边都有参照负载时，倍数按各自参照耗时归一化后计算，
+    抵消机器速度的差异；本次耗时低于 min_seconds 的项只记录倍数，不判定回归。
+    """
+    current_calibration = results.get(CALIBRATION, {}).get('median_seconds')
+    base_calibration = baseline.get(CALIBRATION, {}).get('median_seconds')
+    speed = base_calibration / current_calibration if current_calibration and base_calibration else 1.0
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or name == CALIBRATION:
+            continue
+        ratio = result['median_seconds'] * speed / base['median_seconds'] if base['median_seconds'] else float('inf')
+        result['baseline_ratio'] = round(ratio, 3)
+        if ratio > threshold and result['median_seconds'] >= min_seconds:
+            regressions.append((name, base['median_seconds'], result['median_seconds'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the data pipeline.")
+    parser.add_argument('--full', action='store_true', help="include the large (up to 1M rows) scales")
+    parser.add_argument('--repeat', type=int, default=3, help="timed repetitions per benchmark")
+    parser.add_argument('--only', choices=['process', 'merge_excel', 'merge_partials'], help="run a single group")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="flag a regression above this slowdown ratio")
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help="do not flag benchmarks faster than this (timer noise dominates)")
+    parser.add_argument('--update-baseline', action='store_true', help="overwrite the baseline with this run")
+    parser.add_argument('--output', help="also write the results JSON to this path")
+    args = parser.parse_args()
+
+    scales = FULL_SCALES if args.full else DEFAULT_SCALES
+    results = {}
+    results.update(bench_calibration(args.repeat))
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.only in (None, 'process'):
+            results.update(bench_process_report(scales, args.repeat))
+        if args.only in (None, 'merge_excel'):
+            results.update(bench_merge_excel(scales, args.repeat, workdir))
+        if args.only in (None, 'merge_partials'):
+            results.update(bench_merge_partials(scales, args.repeat, workdir))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold, args.min_seconds)
+
+    print(f"{'benchmark':<55} {'median(s)':>10} {'min(s)':>10} {'peak(MB)':>9} {'vs base':>8}")
+    for name, result in results.items():
+        ratio = f"{result['baseline_ratio']:.2f}x" if 'baseline_ratio' in result else '-'
+        print(f"{name:<55} {result['median_seconds']:>10.4f} {result['min_seconds']:>10.4f} {result['peak_mb']:>9.2f} {ratio:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        baseline.update({name: {key: value for key, value in result.items() if key != 'baseline_ratio'}
+                         for name, result in results.items()})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+
+    if not baseline:
+        print(f"No baseline found at {args.baseline}. Run with --update-baseline to record one.")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x:")
+        for name, base, current, ratio in regressions:
+            print(f"  - {name}: {base:.4f}s -> {current:.4f}s ({ratio:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
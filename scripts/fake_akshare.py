@@ -0,0 +1,91 @@
+# scripts/fake_akshare.py
+# 描述：离线的 akshare 替身，提供与 stock_zh_a_spot_em / stock_hk_main_board_spot_em / fund_etf_spot_em
+# 同名、同列名的函数，返回确定性的合成行情（默认约 5000 只 A 股、2500 只港股、1000 只 ETF）。
+# 可在没有网络的环境下替代真实接口，用于本地调试行情服务、跑基准测试等。
+# symbol_quote 与 fetch_planner.eastmoney_symbol_quote 接口一致，可作为 FetchPlanner 的单代码报价替身。
+# 行情规模与随机种子可通过环境变量 FAKE_AKSHARE_A_ROWS / FAKE_AKSHARE_HK_ROWS / FAKE_AKSHARE_ETF_ROWS /
+# FAKE_AKSHARE_SEED 调整；每次调用都会在基准价格上叠加少量随机波动，模拟行情刷新。
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone, timedelta
+
+A_ROWS = int(os.environ.get('FAKE_AKSHARE_A_ROWS', '5000'))
+HK_ROWS = int(os.environ.get('FAKE_AKSHARE_HK_ROWS', '2500'))
+ETF_ROWS = int(os.environ.get('FAKE_AKSHARE_ETF_ROWS', '1000'))
+SEED = int(os.environ.get('FAKE_AKSHARE_SEED', '20250921'))
+
+_call_counter = itertools.count()
+
+
+def a_share_codes(rows=A_ROWS):
+    """深市 00xxxx/30xxxx 与沪市 60xxxx 交替排列的 6 位代码。"""
+    prefixes = ('00', '60', '30')
+    return [f"{prefixes[i % 3]}{i // 3 + 1:04d}" for i in range(rows)]
+
+
+def hk_share_codes(rows=HK_ROWS):
+    """5 位港股代码（不带 'HK' 前缀，与 akshare 原始输出一致）。"""
+    return [f"{i + 1:05d}" for i in range(rows)]
+
+
+def etf_codes(rows=ETF_ROWS):
+    """沪市 51xxxx 与深市 15xxxx 交替排列的 ETF 代码。"""
+    return [f"{510000 + i // 2:06d}" if i % 2 == 0 else f"{159000 + i // 2:06d}" for i in range(rows)]
+
+
+def _quotes(codes, price_scale, seed):
+    """生成一张基础行情表：基准价格由 seed 决定，每次调用叠加一层新的随机波动。"""
+    rows = len(codes)
+    base = np.random.default_rng(seed)
+    jitter = np.random.default_rng([seed, next(_call_counter)])
+    prev_close = np.round(base.lognormal(np.log(price_scale), 0.8, rows), 2)
+    percent = np.round(jitter.normal(0, 2, rows).clip(-10, 10), 2)
+    price = np.round(prev_close * (1 + percent / 100), 3)
+    volume = base.integers(1_000, 50_000_000, rows).astype(float)
+    df = pd.DataFrame({
+        '序号': np.arange(1, rows + 1),
+        '代码': codes,
+        '名称': [f"合成{code}" for code in codes],
+        '最新价': price,
+        '涨跌额': np.round(price - prev_close, 3),
+        '涨跌幅': percent,
+        '成交量': volume,
+        '成交额': np.round(volume * price * 100, 2),
+        '昨收': prev_close,
+    })
+    # 真实行情中停牌证券的价格为空
+    suspended = jitter.random(rows) < 0.01
+    df.loc[suspended, ['最新价', '涨跌额', '涨跌幅', '成交量', '成交额']] = np.nan
+    return df
+
+
+def stock_zh_a_spot_em():
+    df = _quotes(a_share_codes(), 15, SEED)
+    rng = np.random.default_rng(SEED + 1)
+    df['市盈率-动态'] = np.round(rng.normal(30, 40, len(df)), 2)
+    df['市净率'] = np.round(rng.lognormal(0.8, 0.6, len(df)), 2)
+    return df
+
+
+def stock_hk_main_board_spot_em():
+    return _quotes(hk_share_codes(), 8, SEED + 2)
+
+
+def fund_etf_spot_em():
+    df = _quotes(etf_codes(), 2, SEED + 3)
+    df['数据日期'] = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+    return df
+
+
+def symbol_quote(list_type, code):
+    """单个代码的报价，列名与全市场接口一致；代码不存在时返回 None。code 为原始代码（港股不带 'HK' 前缀）。"""
+    fetchers = {'a_shares': stock_zh_a_spot_em, 'hk_shares': stock_hk_main_board_spot_em, 'etf': fund_etf_spot_em}
+    df = fetchers[list_type]()
+    match = df[df['代码'] == code]
+    if match.empty:
+        return None
+    row = match.iloc[0].drop(['序号', '涨跌额', '成交量', '昨收']).to_dict()
+    return {key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in row.items()}
@@ -0,0 +1,261 @@
+# scripts/fetch_planner.py
+# 描述：按代码数量自适应选择行情获取方式。
+# - 全市场接口（akshare 的 *_spot_em）按页下载整个市场，页数固定，适合代码较多的请求；
+# - 单代码报价接口（东方财富 push2 qt/stock/get，与 akshare.stock_bid_ask_em 相同）每个代码一次请求，
+#   以有限的并发并行拉取，适合只有几个到几十个代码的自选列表。
+# 规划器用一个简单的耗时模型比较两种方式，单代码方式失败过多、熔断或有代码未找到时自动回退到全市场接口。
+# 两种方式返回的 DataFrame 列名相同，后续的 prepare_market_frame / process_dynamic_securities_report 无需区分。
+# 每个接口各有一个熔断器：连续失败达到阈值后在冷却期内直接拒绝调用，冷却结束后放行一次试探请求。
+
+import os
+import math
+import time
+import threading
+import pandas as pd
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_metrics import count
+
+# 规划器配置（从环境变量读取）
+# FETCH_PLANNER_MODE：auto = 按耗时模型选择；full = 始终下载全市场；symbol = 始终按代码拉取
+FETCH_PLANNER_MODE = os.environ.get('FETCH_PLANNER_MODE', 'auto')
+FETCH_SYMBOL_CONCURRENCY = int(os.environ.get('FETCH_SYMBOL_CONCURRENCY', '8'))
+FETCH_SYMBOL_MAX_CODES = int(os.environ.get('FETCH_SYMBOL_MAX_CODES', '200'))
+FETCH_SYMBOL_SECONDS = float(os.environ.get('FETCH_SYMBOL_SECONDS', '0.2'))
+FETCH_PAGE_SECONDS = float(os.environ.get('FETCH_PAGE_SECONDS', '0.4'))
+FETCH_SYMBOL_TIMEOUT = float(os.environ.get('FETCH_SYMBOL_TIMEOUT', '5'))
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', '2'))
+FETCH_BACKOFF_SECONDS = float(os.environ.get('FETCH_BACKOFF_SECONDS', '0.5'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get('BREAKER_COOLDOWN_SECONDS', '60'))
+# 单代码方式失败（含未找到以外的异常）比例超过该值时放弃结果，回退到全市场接口
+FETCH_SYMBOL_MAX_FAILURE_RATIO = float(os.environ.get('FETCH_SYMBOL_MAX_FAILURE_RATIO', '0.2'))
+
+# 全市场接口每页 100 条时的大致页数，用于估算全市场下载耗时
+FULL_MARKET_PAGES = {'a_shares': 58, 'hk_shares': 27, 'etf': 14}
+
+SYMBOL_QUOTE_URL = 'https://push2.eastmoney.com/api/qt/stock/get'
+# f58 名称、f43 最新价、f170 涨跌幅、f48 成交额、f162 市盈率(动)、f167 市净率、f86 行情时间戳
+SYMBOL_QUOTE_FIELDS = 'f43,f48,f58,f86,f162,f167,f170'
+
+# 单代码报价转换成的列，与对应全市场接口的列名一致
+SYMBOL_COLUMNS = {
+    'a_shares': ['代码', '名称', '最新价', '涨跌幅', '成交额', '市盈率-动态', '市净率'],
+    'hk_shares': ['代码', '名称', '最新价', '涨跌幅', '成交额'],
+    'etf': ['代码', '名称', '最新价', '涨跌幅', '成交额', '数据日期'],
+}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝。"""
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后打开，cooldown_seconds 后进入半开状态放行一次试探调用。"""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown_seconds=BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                # 半开：放行这一次，失败会立即重新打开
+                self.opened_at = None
+                self.failures = self.failure_threshold - 1
+                return True
+            return False
+
+    def is_open(self):
+        """熔断器是否处于冷却期内（不改变状态）。"""
+        with self.lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown_seconds
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                print(f"Circuit breaker for '{self.name}' opened after {self.failures} consecutive failures.")
+
+
+# 进程内按接口名称共享的熔断器
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def call_with_retry(func, breaker, retries=FETCH_RETRIES, backoff_seconds=FETCH_BACKOFF_SECONDS):
+    """调用 func，失败时按指数退避重试；每次尝试前检查熔断器，结果计入熔断器。"""
+    last_error = None
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for '{breaker.name}' is open.")
+        try:
+            result = func()
+        except Exception as e:
+            breaker.record_failure()
+            last_error = e
+            if attempt < retries:
+                time.sleep(backoff_seconds * 2 ** attempt)
+            continue
+        breaker.record_success()
+        return result
+    raise last_error
+
+
+# 沪市 A 股（60x 主板、68x 科创板）与 B 股（900xxx）的代码前缀；北交所 920xxx 与深市一样使用 0.
+SH_STOCK_PREFIXES = ('60', '68', '90')
+
+
+def _symbol_secid(list_type, code):
+    """东方财富的证券标识：沪市 1.、深市/北交所 0.、港股 116.。"""
+    if list_type == 'hk_shares':
+        return f"116.{code}"
+    if list_type == 'etf':
+        return f"{1 if code.startswith('5') else 0}.{code}"
+    return f"{1 if code.startswith(SH_STOCK_PREFIXES) else 0}.{code}"
+
+
+def _number(value):
+    """接口对停牌等缺失值返回 '-'，统一转换为 None。"""
+    return value if isinstance(value, (int, float)) else None
+
+
+def eastmoney_symbol_quote(list_type, code, session=None):
+    """
+    拉取单个代码的实时报价，返回与全市场接口同列名的 dict；代码不存在时返回 None。
+    code 为原始代码（港股不带 'HK' 前缀）。网络或解析错误直接抛出，由调用方重试。
+    """
+    import requests
+    params = {'fltt': '2', 'invt': '2', 'fields': SYMBOL_QUOTE_FIELDS, 'secid': _symbol_secid(list_type, code)}
+    response = (session or requests).get(SYMBOL_QUOTE_URL, params=params, timeout=FETCH_SYMBOL_TIMEOUT)
+    response.raise_for_status()
+    data = response.json().get('data')
+    if not data:
+        return None
+
+    row = {'代码': code, '名称': data.get('f58'), '最新价': _number(data.get('f43')),
+           '涨跌幅': _number(data.get('f170')), '成交额': _number(data.get('f48'))}
+    if list_type == 'a_shares':
+        row['市盈率-动态'] = _number(data.get('f162'))
+        row['市净率'] = _number(data.get('f167'))
+    elif list_type == 'etf' and data.get('f86'):
+        row['数据日期'] = datetime.fromtimestamp(data['f86'], timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+    return row
+
+
+class FetchPlanner:
+    """在全市场下载与按代码并行拉取之间选择，并负责重试、熔断和回退。"""
+
+    def __init__(self, symbol_fetcher=None, mode=FETCH_PLANNER_MODE, concurrency=FETCH_SYMBOL_CONCURRENCY,
+                 max_symbol_codes=FETCH_SYMBOL_MAX_CODES, symbol_seconds=FETCH_SYMBOL_SECONDS,
+                 page_seconds=FETCH_PAGE_SECONDS):
+        self._symbol_fetcher = symbol_fetcher
+        self.mode = mode
+        self.concurrency = concurrency
+        self.max_symbol_codes = max_symbol_codes
+        self.symbol_seconds = symbol_seconds
+        self.page_seconds = page_seconds
+
+    @property
+    def symbol_fetcher(self):
+        """默认使用东方财富单代码接口，第一次用到时才创建线程间共享的带连接池的 Session。"""
+        if self._symbol_fetcher is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_SYMBOL_CONCURRENCY))
+            self._symbol_fetcher = lambda list_type, code: eastmoney_symbol_quote(list_type, code, session=session)
+        return self._symbol_fetcher
+
+    def estimate(self, list_type, n_codes):
+        """两种方式的估计耗时（秒）与请求数。"""
+        pages = FULL_MARKET_PAGES.get(list_type, 50)
+        return {
+            'full': {'seconds': pages * self.page_seconds, 'requests': pages},
+            'symbol': {'seconds': math.ceil(n_codes / max(1, self.concurrency)) * self.symbol_seconds, 'requests': n_codes},
+        }
+
+    def plan(self, list_type, codes):
+        """返回 'symbol' 或 'full'。"""
+        if not codes or self.mode == 'full':
+            return 'full'
+        if self.mode == 'symbol':
+            return 'symbol'
+        if len(codes) > self.max_symbol_codes or get_breaker(f"symbol.{list_type}").is_open():
+            return 'full'
+        cost = self.estimate(list_type, len(codes))
+        return 'symbol' if cost['symbol']['seconds'] < cost['full']['seconds'] else 'full'
+
+    def fetch_symbols(self, list_type, codes):
+        """
+        以有限并发逐个拉取代码，返回全市场接口同列名的 DataFrame。
+        熔断、失败比例过高或有代码未找到（接口返回空数据）时抛出异常，由调用方回退到全市场接口，
+        代码不会因单代码接口查不到而被悄悄丢掉。
+        """
+        breaker = get_breaker(f"symbol.{list_type}")
+        raw_codes = list(dict.fromkeys(code[2:] if list_type == 'hk_shares' and code.startswith('HK') else code
+                                       for code in map(str, codes)))
+
+        def fetch_one(code):
+            try:
+                return call_with_retry(lambda: self.symbol_fetcher(list_type, code), breaker), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(raw_codes)))) as executor:
+            results = list(executor.map(fetch_one, raw_codes))
+
+        errors = [error for _, error in results if error is not None]
+        count(f'symbol_requests.{list_type}', len(raw_codes))
+        count(f'symbol_failures.{list_type}', len(errors))
+        if any(isinstance(error, CircuitOpenError) for error in errors) or len(errors) > FETCH_SYMBOL_MAX_FAILURE_RATIO * len(raw_codes):
+            raise RuntimeError(f"{len(errors)} of {len(raw_codes)} symbol quotes failed (first error: {errors[0]})")
+        missing = [code for code, (row, error) in zip(raw_codes, results) if row is None and error is None]
+        count(f'symbol_misses.{list_type}', len(missing))
+        if missing:
+            raise RuntimeError(f"{len(missing)} of {len(raw_codes)} codes not found on the per-symbol endpoint: "
+                               f"{', '.join(missing[:10])}")
+        rows = [row for row, _ in results if row is not None]
+        return pd.DataFrame(rows, columns=SYMBOL_COLUMNS[list_type])
+
+    def fetch(self, list_type, codes, base_trade_date, snapshot_cache, full_fetcher):
+        """
+        获取 list_type 市场中 codes 的原始行情，返回 (DataFrame, 实际使用的方式)。
+        TTL 内的全市场快照不需要任何网络请求，总是优先使用。
+        """
+        cached = snapshot_cache.get(list_type, base_trade_date)
+        if cached is not None:
+            print(f"Using cached '{list_type}' snapshot for {base_trade_date} ({len(cached)} rows).")
+            return cached, 'cache'
+
+        if self.plan(list_type, codes) == 'symbol':
+            try:
+                df = self.fetch_symbols(list_type, codes)
+                print(f"Fetched {len(df)} of {len(codes)} '{list_type}' quotes through the per-symbol endpoint.")
+                return df, 'symbol'
+            except Exception as e:
+                print(f"Per-symbol fetch for '{list_type}' failed ({e}). Falling back to the full-market endpoint.")
+
+        breaker = get_breaker(f"full.{list_type}")
+        df = snapshot_cache.fetch(list_type, base_trade_date, lambda: call_with_retry(full_fetcher, breaker))
+        return df, 'full'
@@ -0,0 +1,60 @@
+# scripts/lazy_imports.py
+# 描述：重量级依赖的按需导入。
+# import akshare 会在 akshare/__init__.py 中一次性导入上千个接口所在的全部子模块，耗时远超实际用到的那一个。
+# load_akshare_fetcher 只导入指定行情函数所在的子模块，并且只在第一次真正需要拉取行情时才导入；
+# 快照缓存命中时完全不会导入 akshare。直接导入失败时退回完整的 import akshare。
+# 各入口的导入耗时与预算检查见 benchmarks/import_budget.py。
+
+import sys
+import types
+import importlib
+import importlib.util
+import threading
+
+# akshare 行情函数 -> 定义它的子模块
+AKSHARE_FETCHER_MODULES = {
+    'stock_zh_a_spot_em': 'akshare.stock_feature.stock_hist_em',
+    'stock_hk_main_board_spot_em': 'akshare.stock_feature.stock_hist_em',
+    'fund_etf_spot_em': 'akshare.fund.fund_etf_em',
+}
+
+_lock = threading.Lock()
+
+
+def _import_without_package_init(package, module_name):
+    """
+    导入 package 的子模块而不执行 package/__init__.py：导入期间在 sys.modules 中放一个只有 __path__ 的空包。
+    导入完成后移除空包，之后完整的 import package 仍会正常执行 __init__，并复用已导入的子模块。
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(package)
+    if spec is None or spec.submodule_search_locations is None:
+        raise ImportError(f"'{package}' is not an installed package")
+    shell = types.ModuleType(package)
+    shell.__path__ = list(spec.submodule_search_locations)
+    shell.__spec__ = spec
+    sys.modules[package] = shell
+    try:
+        return importlib.import_module(module_name)
+    finally:
+        if sys.modules.get(package) is shell:
+            del sys.modules[package]
+
+
+def load_akshare_fetcher(name):
+    """返回 akshare 中名为 name 的行情函数，只导入它所在的子模块。"""
+    with _lock:
+        akshare = sys.modules.get('akshare')
+        if akshare is not None and hasattr(akshare, name):
+            return getattr(akshare, name)
+
+        module_name = AKSHARE_FETCHER_MODULES.get(name)
+        if module_name:
+            try:
+                return getattr(_import_without_package_init('akshare', module_name), name)
+            except Exception as e:
+                print(f"Could not import '{name}' from {module_name} directly ({e}). Importing the full akshare package.")
+
+        import akshare
+        return getattr(akshare, name)
@@ -0,0 +1,165 @@
+# scripts/merge_partials.py
+# 描述：把 data/partial_*.json 增量合并（upsert）进 data/stock_dynamic_data_portfolio.json。
+# 以「代码」为键建立现有报告的索引，只更新 partial 中出现的代码，同一代码保留 update_time_bjt 最新的一条；
+# 没有出现在本次 partial 中的市场和代码原样保留。结果以紧凑 JSON（无缩进）先写临时文件再原子替换；
+# upsert 没有改变任何代码时不重写报告。
+# partial 文件可以是记录数组，也可以是列式文档（见 scripts/report_formats.py）。
+# 设置 REPORT_COLUMNAR_OUTPUT=1 时，合并后另外写出按市场拆分的列式报告、压缩版本和 ETag manifest。
+# 作为脚本运行时（data-merger 工作流，串行执行）还会把本次实际更新的行情写入本地行情历史库 data/quote_history，
+# 并用 partial 中的代码和名称增量更新证券主表 data/security_master.json（partial_<list_type>.json 中的代码归入该市场）；
+# 并发的行情拉取任务不写历史库和主表，避免多个任务同时改写同一个文件。
+
+import os
+import glob
+import json
+
+from security_master import MARKET_TYPES
+
+from report_formats import (REPORT_COLUMNAR_OUTPUT, REPORT_COLUMNAR_DIR, REPORT_MANIFEST_NAME, is_columnar,
+                            from_columnar, encode_compact, publish_columnar_report)
+
+REPORT_FILE = 'data/stock_dynamic_data_portfolio.json'
+PARTIAL_PATTERN = 'data/partial_*.json'
+
+
+def load_records(path):
+    """读取 JSON 数组或列式文档，文件不存在或内容无效时返回空列表。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError as e:
+        print(f"Warning: Could not parse '{path}': {e}. Treating it as empty.")
+        return []
+    if is_columnar(records):
+        return from_columnar(records)
+    return records if isinstance(records, list) else []
+
+
+def upsert_records(index, records, accepted=None):
+    """
+    把 records 按「代码」upsert 到 index（dict，保持插入顺序）中。
+    已有代码只在新记录的 update_time_bjt 不早于现有记录时才覆盖。返回实际发生变化的代码数；
+    给出 accepted（list）时把实际写入的记录追加进去。
+    """
+    changed = 0
+    for record in records:
+        code = record.get('代码') if isinstance(record, dict) else None
+        if code is None:
+            continue
+        current = index.get(code)
+        if current is not None and str(record.get('update_time_bjt') or '') < str(current.get('update_time_bjt') or ''):
+            continue
+        if current != record:
+            index[code] = record
+            changed += 1
+            if accepted is not None:
+                accepted.append(record)
+    return changed
+
+
+def write_records_atomic(path, records):
+    """以紧凑 JSON 先写入同目录下的临时文件，再用 os.replace 原子替换目标文件。"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_compact(records))
+    os.replace(tmp_path, path)
+
+
+def ingest_history(records):
+    """把实际写入报告的行情追加到行情历史库；来自过期回退快照的记录不写入。"""
+    from quote_history import QuoteHistoryStore
+    records = [record for record in records if not record.get('stale')]
+    if records:
+        QuoteHistoryStore().ingest(records)
+
+
+def partial_market(path):
+    """partial_<list_type>.json 对应的市场，文件名不是已知市场时返回 None。"""
+    name = os.path.basename(path)
+    market = name[len('partial_'):-len('.json')] if name.startswith('partial_') and name.endswith('.json') else None
+    return market if market in MARKET_TYPES else None
+
+
+def update_master(records_by_market):
+    """
+    用 {市场: [记录]} 增量更新证券主表（只增补，不移除，不改动已归入其他市场的代码），有变化时保存。
+    """
+    import pandas as pd
+    from security_master import SecurityMaster
+    master = SecurityMaster()
+    changed = False
+    for market, records in records_by_market.items():
+        df = pd.DataFrame([{'代码': record['代码'], '名称': record.get('名称')} for record in records],
+                          columns=['代码', '名称'])
+        changed = master.update_market(market, df, complete=False) or changed
+    if changed:
+        master.save()
+    else:
+        print("Security master is up to date.")
+
+
+def merge_partials(report_path=REPORT_FILE, partial_paths=None, columnar=REPORT_COLUMNAR_OUTPUT, history=False,
+                   master=False):
+    """
+    把所有 partial 文件 upsert 进报告。返回变化的代码数；没有变化时不重写报告。
+    history 为真时把实际更新的记录写入行情历史库；master 为真时用 partial 中的代码更新证券主表。
+    columnar 为真时同时刷新列式报告（内容未变化的市场不会重写；报告没有变化且列式报告已存在时整体跳过）。
+    """
+    if partial_paths is None:
+        partial_paths = sorted(glob.glob(PARTIAL_PATTERN))
+    if not partial_paths:
+        print("No partial files found to merge.")
+        return 0
+
+    index = {}
+    for record in load_records(report_path):
+        if isinstance(record, dict) and '代码' in record:
+            index[record['代码']] = record
+    print(f"Loaded {len(index)} existing records from {report_path}")
+
+    changed = 0
+    accepted = []
+    records_by_market = {}
+    for partial_path in partial_paths:
+        records = load_records(partial_path)
+        partial_changed = upsert_records(index, records, accepted)
+        print(f"  - {partial_path}: {partial_changed} codes upserted")
+        changed += partial_changed
+        market = partial_market(partial_path)
+        if market:
+            records_by_market.setdefault(market, []).extend(
+                record for record in records if isinstance(record, dict) and record.get('代码'))
+
+    if changed == 0:
+        print("No changes detected after merge. Report left untouched.")
+    else:
+        write_records_atomic(report_path, list(index.values()))
+        print(f"Merge complete. {changed} codes updated, {len(index)} records written to {report_path}")
+
+    if history:
+        try:
+            ingest_history(accepted)
+        except Exception as e:
+            print(f"Warning: Could not ingest merged quotes into the history store: {e}")
+
+    if master and records_by_market:
+        try:
+            update_master(records_by_market)
+        except Exception as e:
+            print(f"Warning: Could not update the security master: {e}")
+
+    if columnar and (changed or not os.path.exists(os.path.join(REPORT_COLUMNAR_DIR, REPORT_MANIFEST_NAME))):
+        publish_columnar_report(list(index.values()))
+    return changed
+
+
+def main():
+    merge_partials(history=True, master=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# scripts/object_storage.py
+# 描述：可插拔的对象存储接口，以及按内容校验的条件上传。
+# - OSSStorage：阿里云 OSS 实现，大文件走 oss2.resumable_upload（分片、断点续传、多线程并行上传分片）；
+# - LocalStorage：本地文件系统实现，接口与 OSSStorage 相同，用于离线调试；
+# 上传前先比较本地 MD5 与远端对象元数据中的 MD5，一致时跳过上传。
+
+import os
+import abc
+import json
+import shutil
+import hashlib
+
+# 分片上传配置（从环境变量读取）
+OSS_MULTIPART_THRESHOLD_MB = float(os.environ.get('OSS_MULTIPART_THRESHOLD_MB', '10'))
+OSS_PART_SIZE_MB = float(os.environ.get('OSS_PART_SIZE_MB', '2'))
+OSS_UPLOAD_THREADS = int(os.environ.get('OSS_UPLOAD_THREADS', '4'))
+OSS_RESUMABLE_DIR = os.environ.get('OSS_RESUMABLE_DIR', '.oss_resumable')
+
+MD5_META_KEY = 'md5'
+
+
+def file_md5(path, chunk_size=1024 * 1024):
+    """分块计算文件的 MD5（十六进制），不把整个文件读入内存。"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ObjectStorage(abc.ABC):
+    """
+    对象存储接口。子类实现 get_md5 / _put_file / _put_bytes 即可获得条件上传能力；
+    缺少任一方法的子类在实例化时即报错，而不是上传到一半才失败。
+    """
+
+    @abc.abstractmethod
+    def get_md5(self, key):
+        """返回远端对象记录的 MD5，对象不存在或没有记录时返回 None。"""
+
+    @abc.abstractmethod
+    def _put_file(self, key, path, md5):
+        """上传本地文件，并把 md5 记录在对象元数据中。"""
+
+    @abc.abstractmethod
+    def _put_bytes(self, key, data, md5):
+        """上传内存数据，并把 md5 记录在对象元数据中。"""
+
+    def upload_file_if_changed(self, key, path):
+        """本地文件与远端对象内容一致时跳过上传。返回是否实际上传。"""
+        md5 = file_md5(path)
+        if self.get_md5(key) == md5:
+            print(f"'{key}' is unchanged (md5 {md5}). Skipping upload.")
+            return False
+        self._put_file(key, path, md5)
+        print(f"Uploaded '{path}' to '{key}' (md5 {md5})")
+        return True
+
+    def upload_bytes_if_changed(self, key, data):
+        """内存数据与远端对象内容一致时跳过上传。返回是否实际上传。"""
+        md5 = hashlib.md5(data).hexdigest()
+        if self.get_md5(key) == md5:
+            print(f"'{key}' is unchanged (md5 {md5}). Skipping upload.")
+            return False
+        self._put_bytes(key, data, md5)
+        print(f"Uploaded {len(data)} bytes to '{key}' (md5 {md5})")
+        return True
+
+
+class OSSStorage(ObjectStorage):
+    """阿里云 OSS 实现。MD5 写在对象的自定义元数据 x-oss-meta-md5 中。"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    @classmethod
+    def from_credentials(cls, access_key_id, access_key_secret, endpoint, bucket_name):
+        import oss2
+        return cls(oss2.Bucket(oss2.Auth(access_key_id, access_key_secret), endpoint, bucket_name))
+
+    def get_md5(self, key):
+        import oss2
+        try:
+            headers = self.bucket.head_object(key).headers
+        except oss2.exceptions.NotFound:
+            return None
+        return headers.get(f'x-oss-meta-{MD5_META_KEY}')
+
+    def _put_file(self, key, path, md5):
+        import oss2
+        headers = {f'x-oss-meta-{MD5_META_KEY}': md5}
+        if os.path.getsize(path) < OSS_MULTIPART_THRESHOLD_MB * 1024 * 1024:
+            self.bucket.put_object_from_file(key, path, headers=headers)
+            return
+        # 大文件：分片并行上传，进度记录在本地，中断后再次运行会从已完成的分片继续
+        oss2.resumable_upload(
+            self.bucket, key, path,
+            store=oss2.ResumableStore(root=OSS_RESUMABLE_DIR),
+            headers=headers,
+            multipart_threshold=int(OSS_MULTIPART_THRESHOLD_MB * 1024 * 1024),
+            part_size=int(OSS_PART_SIZE_MB * 1024 * 1024),
+            num_threads=OSS_UPLOAD_THREADS,
+        )
+
+    def _put_bytes(self, key, data, md5):
+        self.bucket.put_object(key, data, headers={f'x-oss-meta-{MD5_META_KEY}': md5})
+
+
+class LocalStorage(ObjectStorage):
+    """本地文件系统实现：对象保存在 root/<key>，元数据保存在同名的 .meta.json 文件中。"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _object_path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get_md5(self, key):
+        try:
+            with open(self._object_path(key) + '.meta.json', 'r', encoding='utf-8') as f:
+                return json.load(f).get(MD5_META_KEY)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, key, md5):
+        with open(self._object_path(key) + '.meta.json', 'w', encoding='utf-8') as f:
+            json.dump({MD5_META_KEY: md5}, f)
+
+    def _put_file(self, key, path, md5):
+        target = self._object_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target + '.tmp')
+        os.replace(target + '.tmp', target)
+        self._write_meta(key, md5)
+
+    def _put_bytes(self, key, data, md5):
+        target = self._object_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(target + '.tmp', target)
+        self._write_meta(key, md5)
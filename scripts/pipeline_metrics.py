@@ -0,0 +1,149 @@
+# scripts/pipeline_metrics.py
+# 描述：数据管道的轻量级埋点。
+# 记录每个阶段的耗时、计数（行数、写入字节数等）和峰值内存，运行结束时把一条结构化记录
+# 以 JSON Lines 追加到 PIPELINE_METRICS_FILE，并同时打印到标准输出（serverless 环境只看日志）。
+# 设置 PIPELINE_PROFILE=cprofile 或 tracemalloc 可以在本次运行中开启对应的性能剖析。
+#
+# 脚本中的用法：
+#   start_run('index:a_shares')
+#   with stage('fetch.a_shares'):
+#       ...
+#   count('records_written', len(final_data))
+#   finish_run()
+# 没有活动的运行时，stage / count 都是空操作，被调用的函数无需关心是否开启了埋点。
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from datetime import datetime, timezone, timedelta
+
+PIPELINE_METRICS_FILE = os.environ.get('PIPELINE_METRICS_FILE', 'data/.metrics/pipeline_metrics.jsonl')
+PIPELINE_PROFILE = os.environ.get('PIPELINE_PROFILE', '').lower()
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB）；平台不支持时返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunMetrics:
+    """一次运行的埋点记录：阶段耗时、计数和可选的性能剖析。"""
+
+    def __init__(self, run_name, metrics_file=PIPELINE_METRICS_FILE, profile=PIPELINE_PROFILE):
+        self.run_name = run_name
+        self.metrics_file = metrics_file
+        self.profile = profile
+        self.started_at = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+        self.profiler = None
+        if profile == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif profile == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """统计一个阶段的耗时；同名阶段多次执行时累加。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _profile_output(self):
+        """停止剖析并返回写入记录的剖析结果。"""
+        if self.profile == 'cprofile' and self.profiler is not None:
+            self.profiler.disable()
+            profile_dir = os.path.dirname(self.metrics_file) or '.'
+            profile_path = os.path.join(profile_dir, f"{self.run_name.replace(':', '_')}-{int(time.time())}.prof")
+            try:
+                os.makedirs(profile_dir, exist_ok=True)
+                self.profiler.dump_stats(profile_path)
+                return {'cprofile_file': profile_path}
+            except OSError as e:
+                return {'cprofile_error': str(e)}
+        if self.profile == 'tracemalloc':
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics('lineno')[:10]
+            return {
+                'tracemalloc_peak_mb': round(peak / 1024 / 1024, 2),
+                'tracemalloc_top': [f"{stat.traceback} size={stat.size / 1024:.1f}KiB count={stat.count}" for stat in top],
+            }
+        return {}
+
+    def finish(self, status='ok'):
+        """生成本次运行的记录，追加到 JSON Lines 文件并打印。返回记录。"""
+        record = {
+            'run': self.run_name,
+            'started_at_bjt': self.started_at,
+            'status': status,
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        record.update(self._profile_output())
+
+        line = json.dumps(record, ensure_ascii=False)
+        print(f"[metrics] {line}")
+        if self.metrics_file:
+            try:
+                os.makedirs(os.path.dirname(self.metrics_file) or '.', exist_ok=True)
+                with open(self.metrics_file, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                print(f"Warning: Could not write metrics to {self.metrics_file}: {e}")
+        return record
+
+
+# 脚本级的当前运行；HTTP 处理器等并发场景请直接使用 RunMetrics 实例
+_current_run = None
+
+
+def start_run(run_name, **kwargs):
+    global _current_run
+    _current_run = RunMetrics(run_name, **kwargs)
+    return _current_run
+
+
+def stage(name):
+    return _current_run.stage(name) if _current_run is not None else contextlib.nullcontext()
+
+
+def count(name, value=1):
+    if _current_run is not None:
+        _current_run.count(name, value)
+
+
+def finish_run(status='ok'):
+    global _current_run
+    if _current_run is None:
+        return None
+    record = _current_run.finish(status)
+    _current_run = None
+    return record
@@ -0,0 +1,156 @@
+# scripts/portfolio_store.py
+# 描述：投资组合历史的追加式（append-only）列式存储，作为持仓历史的权威数据源。
+# 每个组合（Excel 中的一个 sheet）对应一个目录，每次更新只追加一个新的 Parquet 分片，
+# 不再读取和重写整个历史。清单文件 _manifest.json 记录组合顺序、各组合的分片列表，
+# 最近一次导出 Excel 时的版本号与时间（供按需导出判断是否过期），
+# 以及最近一次发布到对象存储时的版本号（供只发布新增分片和发生变化的组合）。
+
+import os
+import json
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from security_master import normalize_code_series
+
+STORE_DIR = 'data/portfolio_store'
+MANIFEST_FILE = '_manifest.json'
+# 批量追加时并行规范化、写分片的线程数（Parquet 写入会释放 GIL）
+PORTFOLIO_STORE_THREADS = int(os.environ.get('PORTFOLIO_STORE_THREADS', '4'))
+
+
+def normalize_portfolio_frame(df):
+    """统一持仓表的键列类型：股票代码按 security_master.normalize_code 规范化，修改时间转为字符串。"""
+    df = df.copy()
+    if '股票代码' in df.columns:
+        df['股票代码'] = normalize_code_series(df['股票代码'])
+    if '修改时间' in df.columns:
+        df['修改时间'] = df['修改时间'].astype(str)
+    return df
+
+
+class PortfolioStore:
+    """按组合分区、只追加分片的 Parquet 存储。"""
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 0, 'exported_version': None, 'sheets': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    def is_empty(self):
+        return not self.manifest['sheets']
+
+    def sheet_names(self):
+        """按首次写入的顺序返回所有组合名称。"""
+        return list(self.manifest['sheets'])
+
+    def append_many(self, frames, threads=PORTFOLIO_STORE_THREADS):
+        """
+        把 {组合名称: 新行} 各作为一个独立分片追加，不触碰已有分片：各组合的规范化和分片写入在线程池中并行执行，
+        全部写完后只更新一次清单（所有分片共用同一个版本号）。返回 {组合名称: 分片路径}，跳过空数据。
+        """
+        frames = {sheet_name: df for sheet_name, df in frames.items() if not df.empty}
+        if not frames:
+            return {}
+        seq = self.manifest['version'] + 1
+        part_name = f"part-{seq:06d}.parquet"
+
+        def write_part(item):
+            sheet_name, df = item
+            part_path = self.part_path(sheet_name, part_name)
+            os.makedirs(os.path.dirname(part_path), exist_ok=True)
+            normalize_portfolio_frame(df).to_parquet(part_path, index=False)
+            return sheet_name, part_path
+
+        with ThreadPoolExecutor(max_workers=max(1, min(threads, len(frames)))) as executor:
+            written = dict(executor.map(write_part, frames.items()))
+
+        # 分片全部写入成功后再更新清单，中途失败不会留下被引用的残缺分片
+        for sheet_name in frames:
+            self.manifest['sheets'].setdefault(sheet_name, []).append(part_name)
+        self.manifest['version'] = seq
+        self._save_manifest()
+        return written
+
+    def read(self, sheet_name):
+        """按追加顺序读取一个组合的全部历史。"""
+        parts = self.manifest['sheets'].get(sheet_name, [])
+        if not parts:
+            return pd.DataFrame()
+        frames = [pd.read_parquet(self.part_path(sheet_name, part)) for part in parts]
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def part_version(part_name):
+        """'part-000012.parquet' -> 12"""
+        return int(part_name[len('part-'):-len('.parquet')])
+
+    def part_path(self, sheet_name, part_name):
+        return os.path.join(self.store_dir, sheet_name, part_name)
+
+    def parts(self):
+        """按组合返回全部分片文件名 {组合名称: [分片文件名]}（按追加顺序）。"""
+        return {sheet_name: list(parts) for sheet_name, parts in self.manifest['sheets'].items()}
+
+    def parts_since(self, version):
+        """返回 version 之后写入的分片 {组合名称: [分片文件名]}，没有新分片的组合不出现；version 为 None 时返回全部。"""
+        new_parts = {}
+        for sheet_name, parts in self.manifest['sheets'].items():
+            parts = [part for part in parts if version is None or self.part_version(part) > version]
+            if parts:
+                new_parts[sheet_name] = parts
+        return new_parts
+
+    @property
+    def exported_version(self):
+        return self.manifest.get('exported_version')
+
+    @property
+    def published_version(self):
+        return self.manifest.get('published_version')
+
+    def published_state(self, key, default=None):
+        """读取随发布记录一起保存的附加状态（例如各组合分区对象的 MD5）。"""
+        return self.manifest.get('published', {}).get(key, default)
+
+    def mark_published(self, **state):
+        """记录当前版本已发布到对象存储，并保存附加状态。"""
+        self.manifest['published_version'] = self.version
+        self.manifest.setdefault('published', {}).update(state)
+        self._save_manifest()
+
+    def exported_age_seconds(self):
+        """距上一次导出 Excel 的秒数，从未导出过时返回 None。"""
+        exported_at = self.manifest.get('exported_at')
+        return None if exported_at is None else time.time() - exported_at
+
+    def needs_export(self, excel_path):
+        """Excel 导出视图不存在，或导出后又有新分片写入时返回 True。"""
+        return not os.path.exists(excel_path) or self.exported_version != self.version
+
+    def export_excel(self, excel_path):
+        """把全部组合写成一个多 sheet 的 Excel 工作簿，并记录导出时的版本号。"""
+        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+            for sheet_name in self.sheet_names():
+                self.read(sheet_name).to_excel(writer, sheet_name=sheet_name, index=False)
+        self.manifest['exported_version'] = self.version
+        self.manifest['exported_at'] = time.time()
+        self._save_manifest()
@@ -0,0 +1,199 @@
+# scripts/portfolio_valuation.py
+# 描述：向量化的组合估值与净值（NAV）引擎。
+# 把各组合在每个「修改时间」的「配置比例 (%)」对齐成 组合 × 调仓快照 × 代码 的权重矩阵，
+# 把行情历史对齐成 交易日 × 代码 的日收益矩阵，一次调用批量算出所有组合、所有交易日的
+# 日收益、净值、单只持仓的收益贡献，以及每次调仓的换手率。
+#
+# 约定：
+# - 调仓在「修改时间」当天收盘后生效，从下一个交易日开始计算收益；
+# - 两次调仓之间按买入持有处理（持仓权重随价格漂移），未配置的部分视为现金，收益为 0；
+# - 缺失的行情按当日涨跌幅为 0 处理；
+# - 换手率 = 0.5 × Σ|新目标权重 - 上一次目标权重|，首次建仓相对空仓计算。
+
+import numpy as np
+import pandas as pd
+
+from portfolio_store import PortfolioStore
+from quote_history import QuoteHistoryStore, trade_date_to_int, int_to_trade_date
+
+WEIGHT_COLUMN = '配置比例 (%)'
+
+
+def snapshot_date_to_int(key):
+    """'202509211550' 或 '2025-09-21 15:50:00' -> 20250921"""
+    digits = ''.join(ch for ch in str(key) if ch.isdigit())
+    return int(digits[:8])
+
+
+def holding_codes(holdings):
+    """所有组合持仓中出现过的代码（升序）；空白代码（Excel 中常见的空行）不计入。"""
+    return sorted(set().union(*(set(df['股票代码'].dropna().astype(str)) for df in holdings.values() if not df.empty)))
+
+
+def weight_coordinates(df, codes=None):
+    """
+    把一个组合的持仓历史转成稀疏坐标形式的 快照 × 代码 权重。
+    返回 (snapshot_keys[K], codes[C], rows[N], cols[N], weights[N])：snapshot_keys 为升序的「修改时间」，
+    rows 已按快照升序排列；给出 codes 时列号是代码在其中的位置，否则 codes 为该组合出现过的代码（升序）。
+    股票代码为空的行被忽略；同一快照内重复出现的代码各占一个坐标，由调用方累加。
+    """
+    if not df.empty:
+        df = df[df['股票代码'].notna()]
+    if df.empty:
+        empty = np.array([], dtype=np.int64)
+        return (np.array([], dtype=object), np.array([] if codes is None else codes, dtype=object),
+                empty, empty, np.array([], dtype=float))
+    snapshot_keys, rows = np.unique(df['修改时间'].astype(str).to_numpy(dtype=object), return_inverse=True)
+    code_values = df['股票代码'].astype(str).to_numpy(dtype=object)
+    if codes is None:
+        codes, cols = np.unique(code_values, return_inverse=True)
+    else:
+        cols = pd.Index(codes).get_indexer(code_values)
+    weights = pd.to_numeric(df[WEIGHT_COLUMN], errors='coerce').fillna(0).to_numpy(dtype=float) / 100
+    order = np.argsort(rows, kind='stable')
+    return snapshot_keys, codes, rows[order], cols[order], weights[order]
+
+
+def build_weight_tensor(holdings, codes):
+    """
+    把 {组合名: 持仓历史 DataFrame} 转成权重张量。
+    返回 (weights[P, K, C], snapshot_keys[P, K], snapshot_counts[P])：
+    K 为各组合调仓快照数的最大值，不足的部分以 0 权重和 '' 时间填充。股票代码为空的行被忽略。
+    """
+    snapshots = []
+    for df in holdings.values():
+        keys, _, rows, cols, values = weight_coordinates(df, codes)
+        matrix = np.zeros((len(keys), len(codes)))
+        # 同一快照内重复出现的代码，权重累加
+        np.add.at(matrix, (rows, cols), values)
+        snapshots.append((list(keys), matrix))
+
+    max_snapshots = max((len(keys) for keys, _ in snapshots), default=0)
+    weights = np.zeros((len(holdings), max_snapshots, len(codes)))
+    snapshot_keys = np.full((len(holdings), max_snapshots), '', dtype=object)
+    snapshot_counts = np.zeros(len(holdings), dtype=np.int64)
+    for p, (keys, matrix) in enumerate(snapshots):
+        weights[p, :len(keys)] = matrix
+        snapshot_keys[p, :len(keys)] = keys
+        snapshot_counts[p] = len(keys)
+    return weights, snapshot_keys, snapshot_counts
+
+
+def build_return_matrix(quotes, codes):
+    """把长表行情（trade_date, 代码, Percent）转成 dates[D] 与日收益矩阵 returns[D, C]。"""
+    if quotes.empty:
+        return np.array([], dtype=np.int32), np.zeros((0, len(codes)))
+    pivot = quotes.pivot_table(index='trade_date', columns='代码', values='Percent', aggfunc='last')
+    pivot = pivot.reindex(columns=list(codes)).sort_index()
+    dates = np.array([trade_date_to_int(d) for d in pivot.index], dtype=np.int32)
+    returns = np.nan_to_num(pivot.to_numpy(dtype=float) / 100, nan=0.0)
+    return dates, returns
+
+
+def value_portfolios(holdings, quotes):
+    """
+    对所有组合做批量估值。
+    holdings: {组合名: 持仓历史 DataFrame（股票代码、配置比例 (%)、修改时间）}
+    quotes:   长表行情 DataFrame（trade_date、代码、Percent）
+    返回 dict：
+    - 'daily':        组合名、trade_date、return、nav
+    - 'contribution': 组合名、trade_date、代码、weight（当日期初权重）、contribution
+    - 'turnover':     组合名、修改时间、turnover
+    """
+    names = list(holdings)
+    if not names:
+        return {
+            'daily': pd.DataFrame(columns=['组合名称', 'trade_date', 'return', 'nav']),
+            'contribution': pd.DataFrame(columns=['组合名称', 'trade_date', '代码', 'weight', 'contribution']),
+            'turnover': pd.DataFrame(columns=['组合名称', '修改时间', 'turnover']),
+        }
+    codes = holding_codes(holdings)
+    weights, snapshot_keys, snapshot_counts = build_weight_tensor(holdings, codes)
+    dates, returns = build_return_matrix(quotes, codes)
+    num_portfolios, num_snapshots, num_codes = weights.shape
+    num_dates = len(dates)
+    if num_snapshots == 0:
+        # 没有任何持仓快照：保留一个全零快照，让下面的张量运算形状保持一致
+        weights = np.zeros((num_portfolios, 1, num_codes))
+        snapshot_keys = np.full((num_portfolios, 1), '', dtype=object)
+        num_snapshots = 1
+
+    # 累计净值因子：cum[i] = 第 i 个交易日之前所有日收益的连乘，cum[0] = 1
+    cum = np.vstack([np.ones((1, num_codes)), np.cumprod(1 + returns, axis=0)])
+
+    # 每个组合每个交易日生效的快照序号：快照日期严格早于交易日；-1 表示尚未建仓
+    snapshot_dates = np.array(
+        [[snapshot_date_to_int(key) if key else np.iinfo(np.int32).max for key in row] for row in snapshot_keys],
+        dtype=np.int64,
+    ).reshape(num_portfolios, num_snapshots)
+    active = np.stack([np.searchsorted(snapshot_dates[p, :snapshot_counts[p]], dates, side='left') - 1
+                       for p in range(num_portfolios)]).reshape(num_portfolios, num_dates)
+    started = active >= 0
+    active_clipped = np.maximum(active, 0)
+
+    # 每个快照的持有期从其日期之后的第一个交易日开始，base 为该日之前的累计因子
+    period_start = np.searchsorted(dates, snapshot_dates, side='right')
+    base_index = np.take_along_axis(period_start, active_clipped, axis=1)
+
+    held = weights[np.arange(num_portfolios)[:, None], active_clipped] * started[..., None]
+    base = cum[base_index]
+    growth_prev = cum[:-1][None, :, :] / base
+    growth_now = cum[1:][None, :, :] / base
+
+    cash = 1 - held.sum(axis=2)
+    value_prev = cash + (held * growth_prev).sum(axis=2)
+    value_now = cash + (held * growth_now).sum(axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        portfolio_returns = np.where(started & (value_prev != 0), value_now / value_prev - 1, 0.0)
+        contributions = np.where(started[..., None], held * (growth_now - growth_prev) / value_prev[..., None], 0.0)
+        drifted_weights = np.where(started[..., None], held * growth_prev / value_prev[..., None], 0.0)
+    nav = np.cumprod(1 + portfolio_returns, axis=1)
+
+    # 换手率：相邻目标权重之差，首个快照相对空仓
+    previous = np.concatenate([np.zeros((num_portfolios, 1, num_codes)), weights[:, :-1]], axis=1)
+    turnover = 0.5 * np.abs(weights - previous).sum(axis=2)
+
+    trade_dates = [int_to_trade_date(d) for d in dates]
+    portfolio_index = np.repeat(np.array(names, dtype=object), num_dates)
+    daily = pd.DataFrame({
+        '组合名称': portfolio_index,
+        'trade_date': np.tile(np.array(trade_dates, dtype=object), num_portfolios),
+        'return': portfolio_returns.ravel(),
+        'nav': nav.ravel(),
+    })
+
+    p_idx, d_idx, c_idx = np.nonzero(held)
+    contribution = pd.DataFrame({
+        '组合名称': np.array(names, dtype=object)[p_idx],
+        'trade_date': np.array(trade_dates, dtype=object)[d_idx],
+        '代码': np.array(codes, dtype=object)[c_idx],
+        'weight': drifted_weights[p_idx, d_idx, c_idx],
+        'contribution': contributions[p_idx, d_idx, c_idx],
+    })
+
+    valid = np.arange(num_snapshots)[None, :] < snapshot_counts[:, None]
+    p_idx, k_idx = np.nonzero(valid)
+    turnover_table = pd.DataFrame({
+        '组合名称': np.array(names, dtype=object)[p_idx],
+        '修改时间': snapshot_keys[p_idx, k_idx],
+        'turnover': turnover[p_idx, k_idx],
+    })
+
+    return {'daily': daily, 'contribution': contribution, 'turnover': turnover_table}
+
+
+def main():
+    portfolio_store = PortfolioStore()
+    holdings = {name: portfolio_store.read(name) for name in portfolio_store.sheet_names()}
+    codes = holding_codes(holdings)
+    quotes = QuoteHistoryStore().query(codes)
+    print(f"Valuing {len(holdings)} portfolios over {quotes['trade_date'].nunique()} trade dates and {len(codes)} codes")
+
+    result = value_portfolios(holdings, quotes)
+    latest = result['daily'].groupby('组合名称').tail(1)
+    for _, row in latest.iterrows():
+        print(f"  - {row['组合名称']}: NAV {row['nav']:.4f} on {row['trade_date']}")
+
+
+if __name__ == "__main__":
+    main()
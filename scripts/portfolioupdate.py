@@ -1,93 +1,221 @@
 import pandas as pd
 import os
-import oss2
+import json
+import gzip
+import hashlib
+import importlib.util
+
+from portfolio_store import PortfolioStore
+from object_storage import OSSStorage, LocalStorage
+from pipeline_metrics import start_run, stage, count, finish_run
 
 # 本地文件路径
 ORIGINAL_FILE = 'data/AIPEPortfolio.xlsx'
 NEW_FILE = 'data/AIPEPortfolio_new.xlsx'
+# 增量模式：只包含新增持仓行的 JSON（{sheet 名称: [行, ...]}），合并后即删除
+NEW_ROWS_FILE = 'data/AIPEPortfolio_new.json'
 OSS_FILE_KEY = 'AIPEPortfolio.xlsx'
+# 按组合拆分的压缩分区对象及其 manifest 的前缀
+COMPANION_PREFIX = 'AIPEPortfolio'
+# 原样发布的 Parquet 分片及其 manifest 的前缀
+PARTS_PREFIX = 'AIPEPortfolio/parts'
+# Excel 导出视图是 OSS 上的既有数据契约，默认（0）每次有新分片时都重新导出并上传。
+# 设为正数时改为最长每隔这么多小时重建一次，期间的更新只发布新增分片和变化的组合，OSS 上的工作簿会暂时落后于存储
+PORTFOLIO_XLSX_MAX_AGE_HOURS = float(os.environ.get('PORTFOLIO_XLSX_MAX_AGE_HOURS', '0'))
+
+# 需要合并的投资组合（对应 Excel 中的 sheet）默认从工作簿 / 增量 JSON 中自动发现，新增组合只需新增 sheet；
+# 设置 PORTFOLIO_SHEETS（逗号分隔）时只合并列出的组合
+PORTFOLIO_SHEETS = [name.strip() for name in os.environ.get('PORTFOLIO_SHEETS', '').split(',') if name.strip()]
+# 读取工作簿的引擎：默认安装了 python-calamine 时使用 calamine（比 openpyxl 快数倍），否则使用 pandas 默认引擎
+EXCEL_ENGINE = os.environ.get('PORTFOLIO_EXCEL_ENGINE') or \
+    ('calamine' if importlib.util.find_spec('python_calamine') else None)
 
 # OSS 配置（从环境变量读取）
 OSS_ACCESS_KEY_ID = os.environ.get('OSS_ACCESS_KEY_ID')
 OSS_ACCESS_KEY_SECRET = os.environ.get('OSS_ACCESS_KEY_SECRET')
 OSS_BUCKET = os.environ.get('OSS_BUCKET')
 OSS_ENDPOINT = os.environ.get('OSS_ENDPOINT')
+# 设置后改为上传到本地目录（离线调试用）
+OSS_LOCAL_DIR = os.environ.get('OSS_LOCAL_DIR')
+
 
+def select_sheets(frames):
+    """按 PORTFOLIO_SHEETS 过滤 {sheet 名称: DataFrame}；未设置时保留全部 sheet。"""
+    if not PORTFOLIO_SHEETS:
+        return frames
+    missing = [sheet_name for sheet_name in PORTFOLIO_SHEETS if sheet_name not in frames]
+    if missing:
+        print(f"Sheets not found and skipped: {', '.join(missing)}")
+    return {sheet_name: frames[sheet_name] for sheet_name in PORTFOLIO_SHEETS if sheet_name in frames}
 
-def merge_excel():
+def read_workbook(path):
+    """一次打开并解析工作簿中的全部 sheet，返回 {sheet 名称: DataFrame}（保持工作簿中的顺序）。"""
+    return select_sheets(pd.read_excel(path, sheet_name=None, engine=EXCEL_ENGINE))
+
+def merge_excel(store=None):
+    """
+    把新数据作为新分片追加到列式存储中，不再读取和重写整个历史工作簿。
+    存储为空时（首次运行），先把现有的 AIPEPortfolio.xlsx 导入为初始分片。
+    每个工作簿只读取一次，组合由 sheet 自动发现；各组合的规范化与分片写入并行执行，清单一次性更新。
+    """
     print("Starting Excel merge process...")
+    store = store or PortfolioStore()
 
-    # 读取原始文件
-    try:
-        df_dazhi_orig = pd.read_excel(ORIGINAL_FILE, sheet_name='大智投资组合')
-        df_dazhi_orig['股票代码'] = df_dazhi_orig['股票代码'].astype(str).str.zfill(6)
-        df_dacheng_orig = pd.read_excel(ORIGINAL_FILE, sheet_name='大成投资组合')
-        df_dacheng_orig['股票代码'] = df_dacheng_orig['股票代码'].astype(str).str.zfill(6)
-        df_my_orig = pd.read_excel(ORIGINAL_FILE, sheet_name='我的投资组合')
-        df_my_orig['股票代码'] = df_my_orig['股票代码'].astype(str).str.zfill(6)
-        print(f"Successfully loaded existing portfolio from {ORIGINAL_FILE}")
-    except FileNotFoundError:
-        print(f"{ORIGINAL_FILE} not found. Creating new file.")
-        df_dazhi_orig = pd.DataFrame()
-        df_dacheng_orig = pd.DataFrame()
-        df_my_orig = pd.DataFrame()
-
-    # 读取新数据
-    df_dazhi_new = pd.read_excel(NEW_FILE, sheet_name='大智投资组合')
-    df_dazhi_new['股票代码'] = df_dazhi_new['股票代码'].astype(str).str.zfill(6)
-    df_dacheng_new = pd.read_excel(NEW_FILE, sheet_name='大成投资组合')
-    df_dacheng_new['股票代码'] = df_dacheng_new['股票代码'].astype(str).str.zfill(6)
-    df_my_new = pd.read_excel(NEW_FILE, sheet_name='我的投资组合')
-    df_my_new['股票代码'] = df_my_new['股票代码'].astype(str).str.zfill(6)
-    print(f"Successfully loaded new data from {NEW_FILE}")
-
-    # 合并
-    df_dazhi_combined = pd.concat([df_dazhi_orig, df_dazhi_new], ignore_index=True)
-    df_dazhi_combined['股票代码'] = df_dazhi_combined['股票代码'].astype(str).str.zfill(6)
-    df_dazhi_combined['修改时间'] = df_dazhi_combined['修改时间'].astype(str)
-    df_dacheng_combined = pd.concat([df_dacheng_orig, df_dacheng_new], ignore_index=True)
-    df_dacheng_combined['股票代码'] = df_dacheng_combined['股票代码'].astype(str).str.zfill(6)
-    df_dacheng_combined['修改时间'] = df_dacheng_combined['修改时间'].astype(str)
-    df_my_combined = pd.concat([df_my_orig, df_my_new], ignore_index=True)
-    df_my_combined['股票代码'] = df_my_combined['股票代码'].astype(str).str.zfill(6)
-    df_my_combined['修改时间'] = df_my_combined['修改时间'].astype(str)
-    print("Dataframes concatenated.")
-
-    # 写回原始文件
-    with pd.ExcelWriter(ORIGINAL_FILE, engine='openpyxl') as writer:
-        df_dazhi_combined.to_excel(writer, sheet_name='大智投资组合', index=False)
-        df_dacheng_combined.to_excel(writer, sheet_name='大成投资组合', index=False)
-        df_my_combined.to_excel(writer, sheet_name='我的投资组合', index=False)
-    
-    print(f"Successfully wrote combined data back to {ORIGINAL_FILE}")
+    # 首次运行：从原始工作簿引导历史数据
+    if store.is_empty():
+        try:
+            with stage('excel_read'):
+                orig_frames = read_workbook(ORIGINAL_FILE)
+            with stage('store_append'):
+                store.append_many(orig_frames)
+            print(f"Bootstrapped portfolio store from {ORIGINAL_FILE} ({len(orig_frames)} sheets)")
+        except FileNotFoundError:
+            print(f"{ORIGINAL_FILE} not found. Starting with an empty portfolio store.")
+
+    # 读取新数据并只追加这一次的快照：优先使用增量 JSON，否则读取完整的新工作簿
+    with stage('excel_read'):
+        if os.path.exists(NEW_ROWS_FILE):
+            with open(NEW_ROWS_FILE, 'r', encoding='utf-8') as f:
+                new_rows = json.load(f)
+            new_frames = select_sheets({sheet_name: pd.DataFrame(rows) for sheet_name, rows in new_rows.items()})
+            source = NEW_ROWS_FILE
+        else:
+            new_frames = read_workbook(NEW_FILE)
+            source = NEW_FILE
+
+    with stage('store_append'):
+        store.append_many(new_frames)
+    for sheet_name, df_new in new_frames.items():
+        count('rows_appended', len(df_new))
+        print(f"Appended {len(df_new)} rows to '{sheet_name}'")
+    print(f"Successfully loaded new data from {source}")
+
+    # 增量 JSON 只用一次，删除后避免下次重复合并
+    if source == NEW_ROWS_FILE:
+        os.remove(NEW_ROWS_FILE)
+        print(f"Deleted consumed delta file {NEW_ROWS_FILE}")
 
     ## 删除新文件，避免重复合并
     #if os.path.exists(NEW_FILE):
         #os.remove(NEW_FILE)
         #print(f"Deleted temporary file {NEW_FILE}")
+    return store
+
+def export_excel(store=None, force=False):
+    """
+    按需从列式存储生成 Excel 导出视图，返回是否实际导出。工作簿已包含存储的最新版本时跳过。
+    设置了 PORTFOLIO_XLSX_MAX_AGE_HOURS 时，除非 force，距上次导出不足该时长则推迟导出
+    （新增数据仍通过分片和分区对象发布）。工作簿不存在时总是导出。
+    """
+    store = store or PortfolioStore()
+    if not store.needs_export(ORIGINAL_FILE):
+        print(f"{ORIGINAL_FILE} is up to date with the portfolio store. Skipping export.")
+        return False
+    age = store.exported_age_seconds()
+    if not force and PORTFOLIO_XLSX_MAX_AGE_HOURS > 0 and os.path.exists(ORIGINAL_FILE) and \
+            age is not None and age < PORTFOLIO_XLSX_MAX_AGE_HOURS * 3600:
+        print(f"{ORIGINAL_FILE} was exported {age / 3600:.1f}h ago. Deferring the full export "
+              f"(PORTFOLIO_XLSX_MAX_AGE_HOURS={PORTFOLIO_XLSX_MAX_AGE_HOURS:g}).")
+        return False
+    with stage('excel_write'):
+        store.export_excel(ORIGINAL_FILE)
+    count('bytes_written', os.path.getsize(ORIGINAL_FILE))
+    print(f"Successfully exported portfolio store to {ORIGINAL_FILE}")
+    return True
 
-def upload_to_oss():
+def publish_parts(storage, store):
+    """
+    上传上次发布之后新增的 Parquet 分片（分片写入后不再改变，每个只上传一次），
+    并发布列出全部分片的 parts manifest，下游按 manifest 只下载新增的分片。
+    """
+    for sheet_name, parts in store.parts_since(store.published_version).items():
+        for part in parts:
+            storage.upload_file_if_changed(f"{PARTS_PREFIX}/{sheet_name}/{part}", store.part_path(sheet_name, part))
+
+    manifest = {
+        'version': store.version,
+        'sheets': {sheet_name: [f"{PARTS_PREFIX}/{sheet_name}/{part}" for part in parts]
+                   for sheet_name, parts in store.parts().items()},
+    }
+    storage.upload_bytes_if_changed(f"{PARTS_PREFIX}/manifest.json",
+                                    json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def publish_companions(storage, store):
+    """
+    按组合发布 gzip 压缩的 JSON 分区对象，以及记录各对象 MD5 的 manifest.json，
+    下游只需比较 manifest 即可只下载发生变化的组合。只重建上次发布之后有新分片的组合，
+    其余组合沿用上次发布时记录的条目。返回新的 manifest 条目。
+    """
+    manifest = store.published_state('companions', {}) if store.published_version is not None else {}
+    changed_sheets = store.parts_since(store.published_version)
+    for sheet_name in store.sheet_names():
+        if sheet_name in manifest and sheet_name not in changed_sheets:
+            continue
+        key = f"{COMPANION_PREFIX}/{sheet_name}.json.gz"
+        payload = store.read(sheet_name).to_json(orient='records', force_ascii=False).encode('utf-8')
+        # mtime=0 让相同内容的压缩结果逐字节一致，未变化的组合不会被重复上传
+        data = gzip.compress(payload, mtime=0)
+        storage.upload_bytes_if_changed(key, data)
+        manifest[sheet_name] = {'key': key, 'md5': hashlib.md5(data).hexdigest(), 'size': len(data)}
+    manifest = {sheet_name: manifest[sheet_name] for sheet_name in store.sheet_names()}
+
+    manifest_data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+    storage.upload_bytes_if_changed(f"{COMPANION_PREFIX}/manifest.json", manifest_data)
+    return manifest
+
+def get_storage():
+    """OSS_LOCAL_DIR 设置时使用本地文件系统替身，否则使用 OSS；凭据不完整时返回 None。"""
+    if OSS_LOCAL_DIR:
+        return LocalStorage(OSS_LOCAL_DIR)
+    if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET, OSS_ENDPOINT]):
+        return None
+    return OSSStorage.from_credentials(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_ENDPOINT, OSS_BUCKET)
+
+def upload_to_oss(store=None):
     
     print("OSS_ACCESS_KEY_ID",OSS_ACCESS_KEY_ID)
     print("OSS_ACCESS_KEY_SECRET",OSS_ACCESS_KEY_SECRET)
     print("OSS_BUCKET",OSS_BUCKET)
     print("OSS_ENDPOINT",OSS_ENDPOINT)
-    if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_BUCKET, OSS_ENDPOINT]):
+    storage = get_storage()
+    if storage is None:
         print("OSS credentials not fully configured. Skipping upload.")
         return
 
+    store = store or PortfolioStore()
+    # Excel 只作为 OSS 的导出视图，存储有新分片时重新生成（见 PORTFOLIO_XLSX_MAX_AGE_HOURS）
+    export_excel(store)
+    # 工作簿不是存储的最新版本（导出被推迟）时不上传，避免用过期的导出覆盖
+    xlsx_current = not store.needs_export(ORIGINAL_FILE)
+
     try:
-        auth = oss2.Auth(OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET)
-        bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET)
-        bucket.put_object_from_file(OSS_FILE_KEY, ORIGINAL_FILE)
-        print(f"Successfully uploaded '{ORIGINAL_FILE}' to OSS bucket '{OSS_BUCKET}'")
+        # 与远端内容一致时跳过；大文件自动走分片断点续传。工作簿只在上次发布之后重新导出过时才需要上传
+        with stage('oss_upload'):
+            published, exported = store.published_version, store.exported_version
+            if xlsx_current and (published is None or exported > published):
+                storage.upload_file_if_changed(OSS_FILE_KEY, ORIGINAL_FILE)
+            publish_parts(storage, store)
+            companions = publish_companions(storage, store)
+        store.mark_published(companions=companions)
+        target = OSS_BUCKET or OSS_LOCAL_DIR
+        if xlsx_current:
+            print(f"Successfully published '{ORIGINAL_FILE}' (version {store.version}) to OSS bucket '{target}'")
+        else:
+            print(f"Published new parts and companions (version {store.version}) to OSS bucket '{target}'. "
+                  f"'{OSS_FILE_KEY}' was not republished and still reflects version {exported}.")
     except Exception as e:
         print(f"Error uploading to OSS: {e}")
         exit(1)
 
 def main():
-    merge_excel()
-    upload_to_oss()
+    start_run('portfolioupdate')
+    try:
+        store = merge_excel()
+        upload_to_oss(store)
+    except BaseException:
+        finish_run('error')
+        raise
+    finish_run()
 
 if __name__ == "__main__":
     main()
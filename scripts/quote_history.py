@@ -0,0 +1,167 @@
+# scripts/quote_history.py
+# 描述：本地行情历史库。process_dynamic_securities_report 产出的 Price / Percent / Amount / PE_TTM / PB
+# 按交易日分段保存为紧凑的定长数组（float32 行情、int32 代码编号与日期），每个交易日一个 .npy 文件。
+# 全局 codes.json 维护「代码 -> 编号」索引；每个分段按编号排序，查询时以内存映射方式打开分段，
+# 用二分查找定位行偏移，只读取需要的行，无需再遍历 JSON 文件的 git 历史来重建行情。
+# 代码编号按写入顺序分配，因此历史库只能有一个写入方：由串行执行的 data-merger 工作流在合并 partial 时写入
+# （scripts/merge_partials.py），并发的行情拉取任务只读不写。
+#
+# 用法（回填历史报告）：python scripts/quote_history.py data/stock_dynamic_data_portfolio.json
+
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+HISTORY_DIR = 'data/quote_history'
+CODES_FILE = 'codes.json'
+QUOTE_FIELDS = ('Price', 'Percent', 'Amount', 'PE_TTM', 'PB')
+SEGMENT_DTYPE = np.dtype([('code_id', '<i4')] + [(field, '<f4') for field in QUOTE_FIELDS])
+
+
+def trade_date_to_int(trade_date):
+    """'2025-12-15' -> 20251215"""
+    return int(str(trade_date).replace('-', '')[:8])
+
+
+def int_to_trade_date(value):
+    """20251215 -> '2025-12-15'"""
+    value = str(int(value))
+    return f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+
+
+class QuoteHistoryStore:
+    """按交易日分段、内存映射读取的行情历史库。"""
+
+    def __init__(self, history_dir=HISTORY_DIR):
+        self.history_dir = history_dir
+        self.codes_path = os.path.join(history_dir, CODES_FILE)
+        self.codes = self._load_codes()
+        self.code_ids = {code: code_id for code_id, code in enumerate(self.codes)}
+
+    def _load_codes(self):
+        try:
+            with open(self.codes_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save_codes(self):
+        tmp_path = f"{self.codes_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.codes, f, ensure_ascii=False)
+        os.replace(tmp_path, self.codes_path)
+
+    def _segment_path(self, date_int):
+        return os.path.join(self.history_dir, f"{date_int}.npy")
+
+    def _code_id(self, code):
+        """返回代码编号，新代码追加到索引末尾（编号一经分配永不改变）。"""
+        code_id = self.code_ids.get(code)
+        if code_id is None:
+            code_id = len(self.codes)
+            self.codes.append(code)
+            self.code_ids[code] = code_id
+        return code_id
+
+    def trade_dates(self):
+        """返回已有分段的交易日（int32，升序）。"""
+        if not os.path.isdir(self.history_dir):
+            return np.array([], dtype=np.int32)
+        dates = [int(name[:-4]) for name in os.listdir(self.history_dir) if name.endswith('.npy') and name[:-4].isdigit()]
+        return np.array(sorted(dates), dtype=np.int32)
+
+    def _open_segment(self, date_int, mmap_mode='r'):
+        return np.load(self._segment_path(date_int), mmap_mode=mmap_mode)
+
+    def ingest(self, records):
+        """
+        把一批行情记录写入对应交易日的分段。同一交易日内同一代码以最后写入的为准。
+        返回写入的记录数。
+        """
+        by_date = {}
+        for record in records:
+            code, trade_date = record.get('代码'), record.get('trade_date')
+            if code is None or not trade_date:
+                continue
+            by_date.setdefault(trade_date_to_int(trade_date), []).append(record)
+        if not by_date:
+            return 0
+
+        os.makedirs(self.history_dir, exist_ok=True)
+        codes_before = len(self.codes)
+        written = 0
+        for date_int, date_records in by_date.items():
+            rows = np.zeros(len(date_records), dtype=SEGMENT_DTYPE)
+            rows['code_id'] = [self._code_id(record['代码']) for record in date_records]
+            for field in QUOTE_FIELDS:
+                rows[field] = [np.nan if record.get(field) is None else record[field] for record in date_records]
+
+            segment_path = self._segment_path(date_int)
+            if os.path.exists(segment_path):
+                rows = np.concatenate([self._open_segment(date_int, mmap_mode=None), rows])
+
+            # 同一代码保留最后一条，并按编号排序以支持二分查找
+            _, last_positions = np.unique(rows['code_id'][::-1], return_index=True)
+            rows = rows[len(rows) - 1 - last_positions]
+
+            tmp_path = f"{segment_path}.tmp.npy"
+            np.save(tmp_path, rows)
+            os.replace(tmp_path, segment_path)
+            written += len(date_records)
+
+        if len(self.codes) != codes_before:
+            self._save_codes()
+        print(f"Ingested {written} quotes into {len(by_date)} trade-date segment(s) under {self.history_dir}")
+        return written
+
+    def query(self, codes, start=None, end=None):
+        """
+        查询一组代码在 [start, end] 交易日区间内的行情，返回长表 DataFrame：
+        trade_date, 代码, Price, Percent, Amount, PE_TTM, PB。
+        """
+        columns = ['trade_date', '代码', *QUOTE_FIELDS]
+        known = [(code, self.code_ids[code]) for code in dict.fromkeys(codes) if code in self.code_ids]
+        dates = self.trade_dates()
+        if start is not None:
+            dates = dates[dates >= trade_date_to_int(start)]
+        if end is not None:
+            dates = dates[dates <= trade_date_to_int(end)]
+        if not known or len(dates) == 0:
+            return pd.DataFrame(columns=columns)
+
+        wanted_codes = np.array([code for code, _ in known], dtype=object)
+        wanted_ids = np.array([code_id for _, code_id in known], dtype=np.int32)
+        frames = []
+        for date_int in dates:
+            segment = self._open_segment(date_int)
+            positions = np.searchsorted(segment['code_id'], wanted_ids)
+            positions = np.minimum(positions, len(segment) - 1)
+            hit = segment['code_id'][positions] == wanted_ids
+            if not hit.any():
+                continue
+            rows = segment[positions[hit]]
+            frame = pd.DataFrame({field: rows[field] for field in QUOTE_FIELDS})
+            frame.insert(0, '代码', wanted_codes[hit])
+            frame.insert(0, 'trade_date', int_to_trade_date(date_int))
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def query_code(self, code, start=None, end=None):
+        """查询单个代码的行情时间序列。"""
+        return self.query([code], start, end)
+
+
+def main():
+    store = QuoteHistoryStore()
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as f:
+            store.ingest(json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# scripts/quote_service.py
+# 描述：可选的常驻 asyncio 行情服务。
+# 在内存中保存各市场最新的全市场行情，按固定间隔在后台刷新；对任意混合的 A 股 / 港股 / ETF 代码列表
+# 直接用内存中的行情调用 process_dynamic_securities_report 作答，省去 trigger -> workflow -> commit 的分钟级链路。
+# 被查询过的代码会定期以增量 upsert 的方式写回 data/stock_dynamic_data_portfolio.json。
+#
+# 用法：
+#   python scripts/quote_service.py                               # 使用真实的 akshare
+#   QUOTE_SERVICE_PROVIDER=fake python scripts/quote_service.py   # 使用离线的 fake_akshare
+# 接口：
+#   GET  /quotes?codes=000333,HK00700,510300
+#   POST /quotes   {"codes": ["000333", "HK00700", "510300"]}
+#   GET  /health
+
+import os
+import sys
+import json
+import time
+import asyncio
+import importlib
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlsplit, parse_qs
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+from index import MARKET_CONFIG, prepare_market_frame, process_dynamic_securities_report
+from merge_partials import REPORT_FILE, load_records, upsert_records, write_records_atomic
+from security_master import normalize_code
+
+# 服务配置（从环境变量读取）
+QUOTE_SERVICE_HOST = os.environ.get('QUOTE_SERVICE_HOST', '127.0.0.1')
+QUOTE_SERVICE_PORT = int(os.environ.get('QUOTE_SERVICE_PORT', '8765'))
+QUOTE_SERVICE_PROVIDER = os.environ.get('QUOTE_SERVICE_PROVIDER', 'akshare')
+QUOTE_SERVICE_REFRESH_SECONDS = float(os.environ.get('QUOTE_SERVICE_REFRESH_SECONDS', '30'))
+QUOTE_SERVICE_PERSIST_SECONDS = float(os.environ.get('QUOTE_SERVICE_PERSIST_SECONDS', '300'))
+
+# process_dynamic_securities_report 查找代码时的市场顺序：A股 -> 港股 -> ETF
+MARKET_ORDER = ('a_shares', 'hk_shares', 'etf')
+
+
+def load_provider(name=QUOTE_SERVICE_PROVIDER):
+    """'akshare' 返回真实的 akshare 模块，'fake' 返回离线的 fake_akshare，两者的行情函数同名同列。"""
+    return importlib.import_module('fake_akshare' if name == 'fake' else name)
+
+
+class QuoteService:
+    """保存各市场最新行情并回答代码查询的内存服务。"""
+
+    def __init__(self, provider, refresh_seconds=QUOTE_SERVICE_REFRESH_SECONDS,
+                 persist_seconds=QUOTE_SERVICE_PERSIST_SECONDS, report_path=REPORT_FILE):
+        self.provider = provider
+        self.refresh_seconds = refresh_seconds
+        self.persist_seconds = persist_seconds
+        self.report_path = report_path
+        # list_type -> (DataFrame, trade_date, 刷新完成的时间戳)
+        self.markets = {}
+        self.errors = {}
+        self.watched_codes = {}
+
+    async def refresh_market(self, list_type):
+        """在线程池中拉取单个市场的全市场行情，成功后原子地替换内存中的数据。"""
+        fetcher = getattr(self.provider, MARKET_CONFIG[list_type]['fetcher'])
+        base_trade_date = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+        started = time.perf_counter()
+        try:
+            df_raw = await asyncio.get_running_loop().run_in_executor(None, fetcher)
+            df, trade_date = prepare_market_frame(list_type, df_raw, base_trade_date)
+        except Exception as e:
+            self.errors[list_type] = str(e)
+            print(f"Could not refresh '{list_type}' market data: {e}")
+            return
+        self.markets[list_type] = (df.drop_duplicates('代码').set_index('代码', drop=False), trade_date, time.time())
+        self.errors.pop(list_type, None)
+        print(f"Refreshed {len(df)} {MARKET_CONFIG[list_type]['label']} in {time.perf_counter() - started:.2f}s")
+
+    async def refresh_all(self):
+        await asyncio.gather(*(self.refresh_market(list_type) for list_type in MARKET_CONFIG))
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.refresh_all()
+
+    async def persist_loop(self):
+        while True:
+            await asyncio.sleep(self.persist_seconds)
+            self.persist()
+
+    def query(self, codes):
+        """
+        用内存中的行情回答一组代码，结果与 process_dynamic_securities_report 的输出格式相同。
+        代码先按 security_master.normalize_code 规范化（333 -> '000333'，'HK700' -> 'HK00700'），
+        再按 A股 -> 港股 -> ETF 的顺序归入第一个包含它的市场，并使用该市场自己的交易日。
+        """
+        codes = list(dict.fromkeys(code for code in map(normalize_code, codes) if code))
+        remaining = list(codes)
+        results = {}
+        for list_type in MARKET_ORDER:
+            if list_type not in self.markets or not remaining:
+                continue
+            df, trade_date, _ = self.markets[list_type]
+            found = df.index.intersection(remaining)
+            if found.empty:
+                continue
+            frames = {market: df.iloc[0:0] for market in MARKET_ORDER}
+            frames[list_type] = df.loc[found].reset_index(drop=True)
+            found_codes = [code for code in remaining if code in found]
+            for record in process_dynamic_securities_report(
+                    frames['a_shares'], frames['etf'], frames['hk_shares'], trade_date, found_codes):
+                results[record['代码']] = record
+            remaining = [code for code in remaining if code not in results]
+
+        self.watched_codes.update(dict.fromkeys(results))
+        return [results[code] for code in codes if code in results]
+
+    def persist(self):
+        """把被查询过的代码的最新行情增量写回报告文件。"""
+        if not self.watched_codes:
+            return 0
+        index = {record['代码']: record for record in load_records(self.report_path) if isinstance(record, dict) and '代码' in record}
+        changed = upsert_records(index, self.query(list(self.watched_codes)))
+        if changed:
+            write_records_atomic(self.report_path, list(index.values()))
+            print(f"Persisted {changed} updated quotes to {self.report_path}")
+        return changed
+
+    def health(self):
+        return {
+            'markets': {
+                list_type: {'rows': len(df), 'trade_date': trade_date, 'age_seconds': round(time.time() - refreshed_at, 1)}
+                for list_type, (df, trade_date, refreshed_at) in self.markets.items()
+            },
+            'errors': self.errors,
+            'watched_codes': len(self.watched_codes),
+        }
+
+    async def handle_connection(self, reader, writer):
+        """极简的 HTTP/1.1 处理：每个连接处理一个请求后关闭。"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+            status, payload = self.route(*request_line[:2], body)
+        except Exception as e:
+            status, payload = 400, {"error": f"Bad request: {e}"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+        writer.close()
+
+    def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health' and method == 'GET':
+            return 200, self.health()
+        if url.path != '/quotes':
+            return 404, {"error": "Not found."}
+
+        if method == 'GET':
+            codes = [code for value in parse_qs(url.query).get('codes', []) for code in value.split(',') if code]
+        elif method == 'POST':
+            codes = json.loads(body or b'{}').get('codes', [])
+        else:
+            return 405, {"error": "Method not allowed."}
+        if not isinstance(codes, list) or not codes:
+            return 400, {"error": "Missing or invalid 'codes'."}
+        return 200, self.query(codes)
+
+    async def serve(self, host=QUOTE_SERVICE_HOST, port=QUOTE_SERVICE_PORT):
+        await self.refresh_all()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Quote service listening on http://{host}:{port}")
+        tasks = [asyncio.create_task(self.refresh_loop()), asyncio.create_task(self.persist_loop())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.persist()
+
+
+def main():
+    service = QuoteService(load_provider())
+    try:
+        asyncio.run(service.serve())
+    except KeyboardInterrupt:
+        print("Quote service stopped.")
+
+
+if __name__ == "__main__":
+    main()
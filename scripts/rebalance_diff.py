@@ -0,0 +1,194 @@
+# scripts/rebalance_diff.py
+# 描述：向量化的调仓差异引擎。
+# 把每个组合的持仓历史按「修改时间」透视成 快照 × 代码 的稠密权重矩阵，相邻快照整块相减，
+# 一次算出所有快照对之间的新增、清仓、加减仓与换手率，结果是两张可直接筛选的表：
+# - changes：组合名称、修改时间、上次修改时间、股票代码、股票名称、weight_before、weight_after、delta、action
+# - summary：组合名称、修改时间、上次修改时间、adds、removes、increases、decreases、turnover
+#
+# 约定与 portfolio_valuation.py 一致（权重坐标直接使用其 weight_coordinates，两个引擎不会各自演化）：
+# - 权重为「配置比例 (%)」/ 100，同一快照内重复出现的代码权重累加，股票代码为空的行被忽略；
+# - 首个快照相对空仓比较（全部为 add）；换手率 = 0.5 × Σ|新权重 - 旧权重|；
+# - action：add = 从 0 到正数，remove = 从正数到 0，increase / decrease = 两侧均非 0 时的加减仓。
+# 快照按块处理（REBALANCE_SNAPSHOT_CHUNK 个一块），长历史下内存占用只与块大小和代码数有关。
+#
+# 用法：
+#   python scripts/rebalance_diff.py                               # 打印各组合最近一次调仓
+#   python scripts/rebalance_diff.py --portfolio 大成投资组合 --since 20250901 --output diff.csv
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from portfolio_store import PortfolioStore
+from portfolio_valuation import weight_coordinates
+
+REBALANCE_SNAPSHOT_CHUNK = int(os.environ.get('REBALANCE_SNAPSHOT_CHUNK', '1024'))
+# 小于该值的权重变化视为浮点误差
+WEIGHT_EPSILON = 1e-9
+
+ACTIONS = np.array(['increase', 'decrease', 'add', 'remove'], dtype=object)
+CHANGE_COLUMNS = ['组合名称', '修改时间', '上次修改时间', '股票代码', '股票名称',
+                  'weight_before', 'weight_after', 'delta', 'action']
+SUMMARY_COLUMNS = ['组合名称', '修改时间', '上次修改时间', 'adds', 'removes', 'increases', 'decreases', 'turnover']
+
+
+def diff_portfolio(df, chunk_size=REBALANCE_SNAPSHOT_CHUNK):
+    """
+    计算单个组合所有相邻快照之间的差异。
+    返回 (changes, summary) 两组按列存放的 numpy 数组（dict），不含组合名称。
+    """
+    snapshot_keys, codes, rows, cols, weights = weight_coordinates(df)
+    num_snapshots, num_codes = len(snapshot_keys), len(codes)
+    previous_keys = np.concatenate([[''], snapshot_keys[:-1]]).astype(object)
+
+    change_parts, summary_parts = [], []
+    previous_row = np.zeros(num_codes)
+    for start in range(0, num_snapshots, chunk_size):
+        stop = min(start + chunk_size, num_snapshots)
+        lo, hi = np.searchsorted(rows, [start, stop])
+        matrix = np.zeros((stop - start, num_codes))
+        np.add.at(matrix, (rows[lo:hi] - start, cols[lo:hi]), weights[lo:hi])
+
+        before = np.vstack([previous_row[None, :], matrix[:-1]])
+        delta = matrix - before
+        changed = np.abs(delta) > WEIGHT_EPSILON
+        held_before = before > WEIGHT_EPSILON
+        held_after = matrix > WEIGHT_EPSILON
+        added = changed & ~held_before & held_after
+        removed = changed & held_before & ~held_after
+        increased = changed & held_before & held_after & (delta > 0)
+
+        k_idx, c_idx = np.nonzero(changed)
+        # ACTIONS 的下标：0 increase、1 decrease、2 add、3 remove
+        action_index = np.where(added[k_idx, c_idx], 2, np.where(removed[k_idx, c_idx], 3,
+                                                               np.where(increased[k_idx, c_idx], 0, 1)))
+        change_parts.append({
+            'snapshot': k_idx + start,
+            'code': c_idx,
+            'weight_before': before[k_idx, c_idx],
+            'weight_after': matrix[k_idx, c_idx],
+            'delta': delta[k_idx, c_idx],
+            'action': action_index,
+        })
+        summary_parts.append({
+            'adds': added.sum(axis=1),
+            'removes': removed.sum(axis=1),
+            'increases': increased.sum(axis=1),
+            'decreases': (changed & held_before & held_after & (delta < 0)).sum(axis=1),
+            'turnover': 0.5 * np.abs(delta).sum(axis=1),
+        })
+        previous_row = matrix[-1]
+
+    changes = {key: np.concatenate([part[key] for part in change_parts]) if change_parts else np.array([])
+               for key in ('snapshot', 'code', 'weight_before', 'weight_after', 'delta', 'action')}
+    summary = {key: np.concatenate([part[key] for part in summary_parts]) if summary_parts else np.array([])
+               for key in ('adds', 'removes', 'increases', 'decreases', 'turnover')}
+    return snapshot_keys, previous_keys, codes, changes, summary
+
+
+def latest_names(df, codes):
+    """每个代码在历史中最后一次出现时的股票名称，按 codes 的顺序返回。"""
+    if '股票名称' not in df.columns:
+        return np.full(len(codes), None, dtype=object)
+    names = pd.Series(df['股票名称'].to_numpy(dtype=object), index=df['股票代码'].astype(str).to_numpy())
+    names = names[~names.index.duplicated(keep='last')]
+    return names.reindex(codes).to_numpy(dtype=object)
+
+
+class RebalanceDiff:
+    """所有组合的调仓差异表，changes / summary 为普通 DataFrame，query 提供常用的筛选。"""
+
+    def __init__(self, holdings, chunk_size=REBALANCE_SNAPSHOT_CHUNK):
+        change_frames, summary_frames = [], []
+        for name, df in holdings.items():
+            if df.empty:
+                continue
+            snapshot_keys, previous_keys, codes, changes, summary = diff_portfolio(df, chunk_size)
+            code_names = latest_names(df, codes)
+
+            snapshot = changes['snapshot'].astype(np.int64)
+            code = changes['code'].astype(np.int64)
+            change_frames.append(pd.DataFrame({
+                '组合名称': name,
+                '修改时间': snapshot_keys[snapshot].astype(object),
+                '上次修改时间': previous_keys[snapshot],
+                '股票代码': codes[code].astype(object),
+                '股票名称': code_names[code],
+                'weight_before': changes['weight_before'],
+                'weight_after': changes['weight_after'],
+                'delta': changes['delta'],
+                'action': ACTIONS[changes['action'].astype(np.int64)],
+            }))
+            summary_frames.append(pd.DataFrame({
+                '组合名称': name,
+                '修改时间': snapshot_keys.astype(object),
+                '上次修改时间': previous_keys,
+                **summary,
+            }))
+
+        self.changes = pd.concat(change_frames, ignore_index=True) if change_frames else pd.DataFrame(columns=CHANGE_COLUMNS)
+        self.summary = pd.concat(summary_frames, ignore_index=True) if summary_frames else pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    @classmethod
+    def from_store(cls, store=None, portfolios=None):
+        """从组合库（merge_excel 维护的持仓历史）加载全部或指定组合。"""
+        store = store or PortfolioStore()
+        names = portfolios or store.sheet_names()
+        return cls({name: store.read(name) for name in names})
+
+    def query(self, portfolio=None, code=None, since=None, until=None, actions=None):
+        """
+        按组合、代码、修改时间范围（'20250901' 这样的前缀，含两端）和操作类型筛选 changes。
+        """
+        changes = self.changes
+        mask = pd.Series(True, index=changes.index)
+        if portfolio is not None:
+            mask &= changes['组合名称'] == portfolio
+        if code is not None:
+            mask &= changes['股票代码'] == str(code)
+        if since is not None:
+            mask &= changes['修改时间'].str[:len(str(since))] >= str(since)
+        if until is not None:
+            mask &= changes['修改时间'].str[:len(str(until))] <= str(until)
+        if actions is not None:
+            mask &= changes['action'].isin([actions] if isinstance(actions, str) else actions)
+        return changes[mask]
+
+    def latest(self):
+        """每个组合最近一次调仓的变动明细。"""
+        last = self.summary.groupby('组合名称', sort=False)['修改时间'].max()
+        return self.changes[self.changes['修改时间'] == self.changes['组合名称'].map(last)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff consecutive portfolio snapshots.")
+    parser.add_argument('--portfolio', help="only this sheet / portfolio")
+    parser.add_argument('--code', help="only this security code")
+    parser.add_argument('--since', help="修改时间 prefix lower bound, e.g. 20250901")
+    parser.add_argument('--until', help="修改时间 prefix upper bound, e.g. 20250930")
+    parser.add_argument('--action', action='append', choices=list(ACTIONS), help="filter by action (repeatable)")
+    parser.add_argument('--output', help="write the filtered changes to a .csv or .parquet file")
+    args = parser.parse_args()
+
+    diff = RebalanceDiff.from_store(portfolios=[args.portfolio] if args.portfolio else None)
+    print(f"Computed {len(diff.changes)} weight changes across {len(diff.summary)} snapshots")
+
+    if any([args.portfolio, args.code, args.since, args.until, args.action]):
+        result = diff.query(args.portfolio, args.code, args.since, args.until, args.action)
+    else:
+        result = diff.latest()
+
+    if args.output:
+        if args.output.endswith('.parquet'):
+            result.to_parquet(args.output, index=False)
+        else:
+            result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"Wrote {len(result)} rows to {args.output}")
+    else:
+        with pd.option_context('display.max_rows', 200, 'display.width', 200):
+            print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
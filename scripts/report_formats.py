@@ -0,0 +1,158 @@
+# scripts/report_formats.py
+# 描述：行情报告的紧凑输出格式。
+# - 列式 JSON（columnar-v1）：所有记录取值相同的字段（如 update_time_bjt、trade_date）只写一次，
+#   其余字段按列写成并行数组，且不带缩进；
+# - 每个市场单独一份文件，并附带 gzip（以及安装了 brotli 时的 .br）压缩版本；
+# - manifest.json 记录每个市场文件的内容哈希（ETag）、记录数和各版本的字节数，
+#   前端先取 manifest，只重新下载 ETag 变化的市场。内容未变化的市场文件不会被重写。
+#
+# 列式文档的结构：
+#   {"format": "columnar-v1", "count": 2, "fields": ["代码", "名称", ...],
+#    "shared": {"trade_date": "2025-12-15", ...}, "columns": {"代码": ["000333", "600519"], ...}}
+# 还原第 i 条记录：按 fields 的顺序，字段在 shared 中取共享值，否则取 columns[字段][i]。
+
+import os
+import gzip
+import json
+import hashlib
+from datetime import datetime, timezone, timedelta
+
+from security_master import SecurityMaster
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COLUMNAR_FORMAT = 'columnar-v1'
+
+# 输出配置（从环境变量读取）
+# REPORT_COLUMNAR_OUTPUT=1 时，合并报告后额外写出按市场拆分的列式报告（原有的数组格式报告照常写出）
+REPORT_COLUMNAR_OUTPUT = os.environ.get('REPORT_COLUMNAR_OUTPUT', '0').lower() in ('1', 'true', 'yes')
+# partial 文件的格式：json（默认，indent=4 的记录数组）或 columnar
+REPORT_PARTIAL_FORMAT = os.environ.get('REPORT_PARTIAL_FORMAT', 'json')
+REPORT_COLUMNAR_DIR = os.environ.get('REPORT_COLUMNAR_DIR', 'data/report')
+REPORT_MANIFEST_NAME = 'manifest.json'
+
+MARKETS = ('a_shares', 'hk_shares', 'etf')
+
+
+def to_columnar(records):
+    """把记录数组转换为列式文档。缺少某字段的记录在该列中补 None。"""
+    fields = list(dict.fromkeys(field for record in records for field in record))
+    shared, columns = {}, {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if all(field in record for record in records) and all(value == values[0] for value in values):
+            shared[field] = values[0]
+        else:
+            columns[field] = values
+    return {'format': COLUMNAR_FORMAT, 'count': len(records), 'fields': fields, 'shared': shared, 'columns': columns}
+
+
+def from_columnar(doc):
+    """把列式文档还原为记录数组。"""
+    shared, columns = doc.get('shared', {}), doc.get('columns', {})
+    return [
+        {field: shared[field] if field in shared else columns[field][i] for field in doc['fields']}
+        for i in range(doc['count'])
+    ]
+
+
+def is_columnar(doc):
+    return isinstance(doc, dict) and doc.get('format') == COLUMNAR_FORMAT
+
+
+def encode_compact(doc):
+    """不带缩进和多余空格的 UTF-8 JSON。"""
+    return json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def content_etag(data):
+    """内容哈希形式的强 ETag（带引号，可直接用于 If-None-Match）。"""
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def compressed_variants(data):
+    """返回 {扩展名: 压缩后的字节}。gzip 固定 mtime=0，相同内容总是得到相同的压缩结果。"""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def _write_bytes_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir=REPORT_COLUMNAR_DIR):
+    try:
+        with open(os.path.join(output_dir, REPORT_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def publish_columnar_report(records, output_dir=REPORT_COLUMNAR_DIR, classify=None):
+    """
+    把报告按市场拆分（默认按证券主表归类），写出列式 JSON 及其压缩版本，并更新 manifest.json。
+    ETag 与上一次相同且文件都还在的市场不重写。返回内容发生变化的市场列表。
+    """
+    classify = classify or SecurityMaster().market_of
+    os.makedirs(output_dir, exist_ok=True)
+    groups = {}
+    for record in records:
+        groups.setdefault(classify(record['代码']), []).append(record)
+
+    manifest = load_manifest(output_dir)
+    entries = manifest.get('markets', {})
+    changed = []
+    for market in sorted(groups, key=lambda m: MARKETS.index(m) if m in MARKETS else len(MARKETS)):
+        data = encode_compact(to_columnar(groups[market]))
+        etag = content_etag(data)
+        variants = compressed_variants(data)
+        filename = f"{market}.json"
+        paths = [os.path.join(output_dir, filename + suffix) for suffix in ('', *variants)]
+        entry = entries.get(market, {})
+        if entry.get('etag') == etag and set(entry.get('variants', {})) == set(variants) and all(os.path.exists(p) for p in paths):
+            continue
+
+        _write_bytes_atomic(paths[0], data)
+        for suffix, payload in variants.items():
+            _write_bytes_atomic(os.path.join(output_dir, filename + suffix), payload)
+        trade_dates = sorted({record.get('trade_date') for record in groups[market] if record.get('trade_date')})
+        entries[market] = {
+            'file': filename,
+            'etag': etag,
+            'records': len(groups[market]),
+            'trade_date': trade_dates[-1] if trade_dates else None,
+            'bytes': len(data),
+            'variants': {suffix: len(payload) for suffix, payload in variants.items()},
+        }
+        changed.append(market)
+        print(f"Wrote columnar report '{filename}': {len(data)} bytes, " +
+              ", ".join(f"{suffix} {len(payload)} bytes" for suffix, payload in variants.items()))
+
+    # 报告中已不存在的市场从 manifest 和输出目录中移除
+    for market in [m for m in entries if m not in groups]:
+        entry = entries.pop(market)
+        for suffix in ('', *entry.get('variants', {})):
+            path = os.path.join(output_dir, entry['file'] + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        changed.append(market)
+
+    if changed or not os.path.exists(os.path.join(output_dir, REPORT_MANIFEST_NAME)):
+        manifest = {
+            'format': COLUMNAR_FORMAT,
+            'generated_at_bjt': datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'),
+            'markets': entries,
+        }
+        _write_bytes_atomic(os.path.join(output_dir, REPORT_MANIFEST_NAME),
+                            json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    else:
+        print("Columnar report unchanged. Manifest left untouched.")
+    return changed
@@ -0,0 +1,207 @@
+# scripts/security_master.py
+# 描述：证券主表与代码规范化。
+# - normalize_code：把各种写法的代码统一成报告中使用的形式：
+#   A股/ETF 为 6 位数字字符串（整数 333 -> '000333'，'600519.SH'、'SH600519' -> '600519'），
+#   港股为 'HK' + 5 位数字（'HK700'、'00700.HK' -> 'HK00700'）；
+# - SecurityMaster：规范化代码 -> (市场, 名称) 的持久化索引，由全市场行情快照构建，
+#   保存在 data/security_master.json，加载后按代码 O(1) 查询；
+#   用于把混合的代码列表自动拆分到各市场，只拉取真正需要的市场。
+#   行情拉取任务并发运行，只读取主表；主表由串行执行的 data-merger 工作流按合并的 partial 增量更新
+#   （见 scripts/merge_partials.py），全量重建使用本模块的 main()。
+# 主表中没有的代码按代码格式推断市场（见 guess_market）：能明确识别为港股或 ETF 的代码按推断结果归类，
+# 其余代码使用调用方给出的默认市场。
+# api/trigger.py 在冷启动时导入本模块，因此模块级只导入标准库，pandas / numpy 在用到时再导入。
+
+import os
+import json
+import numbers
+from datetime import datetime, timezone, timedelta
+
+SECURITY_MASTER_FILE = os.environ.get('SECURITY_MASTER_FILE', 'data/security_master.json')
+
+# 市场 -> process_dynamic_securities_report 中的证券类型
+MARKET_TYPES = {'a_shares': 'stock', 'hk_shares': 'hk_stock', 'etf': 'etf'}
+EXCHANGE_PREFIXES = ('SH', 'SZ', 'BJ')
+
+
+def normalize_code(code):
+    """把单个代码规范化；空值返回 None，无法识别的写法原样（去空格、转大写）返回。"""
+    if code is None or isinstance(code, bool):
+        return None
+    if isinstance(code, numbers.Real) and not isinstance(code, numbers.Integral):
+        if code != code:  # NaN
+            return None
+        code = int(code)
+    text = str(code).strip().upper()
+    if not text or text in ('NAN', 'NONE'):
+        return None
+    # Excel 中的数字单元格按字符串读出时会带上 '.0'
+    if text.endswith('.0') and text[:-2].isdigit():
+        text = text[:-2]
+
+    base, dot, suffix = text.partition('.')
+    if dot and suffix == 'HK':
+        text = 'HK' + base
+    elif dot and suffix in EXCHANGE_PREFIXES:
+        text = base
+
+    if text.startswith('HK'):
+        digits = text[2:]
+        return 'HK' + digits.zfill(5) if digits.isdigit() else text
+    if text[:2] in EXCHANGE_PREFIXES and text[2:].isdigit():
+        text = text[2:]
+    return text.zfill(6) if text.isdigit() else text
+
+
+def normalize_code_series(series):
+    """对整列代码做规范化：每个不同的取值只规范化一次。返回 object 类型的 Series。"""
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([normalize_code(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, name=series.name, dtype=object)
+
+
+def guess_market(code):
+    """
+    按代码格式推断市场：HK 前缀为港股；15/16/5 开头的 6 位代码为 ETF（深市 15x/16x、沪市 5xxxxx）；
+    其余为 A 股。code 应为 normalize_code 的结果。
+    """
+    if code.startswith('HK'):
+        return 'hk_shares'
+    if len(code) == 6 and code.startswith(('15', '16', '5')):
+        return 'etf'
+    return 'a_shares'
+
+
+# 同一进程内按 (路径, 修改时间) 复用已加载的主表
+_loaded = {}
+
+
+class SecurityMaster:
+    """规范化代码 -> [市场, 名称] 的索引。"""
+
+    def __init__(self, path=SECURITY_MASTER_FILE):
+        self.path = path
+        self.data = self._load()
+        self.codes = self.data['codes']
+
+    def _load(self):
+        try:
+            key = (self.path, os.path.getmtime(self.path))
+        except OSError:
+            return {'version': 1, 'updated_at_bjt': None, 'markets': {}, 'codes': {}}
+        if key not in _loaded:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                _loaded.clear()
+                _loaded[key] = json.load(f)
+        return _loaded[key]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return normalize_code(code) in self.codes
+
+    def lookup(self, code):
+        """返回 {'code', 'market', 'name', 'type'}，主表中没有时返回 None。"""
+        code = normalize_code(code)
+        entry = self.codes.get(code) if code else None
+        if entry is None:
+            return None
+        market, name = entry
+        return {'code': code, 'market': market, 'name': name, 'type': MARKET_TYPES[market]}
+
+    def market_of(self, code, default=None):
+        """
+        代码所属市场：优先查主表；主表中没有时，代码格式能明确识别为港股 / ETF 的按推断结果，
+        否则使用 default，没有 default 时为 A 股。
+        """
+        code = normalize_code(code)
+        if code in self.codes:
+            return self.codes[code][0]
+        guessed = guess_market(code)
+        return guessed if guessed != 'a_shares' else default or guessed
+
+    def route(self, codes, default=None):
+        """把代码列表规范化、去重并拆分到各市场，返回 {市场: [代码]}（保持输入顺序）。"""
+        routed = {}
+        for code in codes:
+            normalized = normalize_code(code)
+            if not normalized:
+                continue
+            market = self.market_of(normalized, default)
+            routed.setdefault(market, {})[normalized] = None
+        return {market: list(codes) for market, codes in routed.items()}
+
+    def update_market(self, list_type, df, complete=True):
+        """
+        用已规范化代码列（港股带 'HK' 前缀）的行情表更新主表。
+        complete=True 表示 df 是该市场的全量行情，主表中该市场不再出现的代码会被移除；
+        否则只新增或更新 df 中的代码，且不会把主表中已属于其他市场的代码改归到 list_type。
+        返回主表是否发生变化。
+        """
+        import pandas as pd
+        if df.empty or '代码' not in df.columns:
+            return False
+        names = df['名称'] if '名称' in df.columns else pd.Series([None] * len(df), index=df.index)
+        incoming = {code: [list_type, None if pd.isna(name) else str(name)]
+                    for code, name in zip(normalize_code_series(df['代码']), names) if code}
+
+        codes = dict(self.codes)
+        if complete:
+            codes = {code: entry for code, entry in codes.items() if entry[0] != list_type}
+        else:
+            conflicting = [code for code in incoming if code in codes and codes[code][0] != list_type]
+            if conflicting:
+                print(f"Ignoring {len(conflicting)} code(s) already filed under another market "
+                      f"than '{list_type}': {', '.join(conflicting[:10])}")
+                for code in conflicting:
+                    del incoming[code]
+        codes.update(incoming)
+        if codes == self.codes:
+            return False
+
+        now = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')
+        markets = dict(self.data.get('markets', {}))
+        markets[list_type] = {'updated_at_bjt': now, 'count': sum(1 for entry in codes.values() if entry[0] == list_type)}
+        self.data = {'version': 1, 'updated_at_bjt': now, 'markets': markets, 'codes': dict(sorted(codes.items()))}
+        self.codes = self.data['codes']
+        return True
+
+    def save(self):
+        """原子地写入主表文件（紧凑 JSON，一行一个代码便于查看 diff）。"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        header = {key: value for key, value in self.data.items() if key != 'codes'}
+        lines = [json.dumps(code, ensure_ascii=False) + ':' + json.dumps(entry, ensure_ascii=False)
+                 for code, entry in self.codes.items()]
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False)[:-1] + ',"codes":{\n' + ',\n'.join(lines) + '\n}}\n')
+        os.replace(tmp_path, self.path)
+        print(f"Security master saved to {self.path} ({len(self.codes)} codes).")
+
+
+def main():
+    """用快照缓存中各市场最近一次的全市场行情重建证券主表。"""
+    from snapshot_cache import SnapshotCache
+    cache = SnapshotCache()
+    master = SecurityMaster()
+    changed = False
+    for list_type in MARKET_TYPES:
+        df = cache.latest(list_type)
+        if df is None:
+            print(f"No cached snapshot for '{list_type}'. Skipping.")
+            continue
+        df = df.copy()
+        if list_type == 'hk_shares':
+            df['代码'] = 'HK' + df['代码'].astype(str)
+        changed = master.update_market(list_type, df) or changed
+    if changed:
+        master.save()
+    else:
+        print("Security master is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# scripts/snapshot_cache.py
+# 描述：akshare 全市场行情快照的本地磁盘缓存。
+# 按 (市场, 交易日) 保存原始 DataFrame，在 TTL 内直接复用，避免每次触发都重新分页下载整个市场；
+# 实时拉取失败时回退到 SNAPSHOT_FALLBACK_MAX_AGE 内最近一次成功的快照，并在 DataFrame.attrs 中标记为过期快照，
+# 带上快照自己的交易日和抓取时间，调用方据此生成记录，不会用旧行情冒充当前行情。
+# 缓存目录总大小超过上限时按最旧优先淘汰。
+#
+# 注意：默认 TTL（60 秒）只覆盖同一次运行内以及紧接着的重复触发；两次 workflow 运行之间仅启动和恢复缓存
+# 就通常超过 60 秒，跨运行复用需要在工作流中把 SNAPSHOT_CACHE_TTL 设得更大（见 .github/workflows/main.yml）。
+
+import os
+import time
+import pandas as pd
+from datetime import datetime, timezone, timedelta
+
+try:
+    import pyarrow  # noqa: F401  仅用于探测 Parquet 支持
+    SNAPSHOT_FORMAT = 'parquet'
+except ImportError:
+    SNAPSHOT_FORMAT = 'pickle'
+
+# 缓存配置（从环境变量读取）
+SNAPSHOT_CACHE_DIR = os.environ.get('SNAPSHOT_CACHE_DIR', 'data/.snapshot_cache')
+SNAPSHOT_CACHE_TTL = float(os.environ.get('SNAPSHOT_CACHE_TTL', '60'))
+SNAPSHOT_CACHE_MAX_MB = float(os.environ.get('SNAPSHOT_CACHE_MAX_MB', '200'))
+# 实时拉取失败时可回退使用的快照的最大年龄（秒），更旧的快照不再使用
+SNAPSHOT_FALLBACK_MAX_AGE = float(os.environ.get('SNAPSHOT_FALLBACK_MAX_AGE', '86400'))
+
+# 回退快照在 DataFrame.attrs 中的标记：{'stale': True, 'trade_date': 快照交易日, 'fetched_at_bjt': 抓取时间}
+SNAPSHOT_ATTRS_KEY = 'snapshot'
+
+
+class SnapshotCache:
+    """以 (market, trade_date) 为键的行情快照缓存，文件的修改时间即快照的抓取时间。"""
+
+    def __init__(self, cache_dir=SNAPSHOT_CACHE_DIR, ttl_seconds=SNAPSHOT_CACHE_TTL,
+                 max_bytes=int(SNAPSHOT_CACHE_MAX_MB * 1024 * 1024), snapshot_format=SNAPSHOT_FORMAT,
+                 fallback_max_age=SNAPSHOT_FALLBACK_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.fallback_max_age = fallback_max_age
+        self.max_bytes = max_bytes
+        self.snapshot_format = snapshot_format
+        self.extension = '.parquet' if snapshot_format == 'parquet' else '.pkl'
+
+    def _path(self, market, trade_date):
+        return os.path.join(self.cache_dir, f"{market}_{trade_date}{self.extension}")
+
+    def _snapshots(self, market=None):
+        """返回缓存目录中的快照文件列表 [(mtime, size, path)]，按时间从旧到新排序。"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        prefix = f"{market}_" if market else ''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith(self.extension):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _read(self, path):
+        if self.snapshot_format == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def get(self, market, trade_date):
+        """返回 TTL 内的快照；不存在或已过期时返回 None。"""
+        path = self._path(market, trade_date)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if age > self.ttl_seconds:
+                return None
+            return self._read(path)
+        except (OSError, ValueError):
+            return None
+
+    def latest(self, market, max_age_seconds=None):
+        """
+        返回该市场最近一次成功保存的快照（忽略 TTL 和交易日），没有或超过 max_age_seconds 时返回 None。
+        返回的 DataFrame.attrs[SNAPSHOT_ATTRS_KEY] 记录快照的交易日和抓取时间（北京时间）。
+        """
+        for mtime, _, path in reversed(self._snapshots(market)):
+            if max_age_seconds is not None and time.time() - mtime > max_age_seconds:
+                return None
+            try:
+                df = self._read(path)
+            except (OSError, ValueError):
+                continue
+            name = os.path.basename(path)[:-len(self.extension)]
+            df.attrs[SNAPSHOT_ATTRS_KEY] = {
+                'stale': True,
+                'trade_date': name[len(market) + 1:],
+                'fetched_at_bjt': datetime.fromtimestamp(mtime, timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            return df
+        return None
+
+    def put(self, market, trade_date, df):
+        """原子地写入快照，随后执行容量淘汰。写入失败只打印告警，不影响主流程。"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(market, trade_date)
+        tmp_path = f"{path}.tmp"
+        try:
+            if self.snapshot_format == 'parquet':
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning: Could not write snapshot cache for '{market}': {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """缓存目录总大小超过 max_bytes 时，从最旧的快照开始删除（始终保留最新的一份）。"""
+        entries = self._snapshots()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            print(f"Evicted snapshot cache entry {path}")
+
+    def fetch(self, market, trade_date, fetcher):
+        """
+        缓存优先地获取行情快照：
+        1. TTL 内的缓存直接返回；
+        2. 否则调用 fetcher() 实时拉取并写入缓存；
+        3. 实时拉取失败时回退到 fallback_max_age 内最近一次成功的快照（attrs 中带过期标记），
+           没有可用快照时抛出原始异常。
+        """
+        df = self.get(market, trade_date)
+        if df is not None:
+            print(f"Using cached '{market}' snapshot for {trade_date} ({len(df)} rows).")
+            return df
+
+        try:
+            df = fetcher()
+        except Exception as e:
+            df = self.latest(market, self.fallback_max_age)
+            if df is None:
+                raise
+            snapshot = df.attrs[SNAPSHOT_ATTRS_KEY]
+            print(f"Live fetch for '{market}' failed ({e}). Falling back to the stale snapshot of "
+                  f"{snapshot['trade_date']} fetched at {snapshot['fetched_at_bjt']} ({len(df)} rows).")
+            return df
+
+        if not df.empty:
+            self.put(market, trade_date, df)
+        return df
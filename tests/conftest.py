@@ -0,0 +1,11 @@
+# tests/conftest.py
+# 测试直接导入 scripts/ 与 api/ 下的模块（与 api 入口文件相同的做法）。
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('scripts', 'api'):
+    path = os.path.join(ROOT_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,211 @@
+# tests/test_fetch_planner.py
+# 用 fake_akshare 的单代码报价与全市场接口（以及总是失败的替身）驱动 FetchPlanner 的规划、重试、熔断与回退。
+
+from types import SimpleNamespace
+
+import pytest
+
+import fake_akshare
+import fetch_planner
+from fetch_planner import CircuitBreaker, CircuitOpenError, FetchPlanner, call_with_retry
+from snapshot_cache import SnapshotCache
+
+TRADE_DATE = '2025-09-22'
+CODES = fake_akshare.a_share_codes()[:3]
+
+
+class FakeClock:
+    """替代 fetch_planner 中的 time 模块：monotonic 由测试推进，sleep 只记录退避时长。"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fetch_planner, 'time', SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    # 熔断器按接口名称在进程内共享，每个测试从全新状态开始
+    fetch_planner._breakers.clear()
+    yield clock
+    fetch_planner._breakers.clear()
+
+
+@pytest.fixture
+def snapshot_cache(tmp_path):
+    return SnapshotCache(str(tmp_path / 'snapshots'), ttl_seconds=0)
+
+
+def failing_symbol_quote(list_type, code):
+    raise ConnectionError('push2 unavailable')
+
+
+class Flaky:
+    """前 failures 次调用抛出异常，之后返回 result。"""
+
+    def __init__(self, failures, result='ok'):
+        self.failures = failures
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError(f'attempt {self.calls} failed')
+        return self.result
+
+
+def test_estimate_scales_with_codes_and_concurrency():
+    planner = FetchPlanner(concurrency=4, symbol_seconds=0.2, page_seconds=0.5)
+    cost = planner.estimate('a_shares', 10)
+    assert cost['full'] == {'seconds': fetch_planner.FULL_MARKET_PAGES['a_shares'] * 0.5,
+                            'requests': fetch_planner.FULL_MARKET_PAGES['a_shares']}
+    assert cost['symbol']['requests'] == 10
+    assert cost['symbol']['seconds'] == pytest.approx(3 * 0.2)
+
+
+def test_plan_prefers_symbol_for_short_lists():
+    planner = FetchPlanner(mode='auto', concurrency=8, max_symbol_codes=200)
+    assert planner.plan('a_shares', CODES) == 'symbol'
+    assert planner.plan('a_shares', []) == 'full'
+
+
+def test_plan_uses_full_for_long_lists_and_forced_modes():
+    assert FetchPlanner(mode='auto', max_symbol_codes=2).plan('a_shares', CODES) == 'full'
+    # 代码很多时按耗时模型也应选择全市场
+    assert FetchPlanner(mode='auto', concurrency=1, max_symbol_codes=10_000).plan(
+        'etf', fake_akshare.etf_codes()) == 'full'
+    assert FetchPlanner(mode='full').plan('a_shares', CODES) == 'full'
+    assert FetchPlanner(mode='symbol', max_symbol_codes=0).plan('a_shares', CODES) == 'symbol'
+
+
+def test_plan_uses_full_while_symbol_breaker_is_open():
+    breaker = fetch_planner.get_breaker('symbol.a_shares')
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert FetchPlanner(mode='auto').plan('a_shares', CODES) == 'full'
+
+
+def test_retry_backs_off_exponentially(clock):
+    func = Flaky(failures=2)
+    breaker = CircuitBreaker('test', failure_threshold=10)
+    assert call_with_retry(func, breaker, retries=2, backoff_seconds=0.5) == 'ok'
+    assert func.calls == 3
+    assert clock.sleeps == [0.5, 1.0]
+    assert breaker.failures == 0
+
+
+def test_retry_raises_last_error_when_exhausted(clock):
+    func = Flaky(failures=5)
+    breaker = CircuitBreaker('test', failure_threshold=10)
+    with pytest.raises(ConnectionError, match='attempt 3 failed'):
+        call_with_retry(func, breaker, retries=2, backoff_seconds=0.5)
+    # 最后一次失败后不再等待
+    assert clock.sleeps == [0.5, 1.0]
+    assert breaker.failures == 3
+
+
+def test_breaker_opens_and_half_opens_after_cooldown(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, cooldown_seconds=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(Flaky(failures=0), breaker, retries=0)
+
+    clock.now += 30
+    assert not breaker.is_open()
+    # 半开：放行一次试探调用，失败立即重新打开
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert call_with_retry(Flaky(failures=0), breaker, retries=0) == 'ok'
+    assert not breaker.is_open()
+    assert breaker.failures == 0
+
+
+def test_fetch_uses_symbol_endpoint(snapshot_cache):
+    planner = FetchPlanner(symbol_fetcher=fake_akshare.symbol_quote, mode='auto')
+    full_fetcher = Flaky(failures=0, result=None)
+    df, plan = planner.fetch('a_shares', CODES, TRADE_DATE, snapshot_cache, full_fetcher)
+    assert plan == 'symbol'
+    assert list(df['代码']) == CODES
+    assert list(df.columns) == fetch_planner.SYMBOL_COLUMNS['a_shares']
+    assert full_fetcher.calls == 0
+
+
+def test_fetch_falls_back_when_codes_are_not_found(snapshot_cache):
+    planner = FetchPlanner(symbol_fetcher=fake_akshare.symbol_quote, mode='symbol')
+    df, plan = planner.fetch('a_shares', CODES + ['999999'], TRADE_DATE, snapshot_cache, fake_akshare.stock_zh_a_spot_em)
+    # 单代码接口查不到的代码不会被悄悄丢掉，而是整体回退到全市场接口
+    assert plan == 'full'
+    assert set(CODES) <= set(df['代码'])
+    assert '999999' not in set(df['代码'])
+
+
+@pytest.mark.parametrize('code, secid', [
+    ('600519', '1.600519'), ('688981', '1.688981'), ('900901', '1.900901'),
+    ('000001', '0.000001'), ('300750', '0.300750'), ('920001', '0.920001'), ('830799', '0.830799'),
+])
+def test_symbol_secid_markets(code, secid):
+    assert fetch_planner._symbol_secid('a_shares', code) == secid
+
+
+class FakeEastmoneySession:
+    """只认识正确 secid 的东方财富报价接口替身；错误的 secid 与真实接口一样返回 data: null。"""
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+
+    def get(self, url, params, timeout):
+        data = self.quotes.get(params['secid'])
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {'data': data})
+
+
+def test_beijing_code_is_quoted_on_the_per_symbol_endpoint(snapshot_cache):
+    session = FakeEastmoneySession({'0.920001': {'f58': '北交所样本', 'f43': 12.5, 'f170': 1.2, 'f48': 1e6,
+                                                 'f162': 20.1, 'f167': 2.3}})
+    planner = FetchPlanner(symbol_fetcher=lambda list_type, code: fetch_planner.eastmoney_symbol_quote(
+        list_type, code, session=session), mode='symbol')
+    df, plan = planner.fetch('a_shares', ['920001'], TRADE_DATE, snapshot_cache, Flaky(failures=10))
+    assert plan == 'symbol'
+    assert df.to_dict('records') == [{'代码': '920001', '名称': '北交所样本', '最新价': 12.5, '涨跌幅': 1.2,
+                                      '成交额': 1e6, '市盈率-动态': 20.1, '市净率': 2.3}]
+
+
+def test_fetch_falls_back_to_full_market(snapshot_cache, clock):
+    planner = FetchPlanner(symbol_fetcher=failing_symbol_quote, mode='symbol')
+    df, plan = planner.fetch('a_shares', CODES, TRADE_DATE, snapshot_cache, fake_akshare.stock_zh_a_spot_em)
+    assert plan == 'full'
+    assert len(df) == len(fake_akshare.a_share_codes())
+    assert set(CODES) <= set(df['代码'])
+    assert clock.sleeps, 'per-symbol failures should be retried with backoff'
+    # 全市场结果写入了快照缓存
+    assert snapshot_cache.latest('a_shares') is not None
+
+
+def test_fetch_falls_back_when_symbol_breaker_opens(snapshot_cache):
+    breaker = fetch_planner.get_breaker('symbol.a_shares')
+    breaker.failure_threshold = 1
+    planner = FetchPlanner(symbol_fetcher=failing_symbol_quote, mode='symbol')
+    df, plan = planner.fetch('a_shares', CODES, TRADE_DATE, snapshot_cache, fake_akshare.stock_zh_a_spot_em)
+    assert plan == 'full'
+    assert breaker.is_open()
+
+
+def test_fetch_raises_when_both_endpoints_fail(snapshot_cache):
+    planner = FetchPlanner(symbol_fetcher=failing_symbol_quote, mode='symbol')
+    with pytest.raises(ConnectionError):
+        planner.fetch('a_shares', CODES, TRADE_DATE, snapshot_cache, Flaky(failures=10))
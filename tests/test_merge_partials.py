@@ -0,0 +1,52 @@
+# tests/test_merge_partials.py
+# 合并任务按代码 upsert partial，并作为唯一的写入方增量更新证券主表。
+
+import json
+
+import pytest
+
+import security_master
+from merge_partials import merge_partials, partial_market
+from security_master import SecurityMaster
+
+
+def write_partial(path, records):
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def master_path(tmp_path, monkeypatch):
+    # 主表使用默认的相对路径 data/security_master.json
+    monkeypatch.chdir(tmp_path)
+    return security_master.SECURITY_MASTER_FILE
+
+
+def test_partial_market():
+    assert partial_market('data/partial_hk_shares.json') == 'hk_shares'
+    assert partial_market('data/partial_unknown.json') is None
+    assert partial_market('data/report.json') is None
+
+
+def test_merge_updates_master_from_partials(tmp_path, master_path):
+    report = str(tmp_path / 'report.json')
+    a_shares = write_partial(tmp_path / 'partial_a_shares.json', [
+        {'代码': '600519', '名称': '贵州茅台', 'update_time_bjt': '2025-09-22 10:00:00'},
+    ])
+    etf = write_partial(tmp_path / 'partial_etf.json', [
+        {'代码': '510300', '名称': '沪深300ETF', 'update_time_bjt': '2025-09-22 10:00:00'},
+    ])
+
+    assert merge_partials(report, [a_shares, etf], columnar=False, master=True) == 2
+    master = SecurityMaster(master_path)
+    assert master.lookup('600519') == {'code': '600519', 'market': 'a_shares', 'name': '贵州茅台', 'type': 'stock'}
+    assert master.lookup('510300')['market'] == 'etf'
+
+
+def test_merge_leaves_master_alone_by_default(tmp_path, master_path):
+    report = str(tmp_path / 'report.json')
+    partial = write_partial(tmp_path / 'partial_a_shares.json', [
+        {'代码': '600519', '名称': '贵州茅台', 'update_time_bjt': '2025-09-22 10:00:00'},
+    ])
+    merge_partials(report, [partial], columnar=False)
+    assert len(SecurityMaster(master_path)) == 0
@@ -0,0 +1,58 @@
+# tests/test_object_storage.py
+# 按 MD5 的条件上传：LocalStorage 首次上传、内容未变化时跳过、内容变化后重新上传。
+
+import hashlib
+import json
+
+import pytest
+
+from object_storage import LocalStorage, ObjectStorage, file_md5
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path / 'bucket'))
+
+
+def test_upload_file_if_changed(storage, tmp_path):
+    source = tmp_path / 'report.json'
+    source.write_bytes(b'[1, 2, 3]')
+    assert storage.upload_file_if_changed('data/report.json', str(source)) is True
+    assert storage.upload_file_if_changed('data/report.json', str(source)) is False
+
+    source.write_bytes(b'[1, 2, 3, 4]')
+    assert storage.upload_file_if_changed('data/report.json', str(source)) is True
+    target = tmp_path / 'bucket' / 'data' / 'report.json'
+    assert target.read_bytes() == b'[1, 2, 3, 4]'
+    assert json.loads((tmp_path / 'bucket' / 'data' / 'report.json.meta.json').read_text()) == {
+        'md5': file_md5(str(source))}
+    assert not (tmp_path / 'bucket' / 'data' / 'report.json.tmp').exists()
+
+
+def test_upload_bytes_if_changed(storage):
+    assert storage.get_md5('report.json') is None
+    assert storage.upload_bytes_if_changed('report.json', b'v1') is True
+    assert storage.get_md5('report.json') == hashlib.md5(b'v1').hexdigest()
+    assert storage.upload_bytes_if_changed('report.json', b'v1') is False
+    assert storage.upload_bytes_if_changed('report.json', b'v2') is True
+    assert storage.get_md5('report.json') == hashlib.md5(b'v2').hexdigest()
+
+
+def test_file_and_bytes_uploads_share_the_md5(storage, tmp_path):
+    source = tmp_path / 'report.json'
+    source.write_bytes(b'same content')
+    storage.upload_bytes_if_changed('report.json', b'same content')
+    # 同样的内容无论以文件还是内存数据上传，都被识别为未变化
+    assert storage.upload_file_if_changed('report.json', str(source)) is False
+
+
+def test_incomplete_subclass_fails_at_instantiation():
+    class NoPutBytes(ObjectStorage):
+        def get_md5(self, key):
+            return None
+
+        def _put_file(self, key, path, md5):
+            pass
+
+    with pytest.raises(TypeError):
+        NoPutBytes()
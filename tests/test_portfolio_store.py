@@ -0,0 +1,77 @@
+# tests/test_portfolio_store.py
+# 只追加的组合库：批量追加、按版本列出新分片与导出视图的过期判断。
+
+import os
+
+import pandas as pd
+import pytest
+
+from portfolio_store import PortfolioStore
+
+
+def frame(codes, snapshot='202509011500'):
+    return pd.DataFrame({'股票代码': codes, '配置比例 (%)': [10] * len(codes), '修改时间': [int(snapshot)] * len(codes)})
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PortfolioStore(str(tmp_path / 'store'))
+
+
+def test_append_many_writes_one_version(store):
+    written = store.append_many({'组合A': frame([600519, '000001']), '组合B': frame(['510300']), '空组合': frame([])})
+    assert set(written) == {'组合A', '组合B'}
+    assert store.version == 1
+    assert store.sheet_names() == ['组合A', '组合B']
+    assert store.parts() == {'组合A': ['part-000001.parquet'], '组合B': ['part-000001.parquet']}
+
+    df = store.read('组合A')
+    # 代码规范化为 6 位字符串，修改时间转为字符串
+    assert df['股票代码'].tolist() == ['600519', '000001']
+    assert df['修改时间'].tolist() == ['202509011500'] * 2
+
+
+def test_manifest_survives_reload(store):
+    store.append_many({'组合A': frame(['600519'])})
+    reloaded = PortfolioStore(store.store_dir)
+    assert reloaded.version == 1
+    assert len(reloaded.read('组合A')) == 1
+
+
+def test_append_many_skips_empty_batches(store):
+    assert store.append_many({'组合A': frame([])}) == {}
+    assert store.version == 0
+    assert store.is_empty()
+
+
+def test_parts_since(store):
+    store.append_many({'组合A': frame(['600519']), '组合B': frame(['510300'])})
+    store.append_many({'组合A': frame(['300750'], '202509021500')})
+    assert store.parts_since(None) == store.parts()
+    assert store.parts_since(1) == {'组合A': ['part-000002.parquet']}
+    assert store.parts_since(2) == {}
+    assert len(store.read('组合A')) == 2
+
+
+def test_needs_export_tracks_new_parts(store, tmp_path):
+    excel_path = str(tmp_path / 'portfolio.xlsx')
+    store.append_many({'组合A': frame(['600519'])})
+    assert store.needs_export(excel_path)
+
+    store.export_excel(excel_path)
+    assert os.path.exists(excel_path)
+    assert not store.needs_export(excel_path)
+    assert store.exported_version == 1
+    assert store.exported_age_seconds() < 60
+
+    store.append_many({'组合A': frame(['300750'], '202509021500')})
+    assert store.needs_export(excel_path)
+
+
+def test_mark_published(store):
+    store.append_many({'组合A': frame(['600519'])})
+    assert store.published_version is None
+    store.mark_published(companions={'组合A': {'md5': 'x'}})
+    reloaded = PortfolioStore(store.store_dir)
+    assert reloaded.published_version == 1
+    assert reloaded.published_state('companions') == {'组合A': {'md5': 'x'}}
@@ -0,0 +1,77 @@
+# tests/test_portfolioupdate.py
+# 用本地对象存储（OSS_LOCAL_DIR）跑两次增量更新，检查 OSS 上的工作簿、分片与分区对象始终与组合库一致。
+
+import os
+import json
+
+import pandas as pd
+import pytest
+
+import portfolioupdate
+from portfolio_store import PortfolioStore
+
+
+def holdings(snapshot, codes):
+    return [{'股票代码': code, '股票名称': f"名称{code}", '配置比例 (%)': 10, '修改时间': snapshot} for code in codes]
+
+
+def write_delta(rows_by_sheet):
+    with open(portfolioupdate.NEW_ROWS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(rows_by_sheet, f, ensure_ascii=False)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    oss_dir = str(tmp_path / 'oss')
+    monkeypatch.setattr(portfolioupdate, 'OSS_LOCAL_DIR', oss_dir)
+    return oss_dir
+
+
+def update(rows_by_sheet):
+    """一次完整的 update_portfolio 流程：合并增量 JSON 并发布到对象存储。"""
+    write_delta(rows_by_sheet)
+    store = portfolioupdate.merge_excel(PortfolioStore())
+    portfolioupdate.upload_to_oss(store)
+    return store
+
+
+def published_rows(oss_dir):
+    frames = pd.read_excel(os.path.join(oss_dir, portfolioupdate.OSS_FILE_KEY), sheet_name=None)
+    return {sheet_name: len(df) for sheet_name, df in frames.items()}
+
+
+def store_rows(store):
+    return {sheet_name: len(store.read(sheet_name)) for sheet_name in store.sheet_names()}
+
+
+def test_every_update_republishes_the_workbook(workspace):
+    update({'组合A': holdings(202509011500, ['600519', '000001']), '组合B': holdings(202509011500, ['510300'])})
+    store = update({'组合A': holdings(202509021500, ['600519', '300750', '000002'])})
+
+    assert store_rows(store) == {'组合A': 5, '组合B': 1}
+    assert published_rows(workspace) == store_rows(store)
+    assert store.published_version == store.exported_version == store.version
+
+    parts = json.load(open(os.path.join(workspace, 'AIPEPortfolio', 'parts', 'manifest.json'), encoding='utf-8'))
+    assert parts['version'] == store.version
+    assert [len(keys) for keys in parts['sheets'].values()] == [2, 1]
+    for keys in parts['sheets'].values():
+        for key in keys:
+            assert os.path.exists(os.path.join(workspace, *key.split('/')))
+
+
+def test_deferred_export_is_reported_and_not_uploaded(workspace, monkeypatch, capsys):
+    update({'组合A': holdings(202509011500, ['600519'])})
+    monkeypatch.setattr(portfolioupdate, 'PORTFOLIO_XLSX_MAX_AGE_HOURS', 24)
+    capsys.readouterr()
+    store = update({'组合A': holdings(202509021500, ['600519', '300750'])})
+
+    out = capsys.readouterr().out
+    assert 'Deferring the full export' in out
+    assert "'AIPEPortfolio.xlsx' was not republished and still reflects version 1" in out
+    assert 'Successfully published' not in out
+    assert published_rows(workspace) == {'组合A': 1}
+    # 分区对象不受推迟影响
+    assert store.published_version == store.version == 2
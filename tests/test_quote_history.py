@@ -0,0 +1,68 @@
+# tests/test_quote_history.py
+# 行情历史库：写入与查询的往返，以及合并任务只把实际更新且非过期的记录写入历史库。
+
+import json
+
+import numpy as np
+import pytest
+
+import quote_history
+from merge_partials import merge_partials
+from quote_history import QuoteHistoryStore
+
+
+def record(code, trade_date, price, **extra):
+    return {'代码': code, 'trade_date': trade_date, 'Price': price, 'Percent': 1.5, 'Amount': 1e6,
+            'PE_TTM': None, 'PB': 2.0, 'update_time_bjt': f"{trade_date} 15:00:00", **extra}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return QuoteHistoryStore(str(tmp_path / 'history'))
+
+
+def test_ingest_and_query_round_trip(store):
+    assert store.ingest([record('600519', '2025-09-19', 1500.0), record('000001', '2025-09-19', 11.0),
+                         record('600519', '2025-09-22', 1510.0)]) == 3
+    assert store.trade_dates().tolist() == [20250919, 20250922]
+
+    reloaded = QuoteHistoryStore(store.history_dir)
+    df = reloaded.query(['600519', '000001', '999999'])
+    assert df[['trade_date', '代码']].values.tolist() == [
+        ['2025-09-19', '600519'], ['2025-09-19', '000001'], ['2025-09-22', '600519']]
+    assert df['Price'].tolist() == pytest.approx([1500.0, 11.0, 1510.0])
+    # 缺失值以 NaN 保存
+    assert np.isnan(df['PE_TTM']).all()
+
+    series = reloaded.query_code('600519', start='2025-09-20')
+    assert series['trade_date'].tolist() == ['2025-09-22']
+    assert reloaded.query(['999999']).empty
+
+
+def test_reingest_keeps_last_quote_per_code(store):
+    store.ingest([record('600519', '2025-09-22', 1500.0)])
+    store.ingest([record('600519', '2025-09-22', 1510.0), record('000001', '2025-09-22', 11.0)])
+    df = store.query(['600519', '000001'])
+    assert len(df) == 2
+    assert df.set_index('代码').loc['600519', 'Price'] == pytest.approx(1510.0)
+
+
+def test_ingest_skips_records_without_date(store):
+    assert store.ingest([{'代码': '600519', 'Price': 1.0}, {'trade_date': '2025-09-22'}]) == 0
+    assert store.trade_dates().size == 0
+
+
+def test_merger_ingests_only_accepted_fresh_records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    report = tmp_path / 'report.json'
+    report.write_text(json.dumps([record('000001', '2025-09-22', 11.0)]), encoding='utf-8')
+    partial = tmp_path / 'partial_a_shares.json'
+    partial.write_text(json.dumps([
+        record('000001', '2025-09-22', 11.0),                   # 与报告相同：不是更新，不写入
+        record('600519', '2025-09-22', 1510.0),
+        record('300750', '2025-09-19', 250.0, stale=True),      # 过期回退快照：写入报告但不写入历史库
+    ]), encoding='utf-8')
+
+    assert merge_partials(str(report), [str(partial)], columnar=False, history=True) == 2
+    df = QuoteHistoryStore(str(tmp_path / quote_history.HISTORY_DIR)).query(['000001', '600519', '300750'])
+    assert df['代码'].tolist() == ['600519']
@@ -0,0 +1,85 @@
+# tests/test_quote_service.py
+# 用离线的 fake_akshare（QUOTE_SERVICE_PROVIDER=fake）驱动 QuoteService 的刷新、查询与写回。
+
+import json
+import asyncio
+
+import pytest
+
+import fake_akshare
+from quote_service import QuoteService, load_provider
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = QuoteService(load_provider('fake'), report_path=str(tmp_path / 'report.json'))
+    asyncio.run(service.refresh_all())
+    return service
+
+
+def test_load_provider_fake():
+    assert load_provider('fake') is fake_akshare
+
+
+def test_refresh_loads_every_market(service):
+    health = service.health()
+    assert set(health['markets']) == {'a_shares', 'hk_shares', 'etf'}
+    assert health['markets']['a_shares']['rows'] == len(fake_akshare.a_share_codes())
+    assert health['errors'] == {}
+
+
+def test_refresh_failure_keeps_previous_data(service):
+    class BrokenProvider:
+        def __getattr__(self, name):
+            def fetch():
+                raise RuntimeError('upstream down')
+            return fetch
+
+    before = service.markets['etf']
+    service.provider = BrokenProvider()
+    asyncio.run(service.refresh_market('etf'))
+    assert service.markets['etf'] is before
+    assert 'upstream down' in service.errors['etf']
+
+
+def test_query_mixed_markets_in_request_order(service):
+    a_code, hk_code, etf_code = fake_akshare.a_share_codes()[3], fake_akshare.hk_share_codes()[6], fake_akshare.etf_codes()[0]
+    records = service.query([etf_code, f"HK{hk_code}", a_code, 'NOPE'])
+    assert [record['代码'] for record in records] == [etf_code, f"HK{hk_code}", a_code]
+    assert 'PE_TTM' in records[2] and 'PE_TTM' not in records[0]
+
+
+def test_query_normalizes_codes(service):
+    # 整数、缺少前导零、带交易所后缀的写法都归一到报告中的代码
+    records = service.query([1, '600001.SH', 'HK1', '000001'])
+    assert [record['代码'] for record in records] == ['000001', '600001', 'HK00001']
+
+
+def test_route_post_with_integer_codes(service):
+    status, payload = service.route('POST', '/quotes', json.dumps({'codes': [1, 'hk7']}).encode('utf-8'))
+    assert status == 200
+    assert [record['代码'] for record in payload] == ['000001', 'HK00007']
+
+
+def test_route_get_and_errors(service):
+    status, payload = service.route('GET', '/quotes?codes=000001,600001', b'')
+    assert status == 200 and len(payload) == 2
+    assert service.route('POST', '/quotes', b'{}')[0] == 400
+    assert service.route('GET', '/missing', b'')[0] == 404
+    assert service.route('DELETE', '/quotes', b'')[0] == 405
+
+
+def test_persist_upserts_watched_codes(service):
+    assert service.persist() == 0
+
+    service.query(['000001', 'HK00001'])
+    assert service.persist() == 2
+    with open(service.report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    assert {record['代码'] for record in report} == {'000001', 'HK00001'}
+
+    # 行情刷新后，再次写回只更新已关注的代码
+    asyncio.run(service.refresh_market('a_shares'))
+    service.persist()
+    with open(service.report_path, 'r', encoding='utf-8') as f:
+        assert {record['代码'] for record in json.load(f)} == {'000001', 'HK00001'}
@@ -0,0 +1,44 @@
+# tests/test_rebalance_diff.py
+# 调仓差异引擎与估值引擎共用同一份权重坐标，两者的换手率必须一致。
+
+import pandas as pd
+import pytest
+
+from portfolio_valuation import value_portfolios
+from rebalance_diff import RebalanceDiff
+
+
+@pytest.fixture
+def holdings():
+    rows = [
+        ('600519', '贵州茅台', 40, '202509011500'),
+        ('000001', '平安银行', 30, '202509011500'),
+        ('000001', '平安银行', 10, '202509011500'),
+        (None, None, 5, '202509011500'),
+        ('600519', '贵州茅台', 50, '202509021500'),
+        ('300750', '宁德时代', 20, '202509021500'),
+    ]
+    return {'组合A': pd.DataFrame(rows, columns=['股票代码', '股票名称', '配置比例 (%)', '修改时间']),
+            '空组合': pd.DataFrame()}
+
+
+def test_changes_between_snapshots(holdings):
+    diff = RebalanceDiff(holdings, chunk_size=1)
+    changes = diff.changes.set_index(['修改时间', '股票代码'])
+    # 同一快照内重复的代码权重累加，空白代码被忽略
+    assert changes.loc[('202509011500', '000001'), 'weight_after'] == pytest.approx(0.4)
+    assert set(diff.changes['股票代码']) == {'600519', '000001', '300750'}
+    assert changes.loc[('202509021500', '600519'), 'action'] == 'increase'
+    assert changes.loc[('202509021500', '000001'), 'action'] == 'remove'
+    assert changes.loc[('202509021500', '300750'), 'action'] == 'add'
+    assert list(diff.latest()['修改时间'].unique()) == ['202509021500']
+
+
+def test_turnover_matches_valuation(holdings):
+    diff = RebalanceDiff(holdings)
+    quotes = pd.DataFrame(columns=['trade_date', '代码', 'Percent'])
+    turnover = value_portfolios(holdings, quotes)['turnover']
+    merged = turnover.merge(diff.summary, on=['组合名称', '修改时间'], suffixes=('_valuation', '_diff'))
+    assert len(merged) == len(diff.summary) == 2
+    assert merged['turnover_valuation'].tolist() == pytest.approx(merged['turnover_diff'].tolist())
+    assert merged['turnover_diff'].tolist() == pytest.approx([0.4, 0.35])
@@ -0,0 +1,81 @@
+# tests/test_report_formats.py
+# 列式报告：to_columnar / from_columnar 往返，以及按市场发布时只重写 ETag 变化的市场。
+
+import gzip
+import json
+
+import pytest
+
+from report_formats import (COLUMNAR_FORMAT, REPORT_MANIFEST_NAME, encode_compact, from_columnar,
+                            is_columnar, publish_columnar_report, to_columnar)
+
+RECORDS = [
+    {'代码': '600519', '名称': '贵州茅台', 'Price': 1510.0, 'PE_TTM': 22.5, 'trade_date': '2025-09-22'},
+    {'代码': '000001', '名称': '平安银行', 'Price': 11.0, 'PE_TTM': None, 'trade_date': '2025-09-22'},
+    {'代码': '00700', '名称': '腾讯控股', 'Price': 600.0, 'PE_TTM': 18.0, 'trade_date': '2025-09-22'},
+]
+
+
+def market_by_code(code):
+    return 'hk_shares' if len(code) == 5 else 'a_shares'
+
+
+def test_columnar_round_trip():
+    doc = to_columnar(RECORDS)
+    assert is_columnar(doc)
+    assert doc['count'] == 3
+    # 所有记录相同的字段只写一次
+    assert doc['shared'] == {'trade_date': '2025-09-22'}
+    assert doc['columns']['PE_TTM'] == [22.5, None, 18.0]
+    assert from_columnar(json.loads(encode_compact(doc))) == RECORDS
+
+
+def test_round_trip_fills_missing_fields_with_none():
+    records = [{'代码': '600519', 'Price': 1510.0}, {'代码': '000001', 'Price': 11.0, 'stale': True}]
+    doc = to_columnar(records)
+    # 只在部分记录中出现的字段不能作为共享值
+    assert 'stale' not in doc['shared']
+    assert from_columnar(doc) == [{'代码': '600519', 'Price': 1510.0, 'stale': None},
+                                  {'代码': '000001', 'Price': 11.0, 'stale': True}]
+
+
+def test_empty_report_round_trip():
+    assert from_columnar(to_columnar([])) == []
+    assert not is_columnar(RECORDS)
+
+
+def test_publish_writes_changed_markets_only(tmp_path):
+    output_dir = tmp_path / 'report'
+    assert publish_columnar_report(RECORDS, str(output_dir), classify=market_by_code) == ['a_shares', 'hk_shares']
+    manifest = json.loads((output_dir / REPORT_MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest['format'] == COLUMNAR_FORMAT
+    assert manifest['markets']['a_shares']['records'] == 2
+    assert manifest['markets']['a_shares']['trade_date'] == '2025-09-22'
+    a_shares = json.loads(gzip.decompress((output_dir / 'a_shares.json.gz').read_bytes()))
+    assert from_columnar(a_shares) == RECORDS[:2]
+
+    assert publish_columnar_report(RECORDS, str(output_dir), classify=market_by_code) == []
+
+    updated = [dict(RECORDS[0], Price=1520.0)] + RECORDS[1:]
+    assert publish_columnar_report(updated, str(output_dir), classify=market_by_code) == ['a_shares']
+    manifest_after = json.loads((output_dir / REPORT_MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest_after['markets']['hk_shares'] == manifest['markets']['hk_shares']
+    assert manifest_after['markets']['a_shares']['etag'] != manifest['markets']['a_shares']['etag']
+
+
+def test_publish_removes_markets_missing_from_the_report(tmp_path):
+    output_dir = tmp_path / 'report'
+    publish_columnar_report(RECORDS, str(output_dir), classify=market_by_code)
+    assert publish_columnar_report(RECORDS[:2], str(output_dir), classify=market_by_code) == ['hk_shares']
+    manifest = json.loads((output_dir / REPORT_MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert list(manifest['markets']) == ['a_shares']
+    assert not list(output_dir.glob('hk_shares.json*'))
+
+
+@pytest.mark.parametrize('suffix', ['', '.gz'])
+def test_missing_output_file_is_rewritten(tmp_path, suffix):
+    output_dir = tmp_path / 'report'
+    publish_columnar_report(RECORDS, str(output_dir), classify=market_by_code)
+    (output_dir / f'hk_shares.json{suffix}').unlink()
+    assert publish_columnar_report(RECORDS, str(output_dir), classify=market_by_code) == ['hk_shares']
+    assert (output_dir / f'hk_shares.json{suffix}').exists()
@@ -0,0 +1,47 @@
+# tests/test_security_master.py
+# 证券主表的市场归类：按代码拉取前的路由，以及增量更新不改动已归入其他市场的代码。
+
+import pandas as pd
+import pytest
+
+from index import own_market_codes
+from security_master import SecurityMaster
+
+
+@pytest.fixture
+def master(tmp_path):
+    master = SecurityMaster(str(tmp_path / 'security_master.json'))
+    master.update_market('a_shares', pd.DataFrame({'代码': ['000001', '600519'], '名称': ['平安银行', '贵州茅台']}))
+    master.update_market('etf', pd.DataFrame({'代码': ['510300'], '名称': ['沪深300ETF']}))
+    return master
+
+
+def test_market_of_prefers_master_then_code_format(master):
+    assert master.market_of('510300', default='a_shares') == 'etf'
+    assert master.market_of('600519', default='etf') == 'a_shares'
+    # 主表中没有的代码：能明确识别的格式按推断结果，其余使用默认市场
+    assert master.market_of('159915', default='a_shares') == 'etf'
+    assert master.market_of('00700.HK', default='a_shares') == 'hk_shares'
+    assert master.market_of('300750', default='etf') == 'etf'
+    assert master.market_of('300750') == 'a_shares'
+
+
+def test_own_market_codes_drops_other_markets(master, capsys):
+    codes = own_market_codes('a_shares', ['000001', '510300', '159915', '300750', 'HK00700'], master)
+    assert codes == ['000001', '300750']
+    assert "belong to 'etf'" in capsys.readouterr().out
+
+
+def test_partial_update_keeps_codes_of_other_markets(master):
+    changed = master.update_market('a_shares', pd.DataFrame({'代码': ['510300', '300750'], '名称': ['误归类', '宁德时代']}),
+                                   complete=False)
+    assert changed
+    assert master.lookup('510300')['market'] == 'etf'
+    assert master.lookup('510300')['name'] == '沪深300ETF'
+    assert master.lookup('300750')['market'] == 'a_shares'
+
+
+def test_complete_update_replaces_market(master):
+    master.update_market('a_shares', pd.DataFrame({'代码': ['000001'], '名称': ['平安银行']}))
+    assert '600519' not in master
+    assert master.lookup('510300')['market'] == 'etf'
@@ -0,0 +1,94 @@
+# tests/test_snapshot_cache.py
+# 行情快照缓存：TTL 内复用、过期后重新拉取，以及实时拉取失败时回退到带过期标记的旧快照。
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from snapshot_cache import SnapshotCache, SNAPSHOT_ATTRS_KEY
+
+
+def quotes(price):
+    return pd.DataFrame({'代码': ['000001', '600519'], '最新价': [price, price * 100]})
+
+
+class Fetcher:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def age(cache, market, trade_date, seconds):
+    """把快照文件的修改时间（即抓取时间）往前调 seconds 秒。"""
+    path = cache._path(market, trade_date)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SnapshotCache(str(tmp_path / 'cache'), ttl_seconds=60, fallback_max_age=3600)
+
+
+def test_fetch_reuses_snapshot_within_ttl(cache):
+    fetcher = Fetcher(quotes(10.0))
+    first = cache.fetch('a_shares', '2025-09-22', fetcher)
+    second = cache.fetch('a_shares', '2025-09-22', fetcher)
+    assert fetcher.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert SNAPSHOT_ATTRS_KEY not in second.attrs
+
+
+def test_expired_snapshot_is_refetched(cache):
+    cache.fetch('a_shares', '2025-09-22', Fetcher(quotes(10.0)))
+    age(cache, 'a_shares', '2025-09-22', 61)
+    assert cache.get('a_shares', '2025-09-22') is None
+
+    fetcher = Fetcher(quotes(11.0))
+    df = cache.fetch('a_shares', '2025-09-22', fetcher)
+    assert fetcher.calls == 1
+    assert df['最新价'].tolist() == [11.0, 1100.0]
+
+
+def test_failed_fetch_falls_back_to_marked_stale_snapshot(cache):
+    cache.put('a_shares', '2025-09-19', quotes(9.0))
+    age(cache, 'a_shares', '2025-09-19', 600)
+
+    df = cache.fetch('a_shares', '2025-09-22', Fetcher(error=ConnectionError('spot_em down')))
+    assert df['最新价'].tolist() == [9.0, 900.0]
+    snapshot = df.attrs[SNAPSHOT_ATTRS_KEY]
+    assert snapshot['stale'] is True
+    # 回退快照带上自己的交易日，而不是本次请求的交易日
+    assert snapshot['trade_date'] == '2025-09-19'
+    assert len(snapshot['fetched_at_bjt']) == len('2025-09-19 15:00:00')
+
+
+def test_fallback_ignores_snapshots_older_than_max_age(cache):
+    cache.put('a_shares', '2025-09-19', quotes(9.0))
+    age(cache, 'a_shares', '2025-09-19', 3601)
+    with pytest.raises(ConnectionError):
+        cache.fetch('a_shares', '2025-09-22', Fetcher(error=ConnectionError('spot_em down')))
+
+
+def test_fallback_is_per_market(cache):
+    cache.put('etf', '2025-09-22', quotes(1.0))
+    with pytest.raises(ConnectionError):
+        cache.fetch('a_shares', '2025-09-22', Fetcher(error=ConnectionError('spot_em down')))
+
+
+def test_evict_keeps_newest_snapshot(tmp_path):
+    cache = SnapshotCache(str(tmp_path / 'cache'), ttl_seconds=60, max_bytes=1)
+    cache.put('a_shares', '2025-09-19', quotes(9.0))
+    age(cache, 'a_shares', '2025-09-19', 600)
+    cache.put('a_shares', '2025-09-22', quotes(10.0))
+    assert cache.latest('a_shares')['最新价'].tolist() == [10.0, 1000.0]
+    assert not os.path.exists(cache._path('a_shares', '2025-09-19'))
@@ -0,0 +1,78 @@
+# tests/test_trigger.py
+# DispatchCoalescer：窗口内的请求合并、运行中 dispatch 的去重，以及 dispatch 失败后保留代码重发。
+
+from types import SimpleNamespace
+
+import pytest
+
+import trigger
+from trigger import DispatchCoalescer
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(trigger, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_debounce_merges_followers_into_the_leader_batch():
+    coalescer = DispatchCoalescer(debounce_seconds=2, inflight_seconds=0)
+    role, deadline = coalescer.submit('a_shares', {'dynamiclist': ['000001', '600519']})
+    assert (role, deadline) == ('leader', 1002.0)
+    assert coalescer.submit('a_shares', {'dynamiclist': ['600519', '300750']}) == ('follower', None)
+    # 其他 list_type 有自己的窗口
+    assert coalescer.submit('etf', {'dynamicETFlist': ['510300']})[0] == 'leader'
+
+    assert coalescer.close('a_shares') == {'dynamiclist': ['000001', '600519', '300750']}
+    assert coalescer.close('a_shares') == {}
+    assert coalescer.submit('a_shares', {'dynamiclist': ['000001']})[0] == 'leader'
+
+
+def test_inflight_dispatch_covers_repeated_requests(clock):
+    coalescer = DispatchCoalescer(debounce_seconds=0, inflight_seconds=60)
+    coalescer.submit('a_shares', {'dynamiclist': ['000001', '600519']})
+    coalescer.mark_dispatched(coalescer.close('a_shares'))
+
+    assert coalescer.submit('a_shares', {'dynamiclist': ['600519']}) == ('covered', None)
+    # 只有未覆盖的代码进入新的批次
+    assert coalescer.submit('a_shares', {'dynamiclist': ['600519', '300750']})[0] == 'leader'
+    assert coalescer.close('a_shares') == {'dynamiclist': ['300750']}
+
+    # 窗口过期后同样的代码会重新发出
+    clock.now += 60
+    assert coalescer.submit('a_shares', {'dynamiclist': ['600519']})[0] == 'leader'
+    assert coalescer.close('a_shares') == {'dynamiclist': ['600519']}
+
+
+def test_inflight_dedupe_is_off_by_default():
+    coalescer = DispatchCoalescer(debounce_seconds=0)
+    assert coalescer.inflight_seconds == trigger.TRIGGER_INFLIGHT_SECONDS == 0
+    coalescer.submit('a_shares', {'dynamiclist': ['000001']})
+    coalescer.mark_dispatched(coalescer.close('a_shares'))
+    assert coalescer.submit('a_shares', {'dynamiclist': ['000001']})[0] == 'leader'
+    assert coalescer.close('a_shares') == {'dynamiclist': ['000001']}
+
+
+def test_failed_batch_is_retried_by_the_next_leader():
+    coalescer = DispatchCoalescer(debounce_seconds=2, inflight_seconds=60)
+    coalescer.submit('a_shares', {'dynamiclist': ['000001']})
+    coalescer.submit('a_shares', {'dynamiclist': ['000002']})
+    batch = coalescer.close('a_shares')
+    # dispatch 失败：不记为运行中，保留整个批次（包括 follower 的代码）
+    coalescer.retain('a_shares', batch)
+
+    assert coalescer.submit('a_shares', {'dynamiclist': ['000003']})[0] == 'leader'
+    assert coalescer.close('a_shares') == {'dynamiclist': ['000001', '000002', '000003']}
+    assert coalescer.retry == {}
+
+
+def test_retry_is_not_swallowed_by_the_covered_check():
+    coalescer = DispatchCoalescer(debounce_seconds=0, inflight_seconds=60)
+    coalescer.submit('a_shares', {'dynamiclist': ['600519']})
+    coalescer.mark_dispatched(coalescer.close('a_shares'))
+    coalescer.retain('a_shares', {'dynamiclist': ['000001']})
+
+    # 请求本身已被覆盖，但还有等待重发的代码，因此仍然成为 leader
+    assert coalescer.submit('a_shares', {'dynamiclist': ['600519']})[0] == 'leader'
+    assert coalescer.close('a_shares') == {'dynamiclist': ['000001']}
@@ -0,0 +1,104 @@
+# tests/test_update_portfolio.py
+# update-portfolio：按 git blob SHA 判定内容未变化时跳过提交，以及缓存的远端 SHA 过期时的处理。
+
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+from github import GithubException
+
+# 入口文件名带连字符，不能直接 import
+API_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'update-portfolio.py')
+spec = importlib.util.spec_from_file_location('update_portfolio', API_PATH)
+update_portfolio = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(update_portfolio)
+
+FILE_PATH = update_portfolio.EXCEL_FILE_PATH
+REPO_NAME = 'owner/repo'
+
+
+class FakeRepo:
+    """只实现 get_contents / create_file / update_file 的 GitHub 仓库替身，update_file 与真实接口一样校验 sha。"""
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.reads = 0
+        self.commits = []
+
+    def get_contents(self, path, ref):
+        self.reads += 1
+        if path not in self.files:
+            raise GithubException(404, {'message': 'Not Found'}, None)
+        return SimpleNamespace(sha=update_portfolio.git_blob_sha(self.files[path]))
+
+    def create_file(self, path, message, content, branch):
+        if path in self.files:
+            raise GithubException(422, {'message': 'sha wasn\'t supplied'}, None)
+        return self._write('create', path, content)
+
+    def update_file(self, path, message, content, sha, branch):
+        if path not in self.files:
+            raise GithubException(404, {'message': 'Not Found'}, None)
+        if update_portfolio.git_blob_sha(self.files[path]) != sha:
+            raise GithubException(409, {'message': 'does not match'}, None)
+        return self._write('update', path, content)
+
+    def _write(self, action, path, content):
+        self.files[path] = content
+        self.commits.append(action)
+        return {'content': SimpleNamespace(sha=update_portfolio.git_blob_sha(content))}
+
+
+@pytest.fixture(autouse=True)
+def clear_sha_cache():
+    update_portfolio._remote_sha_cache.clear()
+    yield
+    update_portfolio._remote_sha_cache.clear()
+
+
+def commit(repo, content):
+    return update_portfolio.commit_if_changed(repo, REPO_NAME, FILE_PATH, content, 'chore: test')
+
+
+def test_git_blob_sha_matches_git():
+    # 与 `printf 'hello\n' | git hash-object --stdin` 一致
+    assert update_portfolio.git_blob_sha(b'hello\n') == 'ce013625030ba8dba906f756967f9e9ca394464a'
+
+
+def test_unchanged_content_skips_commit():
+    repo = FakeRepo({FILE_PATH: b'v1'})
+    assert commit(repo, b'v1') is None
+    assert repo.commits == []
+
+    assert commit(repo, b'v2') == '更新'
+    # 缓存的 SHA 与本次内容一致，仍向远端确认后才跳过
+    reads = repo.reads
+    assert commit(repo, b'v2') is None
+    assert repo.reads == reads + 1
+    assert repo.commits == ['update']
+
+
+def test_missing_file_is_created():
+    repo = FakeRepo()
+    assert commit(repo, b'v1') == '创建'
+    assert repo.files[FILE_PATH] == b'v1'
+
+
+def test_remote_change_is_not_skipped_on_stale_cache():
+    repo = FakeRepo()
+    commit(repo, b'v1')
+    # 文件被工作流改写：缓存仍显示 v1，但远端已经不同，重新提交 v1 不能被跳过
+    repo.files[FILE_PATH] = b'rewritten by workflow'
+    assert commit(repo, b'v1') == '更新'
+    assert repo.files[FILE_PATH] == b'v1'
+
+
+def test_stale_cached_sha_is_refreshed_and_retried():
+    repo = FakeRepo()
+    commit(repo, b'v1')
+    repo.files[FILE_PATH] = b'rewritten by workflow'
+    # 缓存的 SHA 已过期，update_file 返回 409 后刷新并重试一次
+    assert commit(repo, b'v2') == '更新'
+    assert repo.files[FILE_PATH] == b'v2'
+    assert repo.commits == ['create', 'update']